@@ -0,0 +1,275 @@
+import os, sys, gc, json, time, shutil, argparse, platform, tempfile, tracemalloc
+import numpy as np
+from lidarscan import scanner
+from lidarscan import heightmap
+from lidarscan import accumulator
+from lidarscan import outliers
+from lidarscan import tiles
+from lidarscan import pointcodec
+from lidarscan import pointfile
+from lidarscan import streaming
+from lidarscan import mesh
+
+# ---------------------------------------------------------
+# POST-PROCESSING MICROBENCHMARKS
+# ---------------------------------------------------------
+# python bench.py                          run, print a table
+# python bench.py --save-baseline          ... and store bench_baseline.json
+# python bench.py --compare                ... and fail on regressions
+#
+# Clouds are synthetic (tilted table + box buildings + noise) so no
+# pigpio or serial device is needed. Each stage is timed (best of
+# --repeat) without tracing, then run once more under tracemalloc for
+# its peak memory (numpy buffers included).
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+TIME_THRESHOLD = 0.25       # allowed slowdown vs baseline (25 %)
+MEM_THRESHOLD = 0.25
+PLOT_LIMIT = 1_000_000      # plotly pages above this are impractically large
+TIN_LIMIT = 1_000_000       # pure-Python Delaunay: ~25 s per million points
+NOISE_FLOOR_S = 0.005       # ignore regressions on stages faster than this
+
+
+# ---------------------------------------------------------
+# SYNTHETIC CLOUD
+# ---------------------------------------------------------
+BOXES = [(-30, -12, -15, 0, 9), (-5, -8, 10, 6, 14), (20, 2, 35, 15, 6)]
+
+def make_cloud(n, seed=0, extent=(-50, -20, 50, 20), tilt=(0.03, -0.02, 1.5), noise=0.3):
+    """n points on a tilted plane with box buildings (cm)."""
+    rng = np.random.default_rng(seed)
+    x0, y0, x1, y1 = extent
+    xs = rng.uniform(x0, x1, n)
+    ys = rng.uniform(y0, y1, n)
+    a, b, c = tilt
+    zs = a * xs + b * ys + c
+    for bx0, by0, bx1, by1, h in BOXES:
+        inside = (xs >= bx0) & (xs < bx1) & (ys >= by0) & (ys < by1)
+        zs[inside] += h
+    zs += rng.normal(0, noise, n)
+    return xs, ys, zs
+
+
+# ---------------------------------------------------------
+# STAGES
+# ---------------------------------------------------------
+# name -> (group, function(cloud, grid_info, tmp), max points or None).
+# "group" pairs each piece of the old scripts with its replacement.
+def _grid_info(xs, ys, zs):
+    zf = heightmap.flatten(xs, ys, zs, heightmap.fit_ground(xs, ys, zs))
+    x0, y0, nx, ny = heightmap.grid_shape(xs, ys, scanner.GRID_SIZE)
+    return {"grid": heightmap.max_grid(xs, ys, zf, x0, y0, scanner.GRID_SIZE, nx, ny),
+            "x0": x0, "y0": y0, "cell": scanner.GRID_SIZE}
+
+
+def fit_lstsq(c, g, tmp):
+    heightmap.fit_ground(*c)
+
+def fit_normal_equations(c, g, tmp):
+    fit = accumulator.PlaneFit()
+    fit.add_many(*c)
+    fit.coeffs()
+
+def map2d_scanner(c, g, tmp):
+    """prepare_2d_map as the scanner runs it: build_grid + the plotly page."""
+    scanner.prepare_2d_map(*c, scanner.build_grid(*c, "bench"))
+    scanner.get_2d_html()
+
+def map2d_vector(c, g, tmp):
+    _grid_info(*c)
+
+def map2d_tiles(c, g, tmp):
+    pyr = tiles.Pyramid(g)
+    for ty in range(-(-pyr.levels[0].shape[0] // tiles.TILE)):
+        for tx in range(-(-pyr.levels[0].shape[1] // tiles.TILE)):
+            pyr.tile(0, tx, ty)
+
+def grid_accumulator(c, g, tmp):
+    acc = accumulator.HeightAccumulator(scanner.GRID_SIZE)
+    acc.add_many(*c)
+    acc.grid()
+
+def map2d_stream(c, g, tmp):
+    """Same grid from a memory-mapped point file, chunk by chunk."""
+    path = os.path.join(tmp, f"cloud{len(c[0])}.pts")
+    if not os.path.exists(path):
+        pointfile.save(path, *c)
+    points = pointfile.open_points(path)[1]
+    coeffs, bounds = streaming.ground_and_bounds(points)
+    streaming.grid_points(points, scanner.GRID_SIZE, coeffs, bounds)
+
+def stl_top(c, g, tmp):
+    scanner.save_stl(*c, g, os.path.join(tmp, "top.stl"))
+
+def stl_walls(c, g, tmp):
+    """save_heightmap_to_stl from utlimate_v2.py (top surface + walls)."""
+    walls = scanner.STL_WALLS
+    scanner.STL_WALLS = True
+    try:
+        scanner.save_stl(*c, g, os.path.join(tmp, "walls.stl"))
+    finally:
+        scanner.STL_WALLS = walls
+
+def stl_stream(c, g, tmp):
+    with mesh.StlWriter(os.path.join(tmp, "stream.stl")) as w:
+        mesh.write_surface(w, g)
+
+def stl_tin(c, g, tmp):
+    scanner.save_tin(*c, os.path.join(tmp, "tin.stl"))
+
+def plot3d_plotly(c, g, tmp):
+    scanner.prepare_3d_plot(*c)
+    scanner.get_3d_html()
+
+def plot3d_pointcodec(c, g, tmp):
+    pointcodec.compress(pointcodec.encode(*c))
+
+def outlier_filter(c, g, tmp):
+    outliers.filter_points(*c)
+
+
+STAGES = {
+    "fit_lstsq":            ("fit", fit_lstsq, None),
+    "fit_normal_equations": ("fit", fit_normal_equations, None),
+    "map2d_scanner":        ("map2d", map2d_scanner, None),
+    "map2d_vector":         ("map2d", map2d_vector, None),
+    "map2d_tiles":          ("map2d", map2d_tiles, None),
+    "grid_accumulator":     ("map2d", grid_accumulator, None),
+    "map2d_stream":         ("map2d", map2d_stream, None),
+    "stl_top":              ("stl", stl_top, None),
+    "stl_walls":            ("stl", stl_walls, None),
+    "stl_stream":           ("stl", stl_stream, None),
+    "stl_tin":              ("stl", stl_tin, TIN_LIMIT),
+    "plot3d_plotly":        ("plot3d", plot3d_plotly, PLOT_LIMIT),
+    "plot3d_pointcodec":    ("plot3d", plot3d_pointcodec, None),
+    "outliers":             ("filter", outlier_filter, None),
+}
+
+
+# ---------------------------------------------------------
+# RUNNER
+# ---------------------------------------------------------
+def measure(fn, args, repeat, memory):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+        if best > 2.0:          # long stages: one run is representative
+            break
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(sizes=DEFAULT_SIZES, stages=None, repeat=3, memory=True, plot_limit=PLOT_LIMIT, log=print):
+    """{"stage": {"points": {"seconds", "peak_mb"}}} plus run metadata."""
+    names = stages or list(STAGES)
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="lidar-bench-")
+    try:
+        for n in sizes:
+            cloud = make_cloud(n)
+            g = _grid_info(*cloud)
+            for name in names:
+                _, fn, limit = STAGES[name]
+                if name == "plot3d_plotly":
+                    limit = plot_limit
+                if limit is not None and n > limit:
+                    continue
+                seconds, peak = measure(fn, (cloud, g, tmp), repeat, memory)
+                results.setdefault(name, {})[str(n)] = {
+                    "seconds": round(seconds, 6),
+                    "peak_mb": None if peak is None else round(peak, 2),
+                }
+                log(f"{name:22s} {n:>10,d} pts  {seconds:9.4f} s"
+                    + ("" if peak is None else f"  {peak:9.1f} MB"))
+            del cloud, g
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "stages": names, "results": results}
+
+
+def compare(current, baseline, time_threshold=TIME_THRESHOLD, mem_threshold=MEM_THRESHOLD,
+            stage_thresholds=None):
+    """Regressions as [(stage, points, what, old, new)]. A stage that was
+    run but skipped a size the baseline has (a size limit) counts as one;
+    stages or sizes missing from either side are otherwise ignored."""
+    stage_thresholds = stage_thresholds or {}
+    regressions = []
+    ran = {n for by_size in current["results"].values() for n in by_size}
+    for name in current.get("stages") or current["results"]:
+        by_size = current["results"].get(name, {})
+        old_stage = baseline.get("results", {}).get(name, {})
+        limit = stage_thresholds.get(name, time_threshold)
+        for n in sorted(set(old_stage) & ran - set(by_size), key=int):
+            regressions.append((name, n, "skipped", old_stage[n]["seconds"], None))
+        for n, cur in by_size.items():
+            old = old_stage.get(n)
+            if old is None:
+                continue
+            if max(cur["seconds"], old["seconds"]) >= NOISE_FLOOR_S and \
+                    cur["seconds"] > old["seconds"] * (1 + limit):
+                regressions.append((name, n, "seconds", old["seconds"], cur["seconds"]))
+            if cur["peak_mb"] is not None and old.get("peak_mb") is not None and \
+                    cur["peak_mb"] > old["peak_mb"] * (1 + mem_threshold) + 1.0:
+                regressions.append((name, n, "peak_mb", old["peak_mb"], cur["peak_mb"]))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the post-processing stages.")
+    ap.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                    help="comma-separated point counts")
+    ap.add_argument("--stages", help="comma-separated subset of: " + ", ".join(STAGES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--plot-limit", type=int, default=PLOT_LIMIT)
+    ap.add_argument("--baseline", default=BASELINE_FILE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--compare", action="store_true", help="exit 1 on regressions")
+    ap.add_argument("--threshold", type=float, default=TIME_THRESHOLD,
+                    help="allowed slowdown, 0.25 = 25 %%")
+    ap.add_argument("--mem-threshold", type=float, default=MEM_THRESHOLD)
+    ap.add_argument("--stage-threshold", action="append", default=[], metavar="STAGE=FRACTION",
+                    help="per-stage time threshold override")
+    ap.add_argument("--json", help="also write the results here")
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    stages = args.stages.split(",") if args.stages else None
+    for name in stages or ():
+        if name not in STAGES:
+            ap.error(f"unknown stage {name}")
+    result = run(sizes, stages, args.repeat, not args.no_memory, args.plot_limit)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        overrides = {k: float(v) for k, v in (s.split("=", 1) for s in args.stage_threshold)}
+        regressions = compare(result, baseline, args.threshold, args.mem_threshold, overrides)
+        for name, n, what, old, new in regressions:
+            print(f"REGRESSION {name} @ {n} pts: {what} {old} -> {new}")
+        if regressions:
+            return 1
+        print("no regressions against", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# Pan/tilt LiDAR scanner. The scan loop is scanner.py (single head),
+# engine.py (asyncio) and heads.py (multi-head); app.py is the web UI and
+# daemon.py the process that owns the hardware. Exported here: the rig
+# config object and the scan / view / export commands.
+from .config import ScanConfig, PROFILES, profile
+from .cli import main
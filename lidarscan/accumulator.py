@@ -0,0 +1,219 @@
+import math, threading
+import numpy as np
+
+# ---------------------------------------------------------
+# INCREMENTAL GROUND PLANE
+# ---------------------------------------------------------
+class PlaneFit:
+    """Least-squares plane z = a*x + b*y + c from running normal equations.
+
+    Gives the same coefficients as np.linalg.lstsq over all points, but
+    needs only twelve running sums.
+    """
+
+    def __init__(self):
+        self.ata = np.zeros((3, 3))
+        self.atb = np.zeros(3)
+
+    def add(self, x, y, z):
+        ata = self.ata
+        ata[0, 0] += x * x
+        ata[0, 1] += x * y
+        ata[0, 2] += x
+        ata[1, 1] += y * y
+        ata[1, 2] += y
+        ata[2, 2] += 1
+        self.atb += (x * z, y * z, z)
+
+    def add_many(self, xs, ys, zs, sign=1):
+        A = np.c_[xs, ys, np.ones_like(xs)]
+        self.ata += sign * (A.T @ A)
+        self.atb += sign * (A.T @ zs)
+
+    def remove_many(self, xs, ys, zs):
+        """Undo add_many() for these samples."""
+        self.add_many(xs, ys, zs, sign=-1)
+
+    def coeffs(self):
+        ata = np.triu(self.ata) + np.triu(self.ata, 1).T
+        coeffs, _, _, _ = np.linalg.lstsq(ata, self.atb, rcond=None)
+        return coeffs
+
+
+# ---------------------------------------------------------
+# ONLINE HEIGHTMAP
+# ---------------------------------------------------------
+class HeightAccumulator:
+    """Running per-cell max / count / sum, fed a sample or a batch at a time.
+
+    The grid is pre-sized from the expected footprint and grows (with
+    slack, so growth is amortised) when a sample lands outside it. Cells
+    sit on multiples of `cell`, like heightmap.grid_shape, so the occupied
+    part lines up with build_grid. Each cell also keeps where its highest
+    sample was, so that grid() can flatten it by the ground plane known
+    at read time. Reads from another thread get a consistent copy via
+    grid().
+    """
+
+    def __init__(self, cell, bounds=(-50.0, -50.0, 50.0, 50.0)):
+        self.cell = cell
+        self.plane = PlaneFit()
+        self.lock = threading.Lock()
+        x0, y0, x1, y1 = bounds
+        self.i0 = math.floor(x0 / cell)       # grid origin, in cells
+        self.j0 = math.floor(y0 / cell)
+        self._alloc(math.floor(y1 / cell) - self.j0 + 1, math.floor(x1 / cell) - self.i0 + 1)
+        self.samples = 0
+
+    def _alloc(self, ny, nx):
+        self.max = np.full((ny, nx), -np.inf)
+        self.max_x = np.zeros((ny, nx))       # where each cell's max sample was
+        self.max_y = np.zeros((ny, nx))
+        self.count = np.zeros((ny, nx), np.int32)
+        self.sum = np.zeros((ny, nx))
+
+    def _cells(self):
+        return self.max, self.max_x, self.max_y, self.count, self.sum
+
+    def _index(self, xs, ys):
+        return (np.floor(np.asarray(xs, float) / self.cell).astype(int) - self.i0,
+                np.floor(np.asarray(ys, float) / self.cell).astype(int) - self.j0)
+
+    def _grow(self, i, j):
+        ny, nx = self.max.shape
+        pad_l = max(-i, 0)
+        pad_b = max(-j, 0)
+        pad_r = max(i - nx + 1, 0)
+        pad_t = max(j - ny + 1, 0)
+        # add slack so a slowly drifting edge does not reallocate every sample
+        slack_x = max(nx // 2, 8)
+        slack_y = max(ny // 2, 8)
+        pad_l += slack_x if pad_l else 0
+        pad_r += slack_x if pad_r else 0
+        pad_b += slack_y if pad_b else 0
+        pad_t += slack_y if pad_t else 0
+
+        old = self._cells()
+        self._alloc(ny + pad_b + pad_t, nx + pad_l + pad_r)
+        for new, prev in zip(self._cells(), old):
+            new[pad_b:pad_b + ny, pad_l:pad_l + nx] = prev
+        self.i0 -= pad_l
+        self.j0 -= pad_b
+        return i + pad_l, j + pad_b
+
+    def add(self, x, y, z):
+        i = math.floor(x / self.cell) - self.i0
+        j = math.floor(y / self.cell) - self.j0
+        with self.lock:
+            ny, nx = self.max.shape
+            if not (0 <= i < nx and 0 <= j < ny):
+                i, j = self._grow(i, j)
+            if z > self.max[j, i]:
+                self.max[j, i] = z
+                self.max_x[j, i] = x
+                self.max_y[j, i] = y
+            self.count[j, i] += 1
+            self.sum[j, i] += z
+            self.plane.add(x, y, z)
+            self.samples += 1
+
+    def _fold(self, i, j, xs, ys, zs):
+        """Per-cell max / count / sum of a batch already inside the grid."""
+        if not len(zs):
+            return
+        ny, nx = self.max.shape
+        flat = j * nx + i
+        # the batch's highest sample per cell: sort by height, keep the last
+        order = np.lexsort((zs, flat))
+        last = np.r_[flat[order][1:] != flat[order][:-1], True]
+        top = order[last]
+        cells = flat[top]
+        higher = zs[top] > self.max.reshape(-1)[cells]
+        for grid, values in zip((self.max, self.max_x, self.max_y), (zs, xs, ys)):
+            grid.reshape(-1)[cells[higher]] = values[top[higher]]
+        self.count += np.bincount(flat, minlength=ny * nx).reshape(ny, nx).astype(np.int32)
+        self.sum += np.bincount(flat, zs, minlength=ny * nx).reshape(ny, nx)
+
+    def add_many(self, xs, ys, zs):
+        """Same result as add() per sample, reduced per cell with numpy."""
+        xs = np.asarray(xs, float)
+        ys = np.asarray(ys, float)
+        zs = np.asarray(zs, float)
+        if not len(xs):
+            return
+        with self.lock:
+            i, j = self._index(xs, ys)
+            for corner in (np.min, np.max):
+                ci, cj = corner(i), corner(j)
+                ny, nx = self.max.shape
+                if not (0 <= ci < nx and 0 <= cj < ny):
+                    ni, nj = self._grow(ci, cj)
+                    i += ni - ci
+                    j += nj - cj
+            self._fold(i, j, xs, ys, zs)
+            self.plane.add_many(xs, ys, zs)
+            self.samples += len(xs)
+
+    def drop(self, xs, ys, zs, keep):
+        """Take the samples with keep=False back out (outlier filtering).
+
+        xs, ys, zs must be every sample added so far. The plane sums lose
+        the dropped samples; the cells that held any are rebuilt from the
+        kept samples that fall in them.
+        """
+        xs = np.asarray(xs, float)
+        ys = np.asarray(ys, float)
+        zs = np.asarray(zs, float)
+        keep = np.asarray(keep, bool)
+        if keep.all():
+            return
+        with self.lock:
+            i, j = self._index(xs, ys)
+            nx = self.max.shape[1]
+            flat = j * nx + i
+            dirty = np.zeros(self.max.size, bool)
+            dirty[flat[~keep]] = True
+            for grid, empty in zip(self._cells(), (-np.inf, 0, 0, 0, 0)):
+                grid.reshape(-1)[dirty] = empty
+            redo = keep & dirty[flat]
+            self._fold(i[redo], j[redo], xs[redo], ys[redo], zs[redo])
+            self.plane.remove_many(xs[~keep], ys[~keep], zs[~keep])
+            self.samples -= int((~keep).sum())
+
+    def grid(self, flatten=True, reduce="max"):
+        """Occupied part of the grid as {"grid", "x0", "y0", "cell"}, or
+        None before the first sample.
+
+        With flatten=True the fitted ground plane is subtracted: at each
+        cell's highest sample for the max, so the result matches
+        build_grid up to the plane's tilt across one cell (build_grid
+        flattens before taking the max); at the cell centre for
+        reduce="mean", which returns per-cell means.
+        """
+        with self.lock:
+            occupied = self.count > 0
+            if not occupied.any():
+                return None
+            rows = np.nonzero(occupied.any(axis=1))[0]
+            cols = np.nonzero(occupied.any(axis=0))[0]
+            sj = slice(rows[0], rows[-1] + 1)
+            si = slice(cols[0], cols[-1] + 1)
+            if reduce == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    g = self.sum[sj, si] / self.count[sj, si]
+            else:
+                g = self.max[sj, si].copy()
+            at_x, at_y = self.max_x[sj, si].copy(), self.max_y[sj, si].copy()
+            g[~occupied[sj, si]] = np.nan
+            x0 = (self.i0 + cols[0]) * self.cell
+            y0 = (self.j0 + rows[0]) * self.cell
+            coeffs = self.plane.coeffs() if flatten else None
+
+        if flatten:
+            a, b, c = coeffs
+            if reduce == "mean":
+                ny, nx = g.shape
+                at_x = x0 + (np.arange(nx)[None, :] + 0.5) * self.cell
+                at_y = y0 + (np.arange(ny)[:, None] + 0.5) * self.cell
+            g -= a * at_x + b * at_y + c
+        return {"grid": g, "x0": x0, "y0": y0, "cell": self.cell}
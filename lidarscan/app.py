@@ -0,0 +1,472 @@
+from flask import Flask, jsonify, send_file, render_template, Response, request, abort
+from flask_cors import CORS
+import os
+import numpy as np
+from . import scanner
+from . import metrics
+from . import planner
+from . import changes
+from . import buildings
+from . import tiles
+from . import pointcodec
+from . import daemon
+from . import spatial
+from . import artifacts
+
+app = Flask(__name__)
+CORS(app)
+
+buildings_cache = (None, None)   # (grid the result belongs to, JSON result)
+pyramid_cache = (None, None)     # (grid, tiles.Pyramid)
+points_cache = (None, {})        # (cloud, {(delta, encoding): body})
+loaded_job = None
+
+# Scanning runs in this process unless LIDAR_DAEMON names the socket of a
+# daemon.py that owns the hardware (then any number of workers can serve).
+DAEMON = os.environ.get("LIDAR_DAEMON")
+backend = daemon.DaemonClient(DAEMON) if DAEMON else daemon.LocalScanner()
+
+# pages that read the last processed scan from scanner's globals
+RESULT_ENDPOINTS = {"plan_scan", "list_buildings", "three_d_plotly", "points_bin",
+                    "two_d_plotly", "heightmap_meta", "heightmap_tile", "heightmap_f16"}
+
+@app.before_request
+def load_results():
+    """With a daemon, the last scan was processed in another process: pick
+    up its heightmap and cloud from the spatial index it wrote."""
+    global loaded_job
+    if not DAEMON or request.endpoint not in RESULT_ENDPOINTS:
+        return
+    st = backend.status()
+    if st["scanning"] or not st["job"] or st["job"] == loaded_job:
+        return
+    try:
+        idx = spatial.open_job(scanner.SCAN_DIR, st["job"])
+    except (OSError, ValueError):
+        return
+    p = np.asarray(idx.points, float)
+    scanner.prepare_3d_plot(p[:, 0], p[:, 1], p[:, 2])
+    scanner.prepare_2d_map(None, None, None, {"grid": np.asarray(idx.heights, float),
+                                              "x0": idx.x0, "y0": idx.y0, "cell": idx.cell})
+    loaded_job = st["job"]
+
+@app.errorhandler(daemon.DaemonError)
+def daemon_unreachable(e):
+    return jsonify({"error": str(e)}), 503
+
+@app.errorhandler(artifacts.ParamError)
+def bad_params(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.route("/")
+def home():
+    return render_template("index.html")
+
+@app.route("/scan")
+def start_scan():
+    if request.args.get("record") == "1":
+        return jsonify(backend.submit("record"))
+
+    mode = request.args.get("mode", "step")
+    if mode not in planner.SCAN_MODES:
+        return jsonify({"error": "unknown mode", "modes": list(planner.SCAN_MODES)}), 400
+    return jsonify(backend.submit("scan", mode=mode))
+
+@app.route("/scan_multi")
+def start_multi_scan():
+    """Scan with every head in heads.HEADS at once (?simulate=1 for no hardware)."""
+    return jsonify(backend.submit("multi", simulate=request.args.get("simulate") == "1"))
+
+@app.route("/resume/<job_id>")
+def resume_scan(job_id):
+    if not spatial.valid_job(job_id):
+        return jsonify({"error": "bad job id"}), 400
+    return jsonify(backend.submit("resume", job=job_id))
+
+@app.route("/plan", methods=["POST"])
+def plan_scan():
+    """Plan (and optionally start) a scan over a region of interest.
+
+    JSON body: one of
+      {"rect": {"pan_min", "pan_max", "tilt_min", "tilt_max"}}
+      {"polygon": [[x, y], ...]}          scan coordinates in cm
+      {"polygon_cells": [[i, j], ...]}    picked on the last 2D heightmap
+      {"cells": [[i, j], ...]}            refinement cells of the last heightmap
+    plus optional "step" (deg), "mode" (planner.SCAN_MODES) and "start": true.
+    """
+    body = request.get_json(force=True)
+    step = _int(body.get("step", 1))
+    if step is None or step < 1:
+        return jsonify({"error": "step must be a whole number of degrees >= 1"}), 400
+    g = scanner.last_grid
+
+    if "rect" in body:
+        r = body["rect"]
+        if not isinstance(r, dict):
+            return jsonify({"error": "rect needs pan_min, pan_max, tilt_min, tilt_max"}), 400
+        pan = _range((r.get("pan_min"), r.get("pan_max")), 2)
+        tilt = _range((r.get("tilt_min"), r.get("tilt_max")), 2)
+        if pan is None or tilt is None:
+            return jsonify({"error": "rect needs pan_min <= pan_max and tilt_min <= tilt_max"}), 400
+        poses = planner.rectangle_poses(*pan, *tilt, step)
+    elif "polygon" in body:
+        polygon = _pairs(body["polygon"], float)
+        if polygon is None or len(polygon) < 3:
+            return jsonify({"error": "polygon needs at least 3 [x, y] points"}), 400
+        poses = planner.polygon_poses(polygon, scanner.HEIGHT_CM, step)
+    elif "polygon_cells" in body or "cells" in body:
+        if g is None:
+            return jsonify({"error": "no heightmap yet"}), 400
+        key = "cells" if "cells" in body else "polygon_cells"
+        cells = _pairs(body[key], int)
+        if not cells or (key == "polygon_cells" and len(cells) < 3):
+            return jsonify({"error": f"{key} needs [i, j] grid cells"}), 400
+        if key == "cells":
+            poses = planner.cell_poses(cells, g["x0"], g["y0"], g["cell"],
+                                       scanner.HEIGHT_CM, step)
+        else:
+            polygon = [(g["x0"] + i * g["cell"], g["y0"] + j * g["cell"]) for i, j in cells]
+            poses = planner.polygon_poses(polygon, scanner.HEIGHT_CM, step)
+    else:
+        return jsonify({"error": "need rect, polygon, polygon_cells or cells"}), 400
+
+    mode = body.get("mode", "step")
+    if mode not in planner.SCAN_MODES:
+        return jsonify({"error": "unknown mode", "modes": list(planner.SCAN_MODES)}), 400
+    result = planner.plan(poses, mode=mode)
+    if body.get("start"):
+        started = backend.submit("scan", poses=result["poses"], mode=mode)
+        if started["status"] == "busy":
+            return jsonify(started)
+        result.update(started)
+    return jsonify(result)
+
+def _int(v):
+    """int(v) for whole numbers (JSON or text), else None."""
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return int(f) if f.is_integer() else None
+
+def _range(r, n=3):
+    """[min, max, step] - or [min, max] with n=2 - as ints, or None if it
+    is malformed: wrong length, max below min, or step < 1."""
+    if not isinstance(r, (list, tuple)) or len(r) not in (n, 3):
+        return None
+    r = tuple(_int(v) for v in r[:n])
+    if None in r or r[0] > r[1] or (n == 3 and r[2] < 1):
+        return None
+    return r
+
+def _pairs(items, kind):
+    """[(a, b), ...] from a JSON list of pairs, or None if it isn't one."""
+    try:
+        pairs = [(kind(a), kind(b)) for a, b in items]
+    except (TypeError, ValueError):
+        return None
+    return pairs if all(map(np.isfinite, np.ravel(pairs))) else None
+
+@app.route("/plan/estimate", methods=["POST"])
+def plan_estimate():
+    """Predicted duration, points and coverage of a serpentine scan.
+
+    JSON body: {"pan": [min, max, step], "tilt": [min, max, step],
+    "mode": "step" | "average"}; missing keys use the current settings.
+    """
+    body = request.get_json(force=True)
+    mode = body.get("mode", "step")
+    if mode not in planner.SCAN_MODES:
+        return jsonify({"error": "unknown mode", "modes": list(planner.SCAN_MODES)}), 400
+    pan = _range(body.get("pan", (scanner.PAN_MIN, scanner.PAN_MAX, scanner.PAN_STEP)))
+    tilt = _range(body.get("tilt", (scanner.TILT_MIN, scanner.TILT_MAX, scanner.TILT_STEP)))
+    if pan is None or tilt is None:
+        return jsonify({"error": "pan and tilt need [min, max, step] with min <= max and step >= 1"}), 400
+    return jsonify(planner.predict(pan, tilt, scanner.HEIGHT_CM, scanner.GRID_SIZE, mode))
+
+@app.route("/plan/suggest", methods=["POST"])
+def plan_suggest():
+    """Finest steps that fit a time budget.
+
+    JSON body: {"budget_s": 180, "pan": [min, max], "tilt": [min, max],
+    "mode": "step"}.
+    """
+    body = request.get_json(force=True)
+    mode = body.get("mode", "step")
+    if mode not in planner.SCAN_MODES:
+        return jsonify({"error": "unknown mode", "modes": list(planner.SCAN_MODES)}), 400
+    if "budget_s" not in body:
+        return jsonify({"error": "need budget_s"}), 400
+    pan = _range(body.get("pan", (scanner.PAN_MIN, scanner.PAN_MAX)), 2)
+    tilt = _range(body.get("tilt", (scanner.TILT_MIN, scanner.TILT_MAX)), 2)
+    if pan is None or tilt is None:
+        return jsonify({"error": "pan and tilt need [min, max] with min <= max"}), 400
+    try:
+        budget = float(body["budget_s"])
+    except (TypeError, ValueError):
+        budget = float("nan")
+    if not budget > 0:
+        return jsonify({"error": "budget_s must be a positive number of seconds"}), 400
+    return jsonify(planner.suggest(pan, tilt, budget,
+                                   scanner.HEIGHT_CM, scanner.GRID_SIZE, mode))
+
+@app.route("/reference", methods=["POST"])
+def set_reference():
+    """Use the last full scan (scan_points.csv) as the change reference."""
+    if backend.status()["scanning"]:
+        return jsonify({"error": "scan in progress: set the reference once it has finished"}), 409
+    try:
+        ref = changes.reference_from_csv()
+    except FileNotFoundError:
+        return jsonify({"error": "no full scan yet (scan_points.csv is missing)"}), 404
+    return jsonify({"status": "ok", "points": int(len(ref["xs"]))})
+
+@app.route("/rescan")
+def incremental_rescan():
+    return jsonify(backend.submit("rescan"))
+
+@app.route("/changes")
+def last_changes():
+    return jsonify(backend.changes() or {"regions": []})
+
+@app.route("/buildings")
+def list_buildings():
+    """Connected building regions of the last heightmap as JSON."""
+    global buildings_cache
+    g = scanner.last_grid
+    if g is None:
+        return jsonify({"buildings": []})
+
+    if buildings_cache[0] is not g["grid"]:
+        _, found = buildings.segment(g["grid"], g["x0"], g["y0"], g["cell"],
+                                     scanner.BUILDING_THRESHOLD)
+        buildings_cache = (g["grid"], {
+            "threshold_cm": scanner.BUILDING_THRESHOLD,
+            "cell_cm": g["cell"],
+            "buildings": found,
+        })
+    return jsonify(buildings_cache[1])
+
+def query_index():
+    """SpatialIndex of ?job= (default: the newest scan), or None. 409 while
+    that job is still scanning: its index is not written yet."""
+    body = request.get_json(silent=True) or {}
+    job = request.args.get("job") or body.get("job")
+    st = backend.status()
+    if st["scanning"] and job in (None, st["job"]):
+        abort(409, "scan in progress: pass ?job= for an earlier one")
+    job = job or st["job"]
+    if not spatial.valid_job(job):
+        return None
+    try:
+        return spatial.open_job(scanner.SCAN_DIR, job)
+    except (OSError, ValueError):
+        return None
+
+def artifact_request():
+    """(job, params) when the request asks for a derived artifact (?job=
+    or any of artifacts.PARAMS), else None: serve the last scan as is."""
+    if "job" not in request.args and not any(k in request.args for k in artifacts.PARAMS):
+        return None
+    params = artifacts.parse_params(request.args)
+    job = request.args.get("job")
+    if not job:
+        st = backend.status()
+        if st["scanning"]:
+            abort(409, "scan in progress: pass ?job= for an earlier one")
+        job = st["job"]
+    if not spatial.valid_job(job):
+        abort(404)
+    try:
+        spatial.open_job(scanner.SCAN_DIR, job)     # built here if only the checkpoint exists
+    except (OSError, ValueError):
+        abort(404)
+    return job, params
+
+def query_args(*names):
+    values = [request.args.get(n, type=float) for n in names]
+    return None if None in values else values
+
+def points_reply(points):
+    limit = request.args.get("limit", spatial.MAX_POINTS, type=int)
+    return jsonify({"count": int(len(points)), "truncated": len(points) > limit,
+                    "points": np.round(points[:limit].astype(float), 2).tolist()})
+
+@app.route("/query/height")
+def query_height():
+    """Height above ground at ?x=&y= (cm)."""
+    idx, args = query_index(), query_args("x", "y")
+    if idx is None:
+        return jsonify({"error": "no index for this scan"}), 404
+    if args is None:
+        return jsonify({"error": "x and y required"}), 400
+    return jsonify(idx.height(*args))
+
+@app.route("/query/bbox")
+def query_bbox():
+    """Points with x0 <= x <= x1 and y0 <= y <= y1."""
+    idx, args = query_index(), query_args("x0", "y0", "x1", "y1")
+    if idx is None:
+        return jsonify({"error": "no index for this scan"}), 404
+    if args is None:
+        return jsonify({"error": "x0, y0, x1 and y1 required"}), 400
+    return points_reply(idx.bbox(*args))
+
+@app.route("/query/polygon", methods=["POST"])
+def query_polygon():
+    """Points inside {"polygon": [[x, y], ...]}."""
+    idx = query_index()
+    if idx is None:
+        return jsonify({"error": "no index for this scan"}), 404
+    vertices = _pairs((request.get_json(silent=True) or {}).get("polygon") or [], float)
+    if vertices is None or len(vertices) < 3:
+        return jsonify({"error": "polygon needs at least 3 [x, y] vertices"}), 400
+    return points_reply(idx.polygon(vertices))
+
+@app.route("/query/profile")
+def query_profile():
+    """Heights along the line (x0, y0) -> (x1, y1), every ?step= cm."""
+    idx, args = query_index(), query_args("x0", "y0", "x1", "y1")
+    if idx is None:
+        return jsonify({"error": "no index for this scan"}), 404
+    if args is None:
+        return jsonify({"error": "x0, y0, x1 and y1 required"}), 400
+    step = request.args.get("step", type=float)
+    if step is not None and not step > 0:
+        return jsonify({"error": "step must be > 0"}), 400
+    samples = idx.profile(*args, step=step)
+    return jsonify({"job": idx.meta["job"], "cell_cm": idx.cell,
+                    "profile": [{"d": d, "x": x, "y": y, "height_cm": h} for d, x, y, h in samples]})
+
+@app.route("/live2d")
+def live_heightmap():
+    """Partial heightmap of the scan in progress (null = no sample yet)."""
+    return jsonify(backend.live())
+
+@app.route("/status")
+def status():
+    return jsonify(backend.status())
+
+@app.route("/metrics")
+def prometheus_metrics():
+    text = backend.metrics()
+    if DAEMON:
+        # scans are timed in the daemon; this worker adds its own (app_*) series
+        text += metrics.render_prometheus(prefix="app_")
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+@app.route("/timings")
+@app.route("/timings/<job_id>")
+def timings(job_id=None):
+    data = backend.timings(job_id)
+    if data is None:
+        return jsonify({"error": "no such job"}), 404
+    return jsonify(data)
+
+@app.route("/view3d")
+def three_d():
+    return render_template("points.html")
+
+@app.route("/view3d_plotly")
+def three_d_plotly():
+    if scanner.last_points is None:
+        return "<h2>No scan yet</h2>"
+    return scanner.get_3d_html()
+
+@app.route("/points.bin")
+def points_bin():
+    """Quantized, optionally delta-encoded cloud (see pointcodec.py)."""
+    global points_cache
+    delta = request.args.get("delta", "1") == "1"
+    accept = request.headers.get("Accept-Encoding", "")
+    derived = artifact_request()
+    if derived is not None:
+        body, encoding = artifacts.points(*derived, delta=delta, accept_encoding=accept)
+    else:
+        cloud = scanner.last_points
+        if cloud is None:
+            abort(404)
+        if points_cache[0] is not cloud:
+            points_cache = (cloud, {})
+        key = (delta, "zstd" if "zstd" in accept and pointcodec.zstandard else "gzip")
+        if key not in points_cache[1]:
+            payload = pointcodec.encode(*cloud, delta=delta)
+            points_cache[1][key] = pointcodec.compress(payload, accept)
+        body, encoding = points_cache[1][key]
+
+    resp = Response(body, mimetype="application/octet-stream")
+    resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+@app.route("/view2d")
+def two_d():
+    return render_template("heightmap.html")
+
+@app.route("/view2d_plotly")
+def two_d_plotly():
+    if scanner.last_grid is None:
+        return "<h2>No scan yet</h2>"
+    return scanner.get_2d_html()
+
+def current_pyramid():
+    global pyramid_cache
+    derived = artifact_request()
+    if derived is not None:
+        return artifacts.pyramid(*derived)
+    g = scanner.last_grid
+    if g is None:
+        return None
+    if pyramid_cache[0] is not g["grid"]:
+        pyramid_cache = (g["grid"], tiles.Pyramid(g))
+    return pyramid_cache[1]
+
+@app.route("/heightmap/meta")
+def heightmap_meta():
+    pyr = current_pyramid()
+    if pyr is None:
+        return jsonify({"error": "No scan yet"}), 404
+    return jsonify(pyr.meta())
+
+@app.route("/heightmap/tile/<int:level>/<int:tx>/<int:ty>.png")
+def heightmap_tile(level, tx, ty):
+    pyr = current_pyramid()
+    if pyr is None or level >= len(pyr.levels):
+        abort(404)
+    png = pyr.tile(level, tx, ty)
+    if png is None:
+        abort(404)
+    resp = Response(png, mimetype="image/png")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/heightmap.f16")
+def heightmap_f16():
+    """Raw float16 heights, row-major from the lowest y row, gzip-encoded
+    for clients that accept it."""
+    pyr = current_pyramid()
+    if pyr is None:
+        abort(404)
+    gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+    resp = Response(pyr.float16(gzipped=gzipped), mimetype="application/octet-stream")
+    if gzipped:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["X-Grid-Shape"] = "%d,%d" % pyr.levels[0].shape
+    return resp
+
+@app.route("/download_stl")
+def download_stl():
+    derived = artifact_request()
+    if derived is not None:
+        return send_file(os.path.abspath(artifacts.stl(*derived)), as_attachment=True,
+                         download_name="scan-%s.stl" % derived[0])
+    # outputs are in the working directory; send_file would look next to app.py
+    return send_file(os.path.abspath("scan_mesh.stl"), as_attachment=True)
+
+@app.route("/download_csv")
+def download_csv():
+    return send_file(os.path.abspath("scan_points.csv"), as_attachment=True)
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,360 @@
+import os, io, json, time, fcntl, hashlib, threading
+from collections import OrderedDict
+import numpy as np
+from . import scanner
+from . import metrics
+from . import heightmap
+from . import spatial
+from . import tiles
+from . import pointcodec
+from . import mesh
+
+# ---------------------------------------------------------
+# DERIVED-ARTIFACT CACHE
+# ---------------------------------------------------------
+# /view2d, /view3d and /download_stl take processing parameters
+#   ?job=<id>&grid=1&threshold=4&decimate=2&scale=magma&mesh=delaunay&walls=1
+# and the heightmap, point payload or STL for them is derived from the
+# job's spatial index (scans/<job>/index) on first request.
+#
+#   memory  LRU of ready objects (pyramids with their rendered tiles,
+#           compressed payloads), MEMORY_BYTES in total
+#   disk    scans/<job>/derived/<kind>-<hash>, DISK_BYTES over all jobs,
+#           oldest use evicted first (never one used in the last
+#           EVICT_GRACE_S); shared by every worker process. Each worker
+#           adds what it writes to the total of its last walk over the
+#           folders and only walks again (and evicts) once that goes
+#           over budget
+#
+# Keys are the job, the index build time (a rebuilt index never serves
+# stale artifacts) and the parameters the artifact depends on, so e.g.
+# the colour scale does not fork the heightmap on disk. Identical
+# requests that arrive while one is computing wait for it: threads on an
+# in-process flight, other workers on a lock file next to the artifact.
+DERIVED_DIR = "derived"
+MEMORY_BYTES = 64 * 2**20
+DISK_BYTES = 512 * 2**20
+EVICT_GRACE_S = 60.0    # files used this recently stay: a worker may be sending one
+MAX_GRID_CELLS = 4_000_000      # grid sizes finer than this for the scan are refused
+
+PARAMS = {      # name -> (parse, default)
+    "grid": (float, lambda: scanner.GRID_SIZE),
+    "threshold": (float, lambda: scanner.BUILDING_THRESHOLD),
+    "decimate": (int, lambda: 1),
+    "scale": (str, lambda: "viridis"),
+    "mesh": (str, lambda: scanner.STL_MESH),
+    "walls": (lambda v: v in ("1", "true", "yes"), lambda: scanner.STL_WALLS),
+}
+
+
+class ParamError(ValueError):
+    pass
+
+
+def parse_params(args):
+    """Processing parameters from a query-string mapping; ParamError if
+    one is malformed or out of range."""
+    p = {}
+    for name, (parse, default) in PARAMS.items():
+        raw = args.get(name)
+        try:
+            p[name] = default() if raw in (None, "") else parse(raw)
+        except (TypeError, ValueError):
+            raise ParamError(f"bad {name}: {raw!r}")
+    if not p["grid"] > 0:
+        raise ParamError("grid must be > 0")
+    if p["decimate"] < 1:
+        raise ParamError("decimate must be >= 1")
+    if p["scale"] not in tiles.SCALES:
+        raise ParamError(f"scale must be one of {', '.join(tiles.SCALES)}")
+    if p["mesh"] not in ("grid", "delaunay"):
+        raise ParamError("mesh must be grid or delaunay")
+    return p
+
+
+# ---------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------
+class LRU:
+    """Thread-safe LRU bounded by the total size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()      # key -> (value, size)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.items.get(key)
+            if hit is None:
+                return None
+            self.items.move_to_end(key)
+            return hit[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes // 4:      # one huge artifact must not flush everything
+            return
+        with self.lock:
+            if key in self.items:
+                self.size -= self.items.pop(key)[1]
+            self.items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, s) = self.items.popitem(last=False)
+                self.size -= s
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ArtifactCache:
+    def __init__(self, scan_dir=None, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES):
+        self.scan_dir = scan_dir        # None = scanner.SCAN_DIR at call time
+        self.memory = LRU(memory_bytes)
+        self.disk_bytes = disk_bytes
+        self.disk_used = None           # bytes on disk at the last walk + our writes since
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def _root(self):
+        return self.scan_dir or scanner.SCAN_DIR
+
+    def single(self, key, fn):
+        """Run fn once for concurrent callers with the same key."""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            metrics.count("app_artifact_collapsed_total")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def path(self, job, name):
+        return os.path.join(self._root(), job, DERIVED_DIR, name)
+
+    def file(self, job, name, compute):
+        """Path of a derived file, running compute(tmp_path) to create it
+        if no worker has yet."""
+        path = self.path(job, name)
+
+        def load():
+            if os.path.exists(path):
+                os.utime(path)      # mtime = last use, for eviction
+                metrics.count("app_artifact_disk_hits_total")
+                return path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            wrote = 0
+            with open(path + ".lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)     # another worker may be on it
+                if not os.path.exists(path):
+                    metrics.count("app_artifact_misses_total")
+                    tmp = "%s.%d.tmp" % (path, os.getpid())
+                    t0 = metrics.now()
+                    try:
+                        compute(tmp)
+                        os.replace(tmp, path)
+                    except BaseException:
+                        if os.path.exists(tmp):
+                            os.remove(tmp)
+                        raise
+                    metrics.observe("app_artifact_build_seconds", metrics.now() - t0,
+                                    kind=name.split("-")[0])
+                    wrote = os.path.getsize(path)
+            if wrote:
+                self._account(wrote)
+            return path
+
+        return self.single(("file", job, name), load)
+
+    def get(self, job, name, compute, load=None, size=None):
+        """In-memory object for a derived file: load(bytes) (default: the
+        bytes) cached by size(object) (default: len)."""
+        key = (job, name)
+        value = self.memory.get(key)
+        if value is not None:
+            metrics.count("app_artifact_memory_hits_total")
+            return value
+
+        def build():
+            value = self.memory.get(key)
+            if value is not None:
+                return value
+            with open(self.file(job, name, compute), "rb") as f:
+                data = f.read()
+            value = load(data) if load else data
+            self.memory.put(key, value, size(value) if size else len(data))
+            return value
+
+        return self.single(("get", job, name), build)
+
+    def _account(self, size):
+        """Count a newly written file; evict once the total is over budget."""
+        with self.lock:
+            if self.disk_used is not None:
+                self.disk_used += size
+            over = self.disk_used is None or self.disk_used > self.disk_bytes
+        if over:
+            self.evict_disk()
+
+    def evict_disk(self):
+        """Delete least recently used derived files beyond disk_bytes."""
+        root = self._root()
+        recent = time.time() - EVICT_GRACE_S
+        files = []
+        try:
+            jobs = os.listdir(root)
+        except OSError:
+            return
+        for job in jobs:
+            folder = os.path.join(root, job, DERIVED_DIR)
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith((".lock", ".tmp")):
+                    continue
+                try:
+                    st = os.stat(os.path.join(folder, name))
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, os.path.join(folder, name)))
+        total = sum(f[1] for f in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.disk_bytes or mtime > recent:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            try:
+                os.remove(path + ".lock")
+            except OSError:
+                pass
+        with self.lock:
+            self.disk_used = total
+
+
+cache = ArtifactCache()
+
+
+# ---------------------------------------------------------
+# ARTIFACTS
+# ---------------------------------------------------------
+def _name(kind, idx, params, ext):
+    """<kind>-<hash><ext>: the hash covers the parameters and the index build."""
+    key = json.dumps([idx.stamp, params], sort_keys=True)
+    return "%s-%s%s" % (kind, hashlib.sha1(key.encode()).hexdigest()[:16], ext)
+
+
+def _points(idx, decimate):
+    p = np.asarray(idx.points[::decimate], float)
+    return p[:, 0], p[:, 1], p[:, 2]
+
+
+def _grid(idx, p):
+    """{"grid", "x0", "y0", "cell"} at p["grid"] cm from every decimate-th point.
+    The stored heights are reused when nothing changes."""
+    if p["decimate"] == 1 and p["grid"] == idx.cell:
+        return {"grid": np.asarray(idx.heights, float), "x0": idx.x0, "y0": idx.y0, "cell": idx.cell}
+    xs, ys, zs = _points(idx, p["decimate"])
+    x0, y0, nx, ny = heightmap.grid_shape(xs, ys, p["grid"])
+    if nx * ny > MAX_GRID_CELLS:
+        raise ParamError(f"grid {p['grid']} cm gives {nx} x {ny} cells for this scan")
+    zf = heightmap.flatten(xs, ys, zs, heightmap.fit_ground(xs, ys, zs))
+    return {"grid": heightmap.max_grid(xs, ys, zf, x0, y0, p["grid"], nx, ny),
+            "x0": x0, "y0": y0, "cell": p["grid"]}
+
+
+def _grid_file(idx, p):
+    def compute(tmp):
+        g = _grid(idx, p)
+        with open(tmp, "wb") as f:
+            np.savez(f, grid=g["grid"].astype(np.float32), x0=g["x0"], y0=g["y0"], cell=g["cell"])
+    return _name("heightmap", idx, {k: p[k] for k in ("grid", "decimate")}, ".npz"), compute
+
+
+def _load_grid(data):
+    z = np.load(io.BytesIO(data))
+    return {"grid": z["grid"].astype(float), "x0": float(z["x0"]),
+            "y0": float(z["y0"]), "cell": float(z["cell"])}
+
+
+def pyramid(job, p):
+    """tiles.Pyramid of a job's heightmap at p["grid"] / p["decimate"] in p["scale"]."""
+    idx = spatial.open_job(scanner.SCAN_DIR, job)
+    grid_name, compute = _grid_file(idx, p)
+    key = (job, grid_name, p["scale"])
+    pyr = cache.memory.get(key)
+    if pyr is not None:
+        return pyr
+
+    def build():
+        pyr = cache.memory.get(key)
+        if pyr is None:
+            g = cache.get(job, grid_name, compute, _load_grid, lambda g: g["grid"].nbytes)
+            pyr = tiles.Pyramid(g, tiles.lut(p["scale"]))
+            # levels + the tiles it will render (about the size of level 0 again)
+            cache.memory.put(key, pyr, 2 * sum(level.nbytes for level in pyr.levels))
+        return pyr
+
+    return cache.single(key, build)
+
+
+def points(job, p, delta=True, accept_encoding=""):
+    """(compressed pointcodec payload, content-encoding)."""
+    idx = spatial.open_job(scanner.SCAN_DIR, job)
+    encoding = "zstd" if "zstd" in accept_encoding and pointcodec.zstandard else "gzip"
+
+    def compute(tmp):
+        xs, ys, zs = _points(idx, p["decimate"])
+        payload = pointcodec.encode(xs, ys, zs, delta=delta, lut=tiles.lut(p["scale"]))
+        body, _ = pointcodec.compress(payload, encoding)
+        with open(tmp, "wb") as f:
+            f.write(body)
+
+    name = _name("points", idx, {"decimate": p["decimate"], "scale": p["scale"],
+                                 "delta": delta, "encoding": encoding}, ".bin")
+    return cache.get(job, name, compute), encoding
+
+
+def stl(job, p):
+    """Path of the binary STL for a job: grid mesh (optionally with walls
+    at p["threshold"]) or the Delaunay surface."""
+    idx = spatial.open_job(scanner.SCAN_DIR, job)
+    if p["mesh"] == "delaunay":
+        keys = ("mesh", "decimate")
+
+        def compute(tmp):
+            scanner.save_tin(*_points(idx, p["decimate"]), tmp)
+    else:
+        keys = ("mesh", "grid", "decimate", "walls") + (("threshold",) if p["walls"] else ())
+
+        def compute(tmp):
+            g = _grid(idx, p)
+            with mesh.StlWriter(tmp) as w:
+                mesh.write_surface(w, g)
+                if p["walls"]:
+                    scanner.write_walls(w.tri, g["grid"], g["x0"], g["y0"], g["cell"], p["threshold"])
+
+    return cache.file(job, _name("stl", idx, {k: p[k] for k in keys}, ".stl"), compute)
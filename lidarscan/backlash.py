@@ -0,0 +1,235 @@
+import os, sys, json, math, time
+import numpy as np
+
+# ---------------------------------------------------------
+# SERVO BACKLASH / HYSTERESIS TABLES
+# ---------------------------------------------------------
+# Cheap servos stop short of the commanded angle by an amount that
+# depends on the side they approach from (gear backlash + dead band) and
+# ring for a while before they stop. The serpentine reverses pan on every
+# row, so uncorrected rows land offset from each other (zig-zag edges).
+#
+# scans/backlash.json:
+#   {"pan":  {"up":   {"angles": [...], "error": [...], "settle_s": s},
+#             "down": {...}},
+#    "tilt": {...}, "height_cm": h, "created": "..."}
+# error = actual - commanded angle (degrees) after a move in that
+# direction ("up" = increasing angle), linear between calibrated angles
+# and constant beyond them. An empty table corrects nothing.
+FILE = os.path.join("scans", "backlash.json")
+DIRECTIONS = {1: "up", -1: "down"}
+
+# calibration
+CAL_RANGE = 40          # degrees either side of centre, per axis
+CAL_STEP = 5
+MIN_ANGLE = 15          # below this the table distance barely changes with angle
+APPROACH_DEG = 6        # start this far back so the final move has a direction
+REPEATS = 2
+WINDOW_S = 0.4          # frames sampled after each move
+REST_S = 0.3            # wait at the approach angle
+TOL_CM = 1.0            # "settled" once every later frame is this close to the final distance
+
+
+def load(path=FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(table, path=FILE):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(table, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------
+# CORRECTIONS (scalars or arrays)
+# ---------------------------------------------------------
+def _interp(table, axis, name, angle):
+    entry = table.get(axis, {}).get(name)
+    if not entry or not entry.get("angles"):
+        return np.zeros_like(angle, float)
+    return np.interp(angle, entry["angles"], entry["error"])
+
+
+def error(table, axis, angle, direction):
+    """Expected actual - commanded angle after a move in `direction`."""
+    up = _interp(table, axis, "up", angle)
+    down = _interp(table, axis, "down", angle)
+    return np.where(np.asarray(direction) > 0, up, down)
+
+
+def command(table, axis, angle, direction):
+    """Angle to command so the shaft stops at `angle`."""
+    c = angle
+    for _ in range(3):      # c + error(c) = angle; the table is smooth
+        c = angle - error(table, axis, c, direction)
+    return c
+
+
+def actual(table, axis, commanded, direction):
+    """Where the shaft stops when `commanded` is sent."""
+    return commanded + error(table, axis, commanded, direction)
+
+
+def settle(table, axis, direction, default):
+    entry = table.get(axis, {}).get(DIRECTIONS[direction])
+    return entry["settle_s"] if entry and entry.get("settle_s") is not None else default
+
+
+def directions(angles, start=0.0):
+    """Direction of the move into each angle of a route, starting from
+    `start` (the home position); holding still keeps the last one."""
+    a = np.asarray(angles, float)
+    step = np.sign(np.diff(a, prepend=start))
+    last = np.where(step != 0, np.arange(len(a)), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, step[np.maximum(last, 0)], 1.0)
+
+
+def route_angles(angles, axis, motion_table, project_table, start=0.0):
+    """Modelled shaft angles along a recorded route: commands as the scan
+    computed them from motion_table, corrected by project_table."""
+    d = directions(angles, start)
+    cmd = command(motion_table, axis, np.asarray(angles, float), d)
+    return actual(project_table, axis, cmd, d)
+
+
+# ---------------------------------------------------------
+# CALIBRATION
+# ---------------------------------------------------------
+# The known target is the bare table at the rig height h: with the other
+# axis at 0 the beam meets it at dist = h / cos(angle), so an averaged
+# distance gives the true angle acos(h / dist). Clear the table first;
+# hysteresis (up - down) does not depend on h, the absolute error does.
+def _drive(gpio, pin, angle):
+    from . import scanner
+    target = scanner.pulse(angle)
+    current = gpio.get_servo_pulsewidth(pin)
+    if 500 <= current <= 2500:
+        for width in scanner.ramp(current, target):
+            gpio.set_servo_pulsewidth(pin, width)
+            time.sleep(scanner.SERVO_STEP_S)
+    gpio.set_servo_pulsewidth(pin, target)
+
+
+def _trace(gpio, pin, angle, port, window):
+    """[(seconds since the final pulse, dist)] while the shaft settles."""
+    from . import scanner
+    _drive(gpio, pin, angle)
+    t0 = time.monotonic()
+    frames = []
+    while time.monotonic() - t0 < window:
+        dist = scanner.read_lidar(port)
+        frames.append((time.monotonic() - t0, dist))
+    return frames
+
+
+def _settled(frames):
+    """(mean settled distance, settle time) of one trace."""
+    dist = np.array([d for _, d in frames], float)
+    final = np.median(dist[len(dist) // 2:])
+    # 3-frame running median so single noisy frames do not count as motion
+    smooth = dist.copy()
+    if len(dist) >= 3:
+        smooth[1:-1] = np.median(np.stack([dist[:-2], dist[1:-1], dist[2:]]), axis=0)
+    bad = np.nonzero(np.abs(smooth - final) > TOL_CM)[0]
+    first = bad[-1] + 1 if len(bad) else 0
+    if first >= len(dist):
+        first = len(dist) - 1
+    return dist[first:].mean(), frames[first][0]
+
+
+def calibrate(gpio=None, port=None, height=None, axes=("pan", "tilt"),
+              repeats=REPEATS, window=WINDOW_S, log=print):
+    """Measure per-direction angle error and settle time of each axis
+    against the table; returns a table for save()."""
+    from . import scanner
+    scanner.open_hardware()
+    gpio = scanner.pi if gpio is None else gpio
+    port = scanner.ser if port is None else port
+    height = scanner.HEIGHT_CM if height is None else height
+    angles = [a for a in range(-CAL_RANGE, CAL_RANGE + 1, CAL_STEP) if abs(a) >= MIN_ANGLE]
+    pins = {"pan": (scanner.PAN_PIN, scanner.TILT_PIN), "tilt": (scanner.TILT_PIN, scanner.PAN_PIN)}
+
+    table = {"height_cm": height, "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+    gpio.set_servo_pulsewidth(scanner.PAN_PIN, 1500)
+    gpio.set_servo_pulsewidth(scanner.TILT_PIN, 1500)
+    time.sleep(0.5)
+    try:
+        for axis in axes:
+            pin, other = pins[axis]
+            _drive(gpio, other, 0)
+            time.sleep(REST_S)
+            table[axis] = {}
+            for direction, name in DIRECTIONS.items():
+                good, errors, settles = [], [], []
+                for a in angles:
+                    runs = []
+                    for _ in range(repeats):
+                        _drive(gpio, pin, a - direction * APPROACH_DEG)
+                        time.sleep(REST_S)
+                        dist, t = _settled(_trace(gpio, pin, a, port, window))
+                        settles.append(t)
+                        if dist > height:
+                            runs.append(math.copysign(math.degrees(math.acos(height / dist)), a) - a)
+                    if runs:
+                        good.append(a)
+                        errors.append(round(float(np.median(runs)), 3))
+                settle_s = round(float(np.percentile(settles, 90)), 3)
+                table[axis][name] = {"angles": good, "error": errors, "settle_s": settle_s}
+                log(f"{axis:4s} {name:4s} error {np.mean(errors) if errors else float('nan'):+.2f} deg"
+                    f"  settle {settle_s * 1000:.0f} ms  ({len(good)}/{len(angles)} angles)")
+    finally:
+        gpio.set_servo_pulsewidth(scanner.PAN_PIN, 0)
+        gpio.set_servo_pulsewidth(scanner.TILT_PIN, 0)
+    return table
+
+
+def summary(table):
+    out = {}
+    for axis in ("pan", "tilt"):
+        entry = table.get(axis)
+        if not entry:
+            continue
+        up, down = entry.get("up", {}), entry.get("down", {})
+        row = {name: {"mean_error_deg": round(float(np.mean(e["error"])), 3) if e.get("error") else None,
+                      "settle_s": e.get("settle_s")} for name, e in (("up", up), ("down", down))}
+        if up.get("error") and down.get("error"):
+            grid = sorted(set(up["angles"]) | set(down["angles"]))
+            row["hysteresis_deg"] = round(float(np.mean(
+                _interp(table, axis, "down", np.asarray(grid, float))
+                - _interp(table, axis, "up", np.asarray(grid, float)))), 3)
+        out[axis] = row
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Calibrate servo backlash against a clear table.")
+    ap.add_argument("-o", "--out", default=FILE)
+    ap.add_argument("--height", type=float, help="LiDAR height above the table in cm")
+    ap.add_argument("--axes", default="pan,tilt")
+    ap.add_argument("--repeats", type=int, default=REPEATS)
+    ap.add_argument("--show", action="store_true", help="print the stored table and exit")
+    ap.add_argument("--simulate", action="store_true", help="use simulator.py (empty scene)")
+    ap.add_argument("--sim-backlash", type=float, default=2.0, help="simulated dead band in degrees")
+    ap.add_argument("--sim-lag", type=float, default=0.03, help="simulated servo time constant in s")
+    args = ap.parse_args()
+
+    if args.show:
+        print(json.dumps(summary(load(args.out)), indent=2))
+        sys.exit(0)
+    if args.simulate:
+        from . import simulator
+        simulator.install(scene=[], realtime=True, backlash=args.sim_backlash, lag_s=args.sim_lag)
+    table = calibrate(height=args.height, axes=args.axes.split(","), repeats=args.repeats)
+    save(table, args.out)
+    print(json.dumps(summary(table), indent=2))
+    print("written to", args.out)
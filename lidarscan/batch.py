@@ -0,0 +1,201 @@
+import os, sys, glob, json, time, hashlib, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from . import scanner
+from . import heightmap
+from . import outliers
+from . import buildings
+from . import checkpoint
+from . import backlash
+from . import tiles
+from . import pointfile
+from . import streaming
+
+# ---------------------------------------------------------
+# HEADLESS BATCH REPROCESSING
+# ---------------------------------------------------------
+# python -m lidarscan.batch scans/* scan_points.csv --grid 1.5 --height 68 -o out
+#
+# Inputs are checkpoint logs (scans/<job>/samples.ckpt or the job folder),
+# which keep raw pan/tilt/distance and are re-projected with the given
+# mount calibration (and the backlash table the scan ran with, or a newer
+# one from --backlash), or CSV clouds (x, y, z) which are used as they are.
+# Point files (.pts) are too big to load and go through streaming.py.
+# Nothing here opens pigpio or the UART.
+#
+# Every output folder is named after a hash of the input bytes and the
+# processing parameters; folders that already hold a manifest are skipped.
+VERSION = 1             # bump when the outputs change for the same inputs
+MANIFEST = "manifest.json"
+
+
+def find_inputs(paths):
+    found = []
+    for p in paths:
+        for q in sorted(glob.glob(p)) or [p]:
+            if os.path.isdir(q):
+                q = os.path.join(q, checkpoint.FILE_NAME)
+            if os.path.isfile(q):
+                found.append(q)
+    return found
+
+
+def cache_key(path, params):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    if params.get("backlash"):      # a recalibrated table must not hit the cache
+        with open(params["backlash"], "rb") as f:
+            h.update(f.read())
+    h.update(json.dumps([VERSION, params], sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def out_dir_for(path, key, out_root):
+    base = os.path.basename(os.path.dirname(path)) if path.endswith(checkpoint.FILE_NAME) \
+        else os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(out_root, f"{base}-{key}")
+
+
+# ---------------------------------------------------------
+# ONE SCAN (runs in a worker process)
+# ---------------------------------------------------------
+def load_points(path, params):
+    """(xs, ys, zs) arrays; checkpoints are projected like scanner.project."""
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+        return df["x"].to_numpy(float), df["y"].to_numpy(float), df["z"].to_numpy(float)
+
+    meta, samples, _, _ = checkpoint.load(path)
+    if not samples:
+        raise ValueError(f"{path}: no completed rows")
+    tilt, pan, dist = np.asarray(samples, float)[:, :3].T
+    height = params["height"] if params["height"] is not None else meta.get("HEIGHT_CM", scanner.HEIGHT_CM)
+    # rebuild the commands the scan sent, then the shaft angles they gave
+    table = meta.get("BACKLASH_TABLE") or {}
+    motion = table if meta.get("BACKLASH_MOTION") else {}
+    if params.get("backlash"):
+        project = backlash.load(params["backlash"])
+    else:
+        project = table if meta.get("BACKLASH_PROJECT") else {}
+    pan = backlash.route_angles(pan, "pan", motion, project)
+    tilt = backlash.route_angles(tilt, "tilt", motion, project)
+    a = np.radians(pan + params["pan_offset"])
+    b = np.radians(tilt + params["tilt_offset"])
+    return (dist * np.cos(b) * np.sin(a),
+            dist * np.sin(b),
+            height - dist * np.cos(a) * np.cos(b))
+
+
+def process_one(path, params, out):
+    if path.endswith(pointfile.EXTENSION):
+        return streaming.process_file(path, out, params["grid"], params["threshold"])
+    t0 = time.perf_counter()
+    xs, ys, zs = load_points(path, params)
+    os.makedirs(out, exist_ok=True)
+    pd.DataFrame({"x": xs, "y": ys, "z": zs}).to_csv(os.path.join(out, "points.csv"), index=False)
+
+    n_raw = len(xs)
+    if params["filter"]:
+        xs, ys, zs = outliers.filter_points(xs, ys, zs)
+
+    cell = params["grid"]
+    zf = heightmap.flatten(xs, ys, zs, heightmap.fit_ground(xs, ys, zs))
+    x0, y0, nx, ny = heightmap.grid_shape(xs, ys, cell)
+    grid = heightmap.max_grid(xs, ys, zf, x0, y0, cell, nx, ny)
+    grid_info = {"grid": grid, "x0": x0, "y0": y0, "cell": cell}
+    np.savez_compressed(os.path.join(out, "heightmap.npz"), **grid_info)
+
+    finite = grid[np.isfinite(grid)]
+    vmin, vmax = (finite.min(), finite.max()) if finite.size else (0.0, 1.0)
+    with open(os.path.join(out, "heightmap.png"), "wb") as f:
+        f.write(tiles.encode_png(tiles.colorize(grid[::-1], vmin, vmax)))
+
+    scanner.save_stl(xs, ys, zs, grid_info, os.path.join(out, scanner.STL_NAME),
+                     params.get("mesh"))
+
+    _, found = buildings.segment(grid, x0, y0, cell, params["threshold"])
+    with open(os.path.join(out, "buildings.json"), "w") as f:
+        json.dump({"threshold_cm": params["threshold"], "cell_cm": cell,
+                   "buildings": found}, f)
+
+    if params["plots"]:
+        # same figures as the /view3d_plotly and /view2d_plotly pages
+        scanner.prepare_3d_plot(xs, ys, zs)
+        scanner.prepare_2d_map(xs, ys, zs, grid_info)
+        with open(os.path.join(out, "plot3d.html"), "w") as f:
+            f.write(scanner.get_3d_html())
+        with open(os.path.join(out, "map2d.html"), "w") as f:
+            f.write(scanner.get_2d_html())
+
+    manifest = {"input": path, "params": params, "points": n_raw,
+                "points_filtered": int(len(xs)), "grid_shape": [ny, nx],
+                "buildings": len(found), "seconds": round(time.perf_counter() - t0, 3)}
+    with open(os.path.join(out, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ---------------------------------------------------------
+# DRIVER
+# ---------------------------------------------------------
+def run(paths, params, out_root="batch_out", jobs=None, force=False):
+    """Process every input on a process pool; returns [(path, out, status)]."""
+    todo, results = [], []
+    for path in find_inputs(paths):
+        out = out_dir_for(path, cache_key(path, params), out_root)
+        if not force and os.path.exists(os.path.join(out, MANIFEST)):
+            results.append((path, out, "cached"))
+        else:
+            todo.append((path, out))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            futures = {pool.submit(process_one, path, params, out): (path, out)
+                       for path, out in todo}
+            for fut in as_completed(futures):
+                path, out = futures[fut]
+                try:
+                    fut.result()
+                    results.append((path, out, "done"))
+                except Exception as e:
+                    results.append((path, out, f"failed: {e}"))
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Reprocess stored scans without hardware.")
+    ap.add_argument("inputs", nargs="+", help="samples.ckpt files, job folders, CSV clouds or .pts point files")
+    ap.add_argument("-o", "--out", default="batch_out")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: cores)")
+    ap.add_argument("--grid", type=float, default=scanner.GRID_SIZE, help="cell size in cm")
+    ap.add_argument("--threshold", type=float, default=scanner.BUILDING_THRESHOLD,
+                    help="building height threshold in cm")
+    ap.add_argument("--height", type=float, default=None,
+                    help="LiDAR height in cm (default: value stored with the scan)")
+    ap.add_argument("--pan-offset", type=float, default=0.0, help="pan calibration in degrees")
+    ap.add_argument("--tilt-offset", type=float, default=0.0, help="tilt calibration in degrees")
+    ap.add_argument("--backlash", metavar="FILE",
+                    help="correct servo backlash with this table (backlash.py) instead of the scan's")
+    ap.add_argument("--no-filter", action="store_true", help="skip outlier removal")
+    ap.add_argument("--mesh", choices=("grid", "delaunay"), default=scanner.STL_MESH,
+                    help="STL from the heightmap grid or a TIN through the samples "
+                         "(point files always use the grid)")
+    ap.add_argument("--plots", action="store_true", help="also write plotly HTML pages")
+    ap.add_argument("--force", action="store_true", help="ignore cached outputs")
+    args = ap.parse_args(argv)
+
+    params = {"grid": args.grid, "threshold": args.threshold, "height": args.height,
+              "pan_offset": args.pan_offset, "tilt_offset": args.tilt_offset,
+              "backlash": args.backlash, "filter": not args.no_filter, "plots": args.plots,
+              "mesh": args.mesh}
+    results = run(args.inputs, params, args.out, args.jobs, args.force)
+    for path, out, status in results:
+        print(f"{status:8s} {path} -> {out}")
+    return 1 if any(s.startswith("failed") for _, _, s in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
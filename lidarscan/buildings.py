@@ -0,0 +1,130 @@
+import numpy as np
+from . import heightmap
+
+# ---------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------
+MIN_BUILDING_CELLS = 3   # smaller blobs are noise, not structures
+
+
+# ---------------------------------------------------------
+# OUTLINES
+# ---------------------------------------------------------
+def _outline_edges(labels):
+    """Directed boundary edges of every region, interior on the left.
+
+    Returns label, start corner and end corner arrays in corner (i, j)
+    index space.
+    """
+    ny, nx = labels.shape
+    padded = np.pad(labels, 1)
+    inner = padded[1:-1, 1:-1]
+    jj, ii = np.mgrid[0:ny, 0:nx]
+
+    out_l, out_a, out_b = [], [], []
+    # neighbour offset, start corner, end corner (relative to the cell)
+    sides = (
+        (padded[:-2, 1:-1], (0, 0), (1, 0)),   # below  -> bottom edge
+        (padded[1:-1, 2:], (1, 0), (1, 1)),    # right  -> right edge
+        (padded[2:, 1:-1], (1, 1), (0, 1)),    # above  -> top edge
+        (padded[1:-1, :-2], (0, 1), (0, 0)),   # left   -> left edge
+    )
+    for neighbour, (ai, aj), (bi, bj) in sides:
+        m = (inner > 0) & (neighbour != inner)
+        out_l.append(inner[m])
+        out_a.append(np.c_[ii[m] + ai, jj[m] + aj])
+        out_b.append(np.c_[ii[m] + bi, jj[m] + bj])
+    return np.concatenate(out_l), np.concatenate(out_a), np.concatenate(out_b)
+
+
+def _chain(starts, ends):
+    """Join directed edges into closed loops, return the longest one."""
+    nxt = {}
+    for a, b in zip(map(tuple, starts), map(tuple, ends)):
+        nxt.setdefault(a, []).append(b)
+
+    best = []
+    while nxt:
+        start = next(iter(nxt))
+        loop = [start]
+        cur = start
+        while True:
+            options = nxt.get(cur)
+            if not options:
+                break
+            step = options.pop()
+            if not options:
+                del nxt[cur]
+            if step == start:
+                break
+            loop.append(step)
+            cur = step
+        if len(loop) > len(best):
+            best = loop
+    return best
+
+
+def _simplify(loop):
+    """Drop corners that lie on a straight run."""
+    n = len(loop)
+    out = []
+    for k in range(n):
+        (ax, ay), (bx, by), (cx, cy) = loop[k - 1], loop[k], loop[(k + 1) % n]
+        if (bx - ax) * (cy - by) != (by - ay) * (cx - bx):
+            out.append(loop[k])
+    return out
+
+
+# ---------------------------------------------------------
+# SEGMENTATION
+# ---------------------------------------------------------
+def segment(grid, x0, y0, cell, threshold, min_cells=MIN_BUILDING_CELLS):
+    """Label buildings in a ground-flattened height grid and describe them.
+
+    Returns (labels, buildings) where labels is an int grid (0 = ground)
+    and buildings a list of JSON-friendly dicts in scan coordinates (cm).
+    """
+    mask = np.nan_to_num(grid, nan=-np.inf) > threshold
+    labels, count = heightmap.label(mask)
+    if count == 0:
+        return labels, []
+
+    flat = labels.ravel()
+    heights = np.nan_to_num(grid.ravel())
+    jj, ii = np.divmod(np.arange(flat.size), labels.shape[1])
+
+    sizes = np.bincount(flat, minlength=count + 1)
+    sum_h = np.bincount(flat, weights=heights, minlength=count + 1)
+    sum_i = np.bincount(flat, weights=ii, minlength=count + 1)
+    sum_j = np.bincount(flat, weights=jj, minlength=count + 1)
+    max_h = np.full(count + 1, -np.inf)
+    np.maximum.at(max_h, flat, heights)
+
+    # drop tiny regions and renumber the rest 1..k
+    keep = sizes >= min_cells
+    keep[0] = False
+    remap = np.zeros(count + 1, int)
+    remap[keep] = np.arange(1, keep.sum() + 1)
+    labels = remap[labels]
+
+    edge_l, edge_a, edge_b = _outline_edges(labels)
+    order = np.argsort(edge_l, kind="stable")
+    edge_l, edge_a, edge_b = edge_l[order], edge_a[order], edge_b[order]
+    bounds = np.searchsorted(edge_l, np.arange(1, keep.sum() + 2))
+
+    buildings = []
+    for new_id, old_id in enumerate(np.nonzero(keep)[0], start=1):
+        lo, hi = bounds[new_id - 1], bounds[new_id]
+        loop = _simplify(_chain(edge_a[lo:hi], edge_b[lo:hi]))
+        n = sizes[old_id]
+        buildings.append({
+            "id": new_id,
+            "cells": int(n),
+            "area_cm2": float(n * cell * cell),
+            "centroid": [float(x0 + (sum_i[old_id] / n + 0.5) * cell),
+                         float(y0 + (sum_j[old_id] / n + 0.5) * cell)],
+            "max_height_cm": float(max_h[old_id]),
+            "mean_height_cm": float(sum_h[old_id] / n),
+            "outline": [[float(x0 + i * cell), float(y0 + j * cell)] for i, j in loop],
+        })
+    return labels, buildings
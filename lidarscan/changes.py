@@ -0,0 +1,230 @@
+import os, math, time
+import numpy as np
+import pandas as pd
+from . import metrics
+from . import planner
+from . import heightmap
+from . import outliers
+from . import spatial
+
+# ---------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------
+REFERENCE_FILE = os.path.join("scans", "reference.npz")
+
+CHANGE_THRESHOLD = 2.0   # cm height difference that counts as a change
+MIN_CHANGED_CELLS = 2    # ignore smaller components (single noisy cells)
+PATCH_MARGIN = 1         # cells of padding around each changed region
+COARSE_STEP = 3          # deg, pan/tilt step of the detection scan
+
+last_report = None
+
+
+# ---------------------------------------------------------
+# REFERENCE STORE
+# ---------------------------------------------------------
+def build_reference(xs, ys, zs, cell):
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    coeffs = heightmap.fit_ground(xs, ys, zs)
+    zf = heightmap.flatten(xs, ys, zs, coeffs)
+    x0, y0, nx, ny = heightmap.grid_shape(xs, ys, cell)
+    return {
+        "xs": xs, "ys": ys, "zs": zs,
+        "coeffs": coeffs,
+        "x0": x0, "y0": y0, "cell": cell,
+        "grid": heightmap.max_grid(xs, ys, zf, x0, y0, cell, nx, ny),
+    }
+
+
+def save_reference(ref, path=REFERENCE_FILE):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    np.savez(path, **ref)
+
+
+def load_reference(path=REFERENCE_FILE):
+    with np.load(path) as data:
+        ref = {k: data[k] for k in data.files}
+    for k in ("x0", "y0", "cell"):
+        ref[k] = float(ref[k])
+    if "job" in ref:            # the job whose index holds this cloud
+        ref["job"] = str(ref["job"])
+    return ref
+
+
+def reference_from_csv(csv_path="scan_points.csv", cell=None):
+    from . import scanner
+    df = pd.read_csv(csv_path)
+    ref = build_reference(df.x.values, df.y.values, df.z.values, cell or scanner.GRID_SIZE)
+    save_reference(ref)
+    return ref
+
+
+# ---------------------------------------------------------
+# DETECTION
+# ---------------------------------------------------------
+def grid_in_reference(ref, xs, ys, zs):
+    """Grid new points in the reference frame (origin, cell and ground plane)."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zf = heightmap.flatten(xs, ys, np.asarray(zs, float), ref["coeffs"])
+    ny, nx = ref["grid"].shape
+    return heightmap.max_grid(xs, ys, zf, ref["x0"], ref["y0"], ref["cell"], nx, ny)
+
+
+def detect(ref, xs, ys, zs, threshold=CHANGE_THRESHOLD, min_cells=MIN_CHANGED_CELLS,
+           bridge=0):
+    """Compare a (coarse) scan with the reference grid.
+
+    Only cells observed in both grids are compared; empty cells in a
+    coarse scan are unknown, not changed. `bridge` dilates the changed
+    mask by that many cells before labelling so samples of one object
+    that are a coarse step apart end up in one region.
+    Returns (labels, regions).
+    """
+    new = grid_in_reference(ref, xs, ys, zs)
+    diff = new - ref["grid"]
+    changed = np.abs(np.nan_to_num(diff)) > threshold
+
+    labels, count = heightmap.label(heightmap.dilate(changed, bridge))
+    sizes = np.bincount(labels[changed], minlength=count + 1)
+    regions = []
+    for k in range(1, count + 1):
+        if sizes[k] < min_cells:
+            labels[labels == k] = 0
+            continue
+        jj, ii = np.nonzero(labels == k)
+        d = np.nan_to_num(diff[jj, ii])
+        regions.append({
+            "label": k,
+            "cells": int(sizes[k]),
+            "bbox": [int(ii.min()), int(jj.min()), int(ii.max()), int(jj.max())],
+            "max_change_cm": float(d[np.argmax(np.abs(d))]),
+        })
+    return labels, regions
+
+
+def region_polygon(ref, bbox, margin=PATCH_MARGIN):
+    """XY rectangle (cm) around a region's cell bounding box."""
+    i0, j0, i1, j1 = bbox
+    c = ref["cell"]
+    xa = ref["x0"] + (i0 - margin) * c
+    xb = ref["x0"] + (i1 + 1 + margin) * c
+    ya = ref["y0"] + (j0 - margin) * c
+    yb = ref["y0"] + (j1 + 1 + margin) * c
+    return [(xa, ya), (xb, ya), (xb, yb), (xa, yb)]
+
+
+def rescan_poses(ref, regions, height_cm, step=1):
+    poses = set()
+    for r in regions:
+        poses.update(planner.polygon_poses(region_polygon(ref, r["bbox"]), height_cm, step))
+    return sorted(poses)
+
+
+# ---------------------------------------------------------
+# PATCHING
+# ---------------------------------------------------------
+def patch(ref, regions, xs, ys, zs):
+    """Replace reference points inside the changed regions with new ones."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+
+    def in_regions(px, py):
+        hit = np.zeros(len(px), bool)
+        for r in regions:
+            (xa, ya), _, (xb, yb), _ = region_polygon(ref, r["bbox"])
+            hit |= (px >= xa) & (px < xb) & (py >= ya) & (py < yb)
+        return hit
+
+    keep = ~in_regions(ref["xs"], ref["ys"])
+    add = in_regions(xs, ys)
+    out = dict(ref)
+    out["xs"] = np.concatenate([ref["xs"][keep], xs[add]])
+    out["ys"] = np.concatenate([ref["ys"][keep], ys[add]])
+    out["zs"] = np.concatenate([ref["zs"][keep], zs[add]])
+
+    # The touched cells are exactly the region rectangles, whose reference
+    # points were all replaced: they are regridded from the new points
+    # alone, every other cell keeps its reference height.
+    fresh = grid_in_reference(ref, xs[add], ys[add], zs[add])
+    out["grid"] = np.where(touched_cells(ref, regions), fresh, ref["grid"])
+    return out, int(keep.size - keep.sum()), int(add.sum())
+
+
+def touched_cells(ref, regions):
+    """(ny, nx) mask of the reference cells patch() regrids."""
+    touched = np.zeros(ref["grid"].shape, bool)
+    for r in regions:
+        i0, j0, i1, j1 = r["bbox"]
+        m = PATCH_MARGIN
+        touched[max(j0 - m, 0):j1 + m + 1, max(i0 - m, 0):i1 + m + 1] = True
+    return touched
+
+
+def publish(ref, touched, job):
+    """Make a patched reference the current scan: view, STL and the index
+    of `job`, re-indexing only the touched cells of the reference's
+    previous index (a full build the first time)."""
+    from . import scanner
+    grid_info = {"grid": ref["grid"], "x0": ref["x0"], "y0": ref["y0"], "cell": ref["cell"]}
+    scanner.prepare_3d_plot(ref["xs"], ref["ys"], ref["zs"])
+    scanner.prepare_2d_map(ref["xs"], ref["ys"], ref["zs"], grid_info)
+    scanner.save_stl(ref["xs"], ref["ys"], ref["zs"], grid_info)
+    if job is not None:
+        base = ref.get("job")
+        with metrics.stage("index"):
+            spatial.update(spatial.index_dir(scanner.SCAN_DIR, job), ref["xs"], ref["ys"], ref["zs"],
+                           grid_info, touched, job,
+                           base=spatial.index_dir(scanner.SCAN_DIR, base) if base else None)
+
+
+# ---------------------------------------------------------
+# INCREMENTAL RESCAN
+# ---------------------------------------------------------
+def incremental_rescan(coarse_step=COARSE_STEP, fine_step=1):
+    """Coarse scan -> detect changes -> fine rescan of changed regions only.
+
+    The patched reference cloud is written back and becomes the current
+    scan (see publish()); the rescanned points are outlier-filtered, the
+    rest of the reference is not touched again.
+    """
+    global last_report
+    from . import scanner
+
+    t0 = time.perf_counter()
+    ref = load_reference()
+
+    coarse = planner.serpentine(scanner.PAN_MIN, scanner.PAN_MAX, coarse_step,
+                                scanner.TILT_MIN, scanner.TILT_MAX, coarse_step)
+    xs, ys, zs = scanner.run_scan(poses=coarse, process=False)
+
+    # cells between two coarse samples on the table
+    bridge = math.ceil(scanner.HEIGHT_CM * math.tan(math.radians(coarse_step)) / ref["cell"])
+    with metrics.stage("change_detect"):
+        _, regions = detect(ref, xs, ys, zs, bridge=bridge)
+
+    report = {"regions": regions, "coarse_poses": len(coarse), "fine_poses": 0,
+              "removed": 0, "added": 0}
+    if regions:
+        route = planner.order(rescan_poses(ref, regions, scanner.HEIGHT_CM, fine_step))
+        report["fine_poses"] = len(route)
+        fx, fy, fz = scanner.run_scan(poses=route, process=False)
+        if scanner.FILTER_OUTLIERS:
+            with metrics.stage("outliers"):
+                fx, fy, fz = outliers.filter_points(fx, fy, fz)
+
+        with metrics.stage("change_patch"):
+            ref, report["removed"], report["added"] = patch(ref, regions, fx, fy, fz)
+        publish(ref, touched_cells(ref, regions), scanner.job_id)
+        if scanner.job_id is not None:
+            ref["job"] = scanner.job_id
+        save_reference(ref)
+
+    report["seconds"] = time.perf_counter() - t0
+    last_report = report
+    return report
@@ -0,0 +1,116 @@
+import os, json, time, queue, struct, threading
+
+# ---------------------------------------------------------
+# CHECKPOINT FILE FORMAT
+# ---------------------------------------------------------
+# header : b"LCKP" + version byte + uint32 length + JSON scan settings
+# record : b"P" tilt(int16) pan(int16) dist(uint16) x y z (float64)
+#          b"D" tilt(int16)                  -> tilt row complete
+#
+# A "row" is a contiguous run of poses with the same tilt
+# (planner.split_rows), so resume skips as many rows as were completed.
+MAGIC = b"LCKP\x01"
+LEN32 = struct.Struct("<I")
+SAMPLE = struct.Struct("<chhHddd")
+ROW = struct.Struct("<ch")
+
+FSYNC_INTERVAL = 2.0    # seconds between forced fsyncs (rows always fsync)
+FILE_NAME = "samples.ckpt"
+
+
+# ---------------------------------------------------------
+# WRITER
+# ---------------------------------------------------------
+class CheckpointLog:
+    """Append-only sample log written by a background thread.
+
+    The scan loop only pushes tuples onto a queue, so disk latency and
+    fsync never stall acquisition.
+    """
+
+    def __init__(self, path, meta=None, append_at=None):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        if append_at is None:
+            self.f = open(path, "wb", buffering=64 * 1024)
+            body = json.dumps(meta or {}).encode()
+            self.f.write(MAGIC + LEN32.pack(len(body)) + body)
+        else:
+            # resume: drop samples of the row that was interrupted
+            self.f = open(path, "r+b", buffering=64 * 1024)
+            self.f.truncate(append_at)
+            self.f.seek(append_at)
+        self.q = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def append(self, tilt, pan, dist, x, y, z):
+        self.q.put(SAMPLE.pack(b"P", tilt, pan, dist, x, y, z))
+
+    def row_done(self, tilt):
+        self.q.put(ROW.pack(b"D", tilt))
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join()
+
+    def _sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def _writer(self):
+        last_sync = time.monotonic()
+        while True:
+            rec = self.q.get()
+            if rec is None:
+                break
+            self.f.write(rec)
+            if rec[:1] == b"D" or time.monotonic() - last_sync > FSYNC_INTERVAL:
+                self._sync()
+                last_sync = time.monotonic()
+        self._sync()
+        self.f.close()
+
+
+# ---------------------------------------------------------
+# READER
+# ---------------------------------------------------------
+def load(path):
+    """Read a checkpoint, tolerating a torn tail.
+
+    Returns (meta, samples, done_rows, end) where samples only cover
+    completed rows and `end` is the byte offset to resume appending at.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: not a checkpoint file")
+
+    pos = len(MAGIC)
+    n, = LEN32.unpack_from(data, pos)
+    pos += LEN32.size
+    meta = json.loads(data[pos:pos + n])
+    pos += n
+
+    samples, row, done_rows = [], [], []
+    end = pos
+    while pos < len(data):
+        kind = data[pos:pos + 1]
+        if kind == b"P" and pos + SAMPLE.size <= len(data):
+            row.append(SAMPLE.unpack_from(data, pos)[1:])
+            pos += SAMPLE.size
+        elif kind == b"D" and pos + ROW.size <= len(data):
+            done_rows.append(ROW.unpack_from(data, pos)[1])
+            pos += ROW.size
+            samples.extend(row)
+            row = []
+            end = pos
+        else:
+            break       # torn write from a crash
+    return meta, samples, done_rows, end
+
+
+def path_for(scan_dir, job_id):
+    return os.path.join(scan_dir, job_id, FILE_NAME)
@@ -0,0 +1,120 @@
+import os, sys, json, argparse
+from . import scanner
+from .config import profile, PROFILES
+
+# ---------------------------------------------------------
+# COMMANDS
+# ---------------------------------------------------------
+def cmd_scan(args):
+    if args.simulate:
+        from . import simulator
+        simulator.install(realtime=not args.fast)
+        if args.fast:
+            scanner.sleep = lambda s: None
+    xs, ys, zs = scanner.run_scan(record=args.record, resume=args.resume,
+                                  process=not args.no_process)
+    print(f"scan {scanner.job_id}: {len(xs)} points")
+    if args.show and not args.no_process:
+        scanner.figure_3d(xs, ys, zs).show()
+        scanner.figure_2d(scanner.last_grid).show()
+    return 0
+
+
+def cmd_view(args):
+    if args.daemon:
+        os.environ["LIDAR_DAEMON"] = args.daemon
+    from . import app
+    app.app.run(host=args.host, port=args.port)
+    return 0
+
+
+def cmd_daemon(args):
+    from . import daemon
+    if args.simulate:
+        from . import simulator
+        simulator.install(realtime=True)
+    path = args.socket or daemon.SOCKET_PATH
+    print("scanner daemon on", path)
+    try:
+        daemon.serve(path)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_export(args):
+    from . import batch
+    return batch.main(args.batch_args)
+
+
+def cmd_config(args):
+    print(json.dumps(args.config.as_dict(), indent=2))
+    return 0
+
+
+# ---------------------------------------------------------
+# ARGUMENTS
+# ---------------------------------------------------------
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--profile", default="default", choices=sorted(PROFILES),
+                        help="named rig settings (lidarscan/config.py)")
+    common.add_argument("--set", action="append", default=[], metavar="FIELD=VALUE",
+                        help="override one config field, e.g. --set pan_step=2")
+
+    ap = argparse.ArgumentParser(prog="lidarscan", description="Pan/tilt LiDAR scanner.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scan", parents=[common], help="run a scan on the rig")
+    p.add_argument("--record", action="store_true", help="also write a raw session file")
+    p.add_argument("--resume", metavar="JOB", help="continue an interrupted job")
+    p.add_argument("--no-process", action="store_true", help="skip CSV/plot/STL output")
+    p.add_argument("--show", action="store_true", help="open the 3D and 2D plots afterwards")
+    p.add_argument("--simulate", action="store_true", help="use simulator.py instead of hardware")
+    p.add_argument("--fast", action="store_true", help="with --simulate: no real-time waits")
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("view", parents=[common], help="serve the web UI")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=5000)
+    p.add_argument("--daemon", metavar="SOCKET", help="scan through a running scanner daemon")
+    p.set_defaults(func=cmd_view)
+
+    p = sub.add_parser("daemon", parents=[common],
+                       help="own the hardware and serve scans on a Unix socket (daemon.py)")
+    p.add_argument("--socket", help="default: $LIDAR_DAEMON or daemon.SOCKET_PATH")
+    p.add_argument("--simulate", action="store_true", help="use simulator.py instead of hardware")
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("export", parents=[common],
+                       help="reprocess stored scans without hardware (batch.py)")
+    p.add_argument("batch_args", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("config", parents=[common], help="print the effective settings")
+    p.set_defaults(func=cmd_config)
+    return ap
+
+
+def main(argv=None):
+    ap = build_parser()
+    args = ap.parse_args(argv)
+    try:
+        args.config = profile(args.profile).parse(args.set).apply()
+    except ValueError as e:
+        ap.error(str(e))
+    return args.func(args)
+
+
+# console_scripts entry points (pyproject.toml)
+def scan_main():
+    sys.exit(main(["scan"] + sys.argv[1:]))
+
+def view_main():
+    sys.exit(main(["view"] + sys.argv[1:]))
+
+def export_main():
+    sys.exit(main(["export"] + sys.argv[1:]))
+
+def daemon_main():
+    sys.exit(main(["daemon"] + sys.argv[1:]))
@@ -0,0 +1,137 @@
+from . import scanner
+
+# ---------------------------------------------------------
+# SETTINGS <-> scanner.py
+# ---------------------------------------------------------
+# config field -> scanner module global it drives
+FIELDS = {
+    "port": "UART_PORT",
+    "baud": "UART_BAUD",
+    "pan_pin": "PAN_PIN",
+    "tilt_pin": "TILT_PIN",
+    "height_cm": "HEIGHT_CM",
+    "pan_min": "PAN_MIN",
+    "pan_max": "PAN_MAX",
+    "pan_step": "PAN_STEP",
+    "tilt_min": "TILT_MIN",
+    "tilt_max": "TILT_MAX",
+    "tilt_step": "TILT_STEP",
+    "smooth": "SMOOTH",
+    "servo_step_us": "SERVO_STEP_US",
+    "servo_step_s": "SERVO_STEP_S",
+    "settle_s": "SETTLE_S",
+    "backlash_motion": "BACKLASH_MOTION",
+    "backlash_project": "BACKLASH_PROJECT",
+    "grid_size": "GRID_SIZE",
+    "building_threshold": "BUILDING_THRESHOLD",
+    "filter_outliers": "FILTER_OUTLIERS",
+    "stl_name": "STL_NAME",
+    "stl_walls": "STL_WALLS",
+    "stl_mesh": "STL_MESH",
+    "tin_max_edge": "TIN_MAX_EDGE",
+    "shared_live": "SHARED_LIVE",
+}
+
+DEFAULTS = {field: getattr(scanner, name) for field, name in FIELDS.items()}
+
+# fields parse() can't type from their default: measurements whose default
+# happens to be a whole number, and optional ones whose default is None
+KINDS = {
+    "height_cm": float,
+    "building_threshold": float,
+    "tin_max_edge": float,
+}
+OPTIONAL = {"tin_max_edge"}
+
+
+class ScanConfig:
+    """Pins, ranges, timings and grid settings for one rig.
+
+    Unset fields take scanner.py's defaults. apply() pushes the values
+    into scanner's module globals, which is what the scan loop, the
+    engine, replay and the web app all read.
+    """
+
+    def __init__(self, **values):
+        unknown = set(values) - set(FIELDS)
+        if unknown:
+            raise TypeError("unknown config field(s): " + ", ".join(sorted(unknown)))
+        for field, default in DEFAULTS.items():
+            setattr(self, field, values.get(field, default))
+
+    @classmethod
+    def current(cls):
+        """The settings scanner is running with right now."""
+        return cls(**{field: getattr(scanner, name) for field, name in FIELDS.items()})
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def replace(self, **values):
+        merged = self.as_dict()
+        merged.update(values)
+        return ScanConfig(**merged)
+
+    def parse(self, assignments):
+        """Copy with "field=value" strings applied, typed like the defaults
+        (or KINDS). "none" clears an OPTIONAL field."""
+        values = {}
+        for item in assignments:
+            field, _, text = item.partition("=")
+            field = field.strip().lower()
+            if field not in FIELDS:
+                raise ValueError(f"unknown config field: {field}")
+            kind = KINDS.get(field, type(DEFAULTS[field]))
+            if field in OPTIONAL and text.strip().lower() in ("", "none"):
+                values[field] = None
+            elif kind is bool:
+                values[field] = text.strip().lower() in ("1", "true", "yes", "on")
+            else:
+                try:
+                    values[field] = kind(text)
+                except ValueError:
+                    raise ValueError(f"{field}: expected {kind.__name__}, got {text!r}")
+        return self.replace(**values)
+
+    def apply(self):
+        for field, name in FIELDS.items():
+            setattr(scanner, name, getattr(self, field))
+        return self
+
+    def __repr__(self):
+        changed = {k: v for k, v in self.as_dict().items() if v != DEFAULTS[k]}
+        return "ScanConfig(%s)" % ", ".join(f"{k}={v!r}" for k, v in changed.items())
+
+
+# ---------------------------------------------------------
+# PROFILES
+# ---------------------------------------------------------
+# The settings the old stand-alone scripts were hard-wired to.
+PROFILES = {
+    "default": ScanConfig(),
+    # utlimate_scan.py: pins 18/19, wide 1-degree sweep, slower ramp/settle
+    "ultimate": ScanConfig(pan_pin=18, tilt_pin=19,
+                           pan_min=-40, pan_max=40, pan_step=1,
+                           tilt_min=-20, tilt_max=20, tilt_step=1,
+                           servo_step_s=0.004, settle_s=0.08),
+    # utlimate_v2.py: 2-degree steps, STL closed with building walls
+    "ultimate_v2": ScanConfig(pan_step=2, tilt_step=2,
+                              servo_step_s=0.004, settle_s=0.08,
+                              building_threshold=5.0, stl_walls=True),
+    # v3_3d_scan.py: pins 18/19, coarser ramp, long settle
+    "v3": ScanConfig(pan_pin=18, tilt_pin=19,
+                     pan_min=-40, pan_max=40, pan_step=1,
+                     tilt_min=-20, tilt_max=20, tilt_step=1,
+                     servo_step_us=10, servo_step_s=0.005, settle_s=0.12),
+    # class/scan.py: 5-degree grid, servos jump straight to the target
+    "class": ScanConfig(pan_min=-30, pan_max=30, pan_step=5,
+                        tilt_min=-10, tilt_max=10, tilt_step=5,
+                        smooth=False, settle_s=0.05),
+}
+
+
+def profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown profile {name!r} (have: {', '.join(PROFILES)})")
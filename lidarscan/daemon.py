@@ -0,0 +1,353 @@
+import os, sys, json, queue, signal, socket, threading, traceback, socketserver
+import numpy as np
+from . import scanner
+from . import planner
+from . import changes
+from . import heads
+from . import engine
+from . import metrics
+from . import spatial
+
+# ---------------------------------------------------------
+# SCANNER DAEMON
+# ---------------------------------------------------------
+# python -m lidarscan.daemon [--socket /tmp/lidarscan.sock] [--simulate]
+# LIDAR_DAEMON=/tmp/lidarscan.sock gunicorn -w 4 lidarscan.app:app
+#
+# The daemon is the only process that drives the servos and reads the
+# sensor. Web frontends (app.py with LIDAR_DAEMON set) talk to it over a
+# Unix socket, so they can run as several WSGI workers and page rendering
+# never competes with acquisition for the GIL. Run both from the same
+# directory: the frontends read the CSV, STL and scans/<job>/index the
+# daemon writes.
+#
+# Protocol: one JSON object per line in each direction.
+#   {"op": "ping"}                               -> {"ok": true}
+#   {"op": "status"}                             -> {"ok": true, "status": {...}}
+#   {"op": "live"}                               -> {"ok": true, "live": {...}}  (/live2d)
+#   {"op": "metrics"}                            -> {"ok": true, "text": "..."}  (/metrics)
+#   {"op": "timings", "job": "..." | null}       -> {"ok": true, "timings": {...} | null}
+#   {"op": "changes"}                            -> {"ok": true, "changes": {...} | null}
+#   {"op": "submit", "kind": "scan", "poses": [[pan, tilt], ...] | null,
+#    "mode": "step", "process": true}
+#   {"op": "submit", "kind": "record" | "rescan"}
+#   {"op": "submit", "kind": "resume", "job": "..."}
+#   {"op": "submit", "kind": "multi", "simulate": false}
+#                                                -> {"ok": true, "result": {"status": ...}}
+#   {"op": "subscribe"}  -> {"ok": true}, then {"job", "samples": [[x, y, z], ...]}
+#                           lines (an empty batch every second) until the client closes
+# Errors come back as {"ok": false, "error": "..."}.
+# Local tools that only watch a scan can map livebuffer.py's shared
+# memory instead of subscribing.
+SOCKET_PATH = os.environ.get("LIDAR_DAEMON") or "/tmp/lidarscan.sock"
+TIMEOUT_S = 5.0         # client side, per request
+BATCH_SAMPLES = 500     # samples per subscription line at most
+HEARTBEAT_S = 1.0
+
+
+class DaemonError(Exception):
+    pass
+
+
+# ---------------------------------------------------------
+# IN-PROCESS SCANNER
+# ---------------------------------------------------------
+class LocalScanner:
+    """Starts and reports scans in this process: the asyncio engine for
+    plain scans, a thread for the blocking paths (record, resume,
+    incremental rescan, multi-head). Used by the daemon, and by app.py
+    directly when no daemon is configured."""
+
+    def __init__(self):
+        self.engine = engine.ScanEngine()
+        self.thread = None
+        self.failure = None     # {"job", "error"} of the last thread-based scan that raised
+        self.submits = 0
+        self.started = {"engine": 0, "thread": 0}   # submit number of each side's latest scan
+        self.lock = threading.Lock()
+
+    def busy(self):
+        return (scanner.is_scanning or self.engine.busy()
+                or (self.thread is not None and self.thread.is_alive()))
+
+    def current(self):
+        """(status, live heightmap) of the newest scan, engine or thread-based."""
+        st = self.engine.status()
+        if self.failure is not None and not scanner.is_scanning:
+            return ({"scanning": False, "progress": scanner.scan_progress, **self.failure},
+                    scanner.live_map)
+        if scanner.is_scanning or self.started["thread"] > self.started["engine"]:
+            # record / resume / rescan / multi-head still run on scanner's globals
+            return ({"scanning": scanner.is_scanning, "progress": scanner.scan_progress,
+                     "job": scanner.job_id, "error": None}, scanner.live_map)
+        return st, self.engine.live_map
+
+    def status(self):
+        return self.current()[0]
+
+    def live(self):
+        """Partial heightmap of the scan in progress (null = no sample yet)."""
+        acc = self.current()[1]
+        g = acc.grid() if acc is not None else None
+        if g is None:
+            return {"samples": 0, "grid": []}
+        grid = np.round(g["grid"], 2)
+        return {
+            "samples": acc.samples,
+            "x0": g["x0"], "y0": g["y0"], "cell": g["cell"],
+            "grid": [[None if np.isnan(v) else v for v in row] for row in grid.tolist()],
+        }
+
+    def _start(self, target, **kwargs):
+        def run():
+            try:
+                target(**kwargs)
+            except BaseException as e:
+                traceback.print_exc()
+                self.failure = {"job": kwargs.get("resume") or scanner.job_id, "error": repr(e)}
+                scanner.is_scanning = False
+
+        self.thread = threading.Thread(target=run)
+        self.thread.start()
+        self.started["thread"] = self.submits
+
+    def submit(self, kind="scan", poses=None, mode="step", process=True, job=None, simulate=False):
+        """Start a scan of `kind`; returns the reply app.py sends back."""
+        with self.lock:
+            if self.busy():
+                return {"status": "busy"}
+            self.failure = None
+            self.submits += 1
+            if kind == "scan":
+                if mode not in planner.SCAN_MODES:
+                    raise ValueError(f"unknown mode {mode!r}")
+                job = self.engine.submit(poses, process, mode)
+                if job is None:
+                    return {"status": "busy"}
+                self.started["engine"] = self.submits
+                return {"status": "started", "job": job}
+            if kind == "record":
+                # recordings capture the blocking read path byte for byte
+                self._start(scanner.run_scan, record=True, poses=poses)
+                return {"status": "started"}
+            if kind == "resume":
+                if not spatial.valid_job(job):
+                    raise ValueError(f"bad job id {job!r}")
+                self._start(scanner.run_scan, resume=job)
+                return {"status": "resumed", "job": job}
+            if kind == "rescan":
+                self._start(changes.incremental_rescan)
+                return {"status": "started"}
+            if kind == "multi":
+                rig = heads.open_heads(simulate=simulate)
+                self._start(heads.run_multi_scan, heads=rig)
+                return {"status": "started", "heads": [h.name for h in rig]}
+            raise ValueError(f"unknown scan kind {kind!r}")
+
+    def metrics(self):
+        """Prometheus text of this process's registry (scan timings)."""
+        return metrics.render_prometheus()
+
+    def timings(self, job=None):
+        return metrics.job_timings(job)
+
+    def changes(self):
+        """Report of the last incremental rescan, None before the first."""
+        return changes.last_report
+
+    def subscribe(self, maxsize=10000):
+        return self.engine.subscribe(maxsize)
+
+    def unsubscribe(self, q):
+        self.engine.unsubscribe(q)
+
+
+# ---------------------------------------------------------
+# SERVER
+# ---------------------------------------------------------
+class Handler(socketserver.StreamRequestHandler):
+    def reply(self, msg):
+        self.wfile.write(json.dumps(msg).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        local = self.server.local
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                op = req.get("op")
+                if op == "ping":
+                    self.reply({"ok": True})
+                elif op == "status":
+                    self.reply({"ok": True, "status": local.status()})
+                elif op == "live":
+                    self.reply({"ok": True, "live": local.live()})
+                elif op == "metrics":
+                    self.reply({"ok": True, "text": local.metrics()})
+                elif op == "timings":
+                    self.reply({"ok": True, "timings": local.timings(req.get("job"))})
+                elif op == "changes":
+                    self.reply({"ok": True, "changes": local.changes()})
+                elif op == "submit":
+                    args = {k: req[k] for k in ("kind", "poses", "mode", "process", "job", "simulate")
+                            if k in req}
+                    self.reply({"ok": True, "result": local.submit(**args)})
+                elif op == "subscribe":
+                    self.reply({"ok": True})
+                    self.stream(local)
+                    return
+                else:
+                    self.reply({"ok": False, "error": f"unknown op {op!r}"})
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                self.reply({"ok": False, "error": str(e)})
+
+    def stream(self, local):
+        """Forward engine samples in batches; a slow client only loses
+        samples (the engine's queue drops), it never holds up the scan."""
+        q = local.subscribe()
+        try:
+            while True:
+                try:
+                    batch = [q.get(timeout=HEARTBEAT_S)]
+                except queue.Empty:
+                    self.reply({"job": None, "samples": []})
+                    continue
+                while len(batch) < BATCH_SAMPLES:
+                    try:
+                        batch.append(q.get_nowait())
+                    except queue.Empty:
+                        break
+                self.reply({"job": batch[-1][0],
+                            "samples": [[round(x, 2), round(y, 2), round(z, 2)] for _, x, y, z in batch]})
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            local.unsubscribe(q)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _terminate(*_):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)   # once; shutdown may take a moment
+    sys.exit(0)
+
+
+def make_server(path=SOCKET_PATH, local=None):
+    """Bind the socket (owner and group only) for `local` (a LocalScanner)."""
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+            raise DaemonError(f"a scanner daemon is already listening on {path}")
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)         # stale socket from a crashed daemon
+        finally:
+            probe.close()
+    old = os.umask(0o117)       # created 0660: never reachable by others, even briefly
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old)
+    server.local = local or LocalScanner()
+    return server
+
+
+def serve(path=SOCKET_PATH, local=None):
+    """Serve `local` (a LocalScanner) on a Unix socket until interrupted."""
+    server = make_server(path, local)
+    # systemd / kill: leave through the finally below so the socket goes too
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+# ---------------------------------------------------------
+# CLIENT
+# ---------------------------------------------------------
+class DaemonClient:
+    """LocalScanner's interface, answered by the daemon. One connection
+    per request, so it is safe in any number of processes and threads."""
+
+    def __init__(self, path=SOCKET_PATH, timeout=TIMEOUT_S):
+        self.path = path
+        self.timeout = timeout
+
+    def _connect(self):
+        s = socket.socket(socket.AF_UNIX)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(self.path)
+        except OSError as e:
+            s.close()
+            raise DaemonError(f"scanner daemon not reachable at {self.path}: {e}")
+        return s
+
+    def request(self, op, **args):
+        with self._connect() as s, s.makefile("rwb") as f:
+            f.write(json.dumps(dict(args, op=op)).encode() + b"\n")
+            f.flush()
+            line = f.readline()
+        if not line:
+            raise DaemonError("scanner daemon closed the connection")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise DaemonError(reply.get("error", "request failed"))
+        return reply
+
+    def status(self):
+        return self.request("status")["status"]
+
+    def busy(self):
+        return self.status()["scanning"]
+
+    def live(self):
+        return self.request("live")["live"]
+
+    def metrics(self):
+        return self.request("metrics")["text"]
+
+    def timings(self, job=None):
+        return self.request("timings", job=job)["timings"]
+
+    def changes(self):
+        return self.request("changes")["changes"]
+
+    def submit(self, kind="scan", **args):
+        return self.request("submit", kind=kind, **args)["result"]
+
+    def samples(self):
+        """Yield (job, [[x, y, z], ...]) batches of the running engine scan."""
+        s = self._connect()
+        s.settimeout(None)
+        with s, s.makefile("rwb") as f:
+            f.write(b'{"op": "subscribe"}\n')
+            f.flush()
+            f.readline()
+            for line in f:
+                msg = json.loads(line)
+                if msg["samples"]:
+                    yield msg["job"], msg["samples"]
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Own the scanner hardware and serve it on a Unix socket.")
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    ap.add_argument("--simulate", action="store_true", help="use simulator.py instead of hardware")
+    args = ap.parse_args()
+    if args.simulate:
+        from . import simulator
+        simulator.install(realtime=True)
+    print("scanner daemon on", args.socket)
+    try:
+        serve(args.socket)
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
@@ -0,0 +1,259 @@
+import math
+import numpy as np
+
+# ---------------------------------------------------------
+# 2D DELAUNAY TRIANGULATION (sweep-hull)
+# ---------------------------------------------------------
+# Points are added in order of distance from a seed triangle, so each new
+# point lies outside the current convex hull: it is joined to the hull
+# edges it can see and the new triangles are made Delaunay by edge flips.
+# A hash of the hull by angle around the seed finds a visible edge in
+# O(1), which keeps the whole run O(n log n) (the sort) in practice.
+# Same algorithm as the Delaunator library; no compiled dependency.
+#
+# Triangles are stored as a flat list of point indices (three per
+# triangle) with a matching halfedge list: halfedges[e] is the edge of
+# the neighbouring triangle opposite e, -1 on the hull.
+EPS = 2.0 ** -52
+STACK = 512             # pending flips; only hit on very degenerate input
+EDGE_FACTOR = 4.0       # prune(): default limit = factor x median edge length
+
+
+def _orient(px, py, qx, qy, rx, ry):
+    """True if p, q, r turn counter-clockwise."""
+    return (qy - py) * (rx - qx) - (qx - px) * (ry - qy) < 0
+
+
+def _circle(ax, ay, bx, by, cx, cy):
+    """Circumcentre offset from a and squared radius (inf if collinear)."""
+    dx, dy = bx - ax, by - ay
+    ex, ey = cx - ax, cy - ay
+    bl = dx * dx + dy * dy
+    cl = ex * ex + ey * ey
+    det = dx * ey - dy * ex
+    if det == 0:
+        return 0.0, 0.0, math.inf
+    d = 0.5 / det
+    x = (ey * bl - dy * cl) * d
+    y = (dx * cl - ex * bl) * d
+    return x, y, x * x + y * y
+
+
+def triangulate(xs, ys):
+    """(m, 3) int array of point indices, counter-clockwise in XY.
+    Duplicate (x, y) points are used once; collinear input gives none."""
+    px = np.asarray(xs, float)
+    py = np.asarray(ys, float)
+    n = len(px)
+    if n < 3:
+        return np.empty((0, 3), np.int64)
+
+    # seed: point nearest the centre, its nearest neighbour, and the point
+    # making the smallest circumcircle with them
+    cx = (px.min() + px.max()) / 2
+    cy = (py.min() + py.max()) / 2
+    i0 = int(np.argmin((px - cx) ** 2 + (py - cy) ** 2))
+    d = (px - px[i0]) ** 2 + (py - py[i0]) ** 2
+    d[d == 0] = np.inf
+    i1 = int(np.argmin(d))
+    if not np.isfinite(d[i1]):
+        return np.empty((0, 3), np.int64)
+    ax, ay, bx, by = px[i0], py[i0], px[i1], py[i1]
+    dx, dy = bx - ax, by - ay
+    ex, ey = px - ax, py - ay
+    bl = dx * dx + dy * dy
+    cl = ex * ex + ey * ey
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = 0.5 / (dx * ey - dy * ex)
+        r = ((ey * bl - dy * cl) * dd) ** 2 + ((dx * cl - ex * bl) * dd) ** 2
+    r[[i0, i1]] = np.inf
+    r[~np.isfinite(r)] = np.inf
+    i2 = int(np.argmin(r))
+    if not np.isfinite(r[i2]):
+        return np.empty((0, 3), np.int64)      # all points on one line
+
+    X = px.tolist()
+    Y = py.tolist()
+    if _orient(X[i0], Y[i0], X[i1], Y[i1], X[i2], Y[i2]):
+        i1, i2 = i2, i1
+    ox, oy, _ = _circle(X[i0], Y[i0], X[i1], Y[i1], X[i2], Y[i2])
+    ccx, ccy = X[i0] + ox, Y[i0] + oy
+    order = np.argsort((px - ccx) ** 2 + (py - ccy) ** 2, kind="stable").tolist()
+
+    hash_size = max(int(math.ceil(math.sqrt(n))), 1)
+
+    def hash_key(x, y):
+        dx, dy = x - ccx, y - ccy
+        s = abs(dx) + abs(dy)
+        p = dx / s if s else 0.0
+        a = (3 - p if dy > 0 else 1 + p) / 4           # pseudo-angle in [0, 1]
+        return int(math.floor(a * hash_size)) % hash_size
+
+    max_tri = max(2 * n - 5, 1)
+    tris = [0] * (max_tri * 3)
+    half = [-1] * (max_tri * 3)
+    hull_next = [0] * n
+    hull_prev = [0] * n
+    hull_tri = [0] * n
+    hull_hash = [-1] * hash_size
+    state = {"len": 0, "start": i0}
+
+    def add(i, j, k, a, b, c):
+        t = state["len"]
+        tris[t] = i
+        tris[t + 1] = j
+        tris[t + 2] = k
+        half[t] = a
+        if a != -1:
+            half[a] = t
+        half[t + 1] = b
+        if b != -1:
+            half[b] = t + 1
+        half[t + 2] = c
+        if c != -1:
+            half[c] = t + 2
+        state["len"] = t + 3
+        return t
+
+    def legalize(a):
+        # flip until every edge around the new point is Delaunay; edges
+        # still to check wait on `stack` instead of recursing
+        stack = []
+        while True:
+            b = half[a]
+            m = a % 3
+            ar = a + 2 if m == 0 else a - 1
+            if b == -1:
+                if not stack:
+                    return ar
+                a = stack.pop()
+                continue
+            al = a - 2 if m == 2 else a + 1
+            n = b % 3
+            bl = b + 2 if n == 0 else b - 1
+            p0, pr, pl, p1 = tris[ar], tris[a], tris[al], tris[bl]
+            # is p1 inside the circumcircle of (p0, pr, pl)?
+            qx, qy = X[p1], Y[p1]
+            dx, dy = X[p0] - qx, Y[p0] - qy
+            ex, ey = X[pr] - qx, Y[pr] - qy
+            fx, fy = X[pl] - qx, Y[pl] - qy
+            ap = dx * dx + dy * dy
+            bp = ex * ex + ey * ey
+            cp = fx * fx + fy * fy
+            if dx * (ey * cp - bp * fy) - dy * (ex * cp - bp * fx) + ap * (ex * fy - ey * fx) >= 0:
+                if not stack:
+                    return ar
+                a = stack.pop()
+                continue
+            tris[a] = p1
+            tris[b] = p0
+            hbl = half[bl]
+            if hbl == -1:           # flipped edge on the hull: repoint hull_tri
+                e = state["start"]
+                while True:
+                    if hull_tri[e] == bl:
+                        hull_tri[e] = a
+                        break
+                    e = hull_prev[e]
+                    if e == state["start"]:
+                        break
+            half[a] = hbl
+            if hbl != -1:
+                half[hbl] = a
+            har = half[ar]
+            half[b] = har
+            if har != -1:
+                half[har] = b
+            half[ar] = bl
+            half[bl] = ar
+            if len(stack) < STACK:
+                stack.append(b - 2 if n == 2 else b + 1)
+
+    hull_next[i0] = hull_prev[i2] = i1
+    hull_next[i1] = hull_prev[i0] = i2
+    hull_next[i2] = hull_prev[i1] = i0
+    hull_tri[i0], hull_tri[i1], hull_tri[i2] = 0, 1, 2
+    for i in (i0, i1, i2):
+        hull_hash[hash_key(X[i], Y[i])] = i
+    add(i0, i1, i2, -1, -1, -1)
+
+    xp = yp = None
+    for i in order:
+        x, y = X[i], Y[i]
+        if xp is not None and abs(x - xp) <= EPS and abs(y - yp) <= EPS:
+            continue                # duplicate of the previous point
+        xp, yp = x, y
+        if i == i0 or i == i1 or i == i2:
+            continue
+
+        # a hull edge visible from the point, starting from the hash
+        key = hash_key(x, y)
+        start = 0
+        for j in range(hash_size):
+            start = hull_hash[(key + j) % hash_size]
+            if start != -1 and start != hull_next[start]:
+                break
+        start = hull_prev[start]
+        e = start
+        q = hull_next[e]
+        while not _orient(x, y, X[e], Y[e], X[q], Y[q]):
+            e = q
+            if e == start:
+                e = -1
+                break
+            q = hull_next[e]
+        if e == -1:
+            continue                # on the hull within rounding: a near-duplicate
+
+        t = add(e, i, hull_next[e], -1, -1, hull_tri[e])
+        hull_tri[i] = legalize(t + 2)
+        hull_tri[e] = t
+
+        # walk forward along the hull adding triangles
+        nx = hull_next[e]
+        q = hull_next[nx]
+        while _orient(x, y, X[nx], Y[nx], X[q], Y[q]):
+            t = add(nx, i, q, hull_tri[i], -1, hull_tri[nx])
+            hull_tri[i] = legalize(t + 2)
+            hull_next[nx] = nx      # removed from the hull
+            nx = q
+            q = hull_next[nx]
+
+        # and backward, if the first visible edge was the start
+        if e == start:
+            q = hull_prev[e]
+            while _orient(x, y, X[q], Y[q], X[e], Y[e]):
+                t = add(q, i, e, -1, hull_tri[e], hull_tri[q])
+                legalize(t + 2)
+                hull_tri[q] = t
+                hull_next[e] = e
+                e = q
+                q = hull_prev[e]
+
+        state["start"] = hull_prev[i] = e
+        hull_next[e] = hull_prev[nx] = i
+        hull_next[i] = nx
+        hull_hash[hash_key(x, y)] = i
+        hull_hash[hash_key(X[e], Y[e])] = e
+
+    # built clockwise (the hull walk above); flip to counter-clockwise
+    out = np.array(tris[:state["len"]], np.int64).reshape(-1, 3)
+    return out[:, [0, 2, 1]]
+
+
+def edge_lengths(tris, xs, ys):
+    """(m, 3) XY lengths of each triangle's edges."""
+    p = np.stack([np.asarray(xs, float), np.asarray(ys, float)], axis=1)[tris]
+    return np.linalg.norm(p - np.roll(p, -1, axis=1), axis=2)
+
+
+def prune(tris, xs, ys, max_edge=None, factor=EDGE_FACTOR):
+    """Drop triangles with an XY edge longer than `max_edge` (default:
+    `factor` x the median edge): the long thin triangles that span gaps
+    in the sampling and the hull. Returns (kept triangles, limit)."""
+    if not len(tris):
+        return tris, max_edge
+    lengths = edge_lengths(tris, xs, ys)
+    if max_edge is None:
+        max_edge = float(np.median(lengths)) * factor
+    return tris[lengths.max(axis=1) <= max_edge], max_edge
@@ -0,0 +1,323 @@
+import asyncio, queue, threading
+from . import scanner
+from . import metrics
+from . import planner
+from . import session
+from . import checkpoint
+from . import accumulator
+from . import livebuffer
+
+# ---------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------
+FRAME_TIMEOUT = 1.0     # s without a TFmini frame before the scan fails
+FRAME_SIZE = 9          # 0x59 0x59 + 7 bytes
+
+
+# ---------------------------------------------------------
+# FRAME STREAM
+# ---------------------------------------------------------
+class FrameStream:
+    """Parses TFmini-S frames as they arrive, without blocking the loop.
+
+    The sensor streams continuously, so instead of flushing and then
+    blocking on a read (read_lidar), the stream is drained all the time
+    and a pose simply waits for the first frame received after its
+    settle time. Real ports are watched with add_reader; ports without
+    a file descriptor (simulator) are read in the default executor.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.buf = bytearray()
+        self.waiters = []       # [not-before time, frames wanted, [(t, dist)], future]
+        self.loop = None
+        self._task = None
+        self._fd = None
+        self._timeout = None
+
+    def start(self, loop):
+        self.loop = loop
+        fileno = getattr(self.port, "fileno", None)
+        if fileno is not None:
+            self._fd = fileno()
+            self._timeout = self.port.timeout
+            self.port.timeout = 0
+            loop.add_reader(self._fd, self._readable)
+        else:
+            self._task = loop.create_task(self._pump())
+
+    def close(self):
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self.port.timeout = self._timeout
+            self._fd = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _readable(self):
+        self.feed(self.port.read(self.port.in_waiting or 1))
+
+    async def _pump(self):
+        while True:
+            self.feed(await self.loop.run_in_executor(None, self.port.read, FRAME_SIZE))
+
+    def feed(self, data):
+        self.buf += data
+        buf = self.buf
+        while len(buf) >= FRAME_SIZE:
+            if buf[0] != 0x59 or buf[1] != 0x59:
+                start = buf.find(b"YY", 1)
+                del buf[:start if start > 0 else len(buf) - 1]
+                continue
+            if sum(buf[:8]) & 0xff != buf[8]:
+                del buf[:1]
+                continue
+            dist = buf[2] + buf[3] * 256
+            del buf[:FRAME_SIZE]
+            self._deliver(metrics.now(), dist)
+
+    def _deliver(self, t, dist):
+        pending = []
+        for w in self.waiters:
+            after, n, got, fut = w
+            if fut.done():
+                continue
+            if t >= after:
+                got.append((t, dist))
+                if len(got) == n:
+                    fut.set_result(got)
+                    continue
+            pending.append(w)
+        self.waiters = pending
+
+    async def frames_after(self, t, n=1):
+        """[(arrival time, distance)] of the first n frames received at or
+        after time t."""
+        fut = self.loop.create_future()
+        self.waiters.append([t, n, [], fut])
+        return await asyncio.wait_for(fut, FRAME_TIMEOUT)
+
+
+# ---------------------------------------------------------
+# ENGINE
+# ---------------------------------------------------------
+class ScanEngine:
+    """asyncio scan engine running on its own thread.
+
+    Acquisition only moves, settles and waits for a frame; projection,
+    the checkpoint log, the live heightmap and progress publishing run
+    in a separate task fed through a queue, so the next move starts as
+    soon as a pose's frame is in. Other threads (Flask) use submit(),
+    status(), subscribe() and wait(); none of them touch engine state
+    directly.
+    """
+
+    def __init__(self, gpio=None, port=None):
+        self.gpio = gpio            # default: scanner.pi / scanner.ser at start
+        self.port = port
+        self.frame_rate = None      # sensor rate last acknowledged, None = unknown
+        self.loop = None
+        self.task = None
+        self.live_map = None
+        self.shared = None          # livebuffer.LiveWriter of the current scan
+        self.subscribers = []
+        self._state = {"scanning": False, "progress": 0, "job": None,
+                       "samples": 0, "error": None, "mode": None,
+                       "frame_rate": None, "sensor_warning": None}
+        self._lock = threading.Lock()
+
+    # -- thread-safe interface --------------------------------
+    def _ensure_loop(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="scan-engine",
+                                 daemon=True).start()
+        return self.loop
+
+    def submit(self, poses=None, process=True, mode="step"):
+        """Start a scan; returns its job id, or None if one is running.
+
+        `mode` is a planner.SCAN_MODES key: frames averaged per pose and
+        the sensor frame rate to run at.
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._submit(poses, process, mode), loop).result()
+
+    def status(self):
+        """Latest published {"scanning", "progress", "job", "samples", "error", ...}."""
+        return dict(self._state)
+
+    def busy(self):
+        return self._state["scanning"]
+
+    def wait(self, timeout=None):
+        """Block until the current scan (if any) has finished."""
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._wait(), self.loop).result(timeout)
+
+    def subscribe(self, maxsize=10000):
+        """Queue receiving (job, x, y, z) for every sample; full queues drop."""
+        q = queue.Queue(maxsize)
+        with self._lock:
+            self.subscribers = self.subscribers + [q]
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if s is not q]
+
+    # -- loop side --------------------------------------------
+    def _publish(self, **changes):
+        state = dict(self._state)
+        state.update(changes)
+        self._state = state         # single assignment: readers never see half an update
+
+    async def _submit(self, poses, process, mode):
+        if self.task is not None and not self.task.done():
+            return None
+        job_id = scanner.claim_job()
+        self._publish(scanning=True, progress=0, job=job_id, samples=0, error=None,
+                      mode=mode, sensor_warning=None)
+        self.shared = None
+        self.task = asyncio.get_running_loop().create_task(self._run(job_id, poses, process, mode))
+        return job_id
+
+    async def _wait(self):
+        if self.task is not None:
+            await asyncio.wait([self.task])
+
+    async def _run(self, job_id, poses, process, mode):
+        try:
+            await self._scan(job_id, poses, process, mode)
+            self._publish(scanning=False, progress=100)
+            if self.shared is not None:
+                self.shared.finish()
+        except BaseException as e:
+            self._publish(scanning=False, error=repr(e))
+            if self.shared is not None:
+                self.shared.finish(failed=True)
+            metrics.end_job()
+            if not isinstance(e, Exception):
+                raise
+
+    async def _move(self, gpio, pin, angle):
+        """scanner.move with asyncio sleeps; returns the angle to project with."""
+        target, settle, at = scanner.servo_target(gpio, pin, angle)
+        current = gpio.get_servo_pulsewidth(pin)
+        if current < 500 or current > 2500:
+            current = target
+        metrics.count("scanner_servo_degrees_total", abs(target - current) * 180 / 2000)
+        t0 = metrics.now()
+        for width in scanner.ramp(current, target) if scanner.SMOOTH else ():
+            gpio.set_servo_pulsewidth(pin, width)
+            await asyncio.sleep(scanner.SERVO_STEP_S)
+        t1 = metrics.now()
+        gpio.set_servo_pulsewidth(pin, target)
+        await asyncio.sleep(settle)
+        metrics.observe("scanner_servo_smooth_seconds", t1 - t0)
+        metrics.observe("scanner_servo_settle_seconds", metrics.now() - t1)
+        return at
+
+    def _set_frame_rate(self, port, hz):
+        """Ask the sensor for `hz`; on failure keep scanning at whatever
+        rate it runs (reads do not depend on the rate)."""
+        if hz == self.frame_rate:
+            return
+        report = scanner.configure_sensor(port, hz)
+        if "frame_rate" in report["applied"]:
+            self.frame_rate = report["applied"]["frame_rate"]
+        else:
+            self.frame_rate = None
+        self._publish(frame_rate=self.frame_rate,
+                      sensor_warning="; ".join(report["failed"].values()) or None)
+
+    async def _scan(self, job_id, poses, process, mode):
+        loop = asyncio.get_running_loop()
+        scanner.open_hardware()
+        gpio = self.gpio if self.gpio is not None else scanner.pi
+        port = self.port if self.port is not None else scanner.ser
+        n_frames = planner.SCAN_MODES[mode]["frames"]
+        await loop.run_in_executor(None, self._set_frame_rate, port,
+                                   planner.SCAN_MODES[mode]["frame_rate"])
+        metrics.begin_job(job_id)
+
+        if poses is None:
+            poses = planner.serpentine(scanner.PAN_MIN, scanner.PAN_MAX, scanner.PAN_STEP,
+                                       scanner.TILT_MIN, scanner.TILT_MAX, scanner.TILT_STEP)
+        meta = {k: getattr(scanner, k) for k in session.META_KEYS}
+        meta["BACKLASH_TABLE"] = scanner.backlash_table()
+        meta["poses"] = poses
+        log = checkpoint.CheckpointLog(checkpoint.path_for(scanner.SCAN_DIR, job_id), meta)
+
+        self.live_map = accumulator.HeightAccumulator(
+            scanner.GRID_SIZE, planner.route_bounds(poses, scanner.HEIGHT_CM))
+        self.shared = livebuffer.publish(job_id, len(poses)) if scanner.SHARED_LIVE else None
+
+        samples = asyncio.Queue()
+        consumer = loop.create_task(self._consume(job_id, samples, log, len(poses)))
+        frames = FrameStream(port)
+        frames.start(loop)
+
+        t_scan = metrics.now()
+        try:
+            gpio.set_servo_pulsewidth(scanner.PAN_PIN, 1500)
+            gpio.set_servo_pulsewidth(scanner.TILT_PIN, 1500)
+            await asyncio.sleep(0.3)
+            for tilt, sweep in planner.split_rows(poses):
+                t0 = metrics.now()
+                tilt_at = await self._move(gpio, scanner.TILT_PIN, tilt)
+                metrics.observe("scanner_pose_move_seconds", metrics.now() - t0, axis="tilt")
+                for pan in sweep:
+                    t0 = metrics.now()
+                    pan_at = await self._move(gpio, scanner.PAN_PIN, pan)
+                    t1 = metrics.now()
+                    got = await frames.frames_after(t1, n_frames)
+                    dist = round(sum(d for _, d in got) / n_frames)
+                    metrics.observe("scanner_pose_move_seconds", t1 - t0, axis="pan")
+                    # first frame only: extra frames are costed per mode by the planner
+                    metrics.observe("scanner_sensor_wait_seconds", got[0][0] - t1)
+                    metrics.count_pose()
+                    samples.put_nowait((tilt, pan, dist, tilt_at, pan_at))
+                samples.put_nowait((tilt, None, None, None, None))      # row finished
+        finally:
+            frames.close()
+            gpio.set_servo_pulsewidth(scanner.PAN_PIN, 0)
+            gpio.set_servo_pulsewidth(scanner.TILT_PIN, 0)
+            samples.put_nowait(None)
+            xs, ys, zs = await consumer
+            log.close()
+        metrics.record_stage("acquire", metrics.now() - t_scan)
+        scanner.calibrate(gpio)
+
+        if process:
+            await loop.run_in_executor(None, scanner.process_scan, xs, ys, zs, self.live_map, job_id)
+        metrics.end_job()
+
+    async def _consume(self, job_id, samples, log, total):
+        xs, ys, zs = [], [], []
+        while True:
+            item = await samples.get()
+            if item is None:
+                return xs, ys, zs
+            tilt, pan, dist, tilt_at, pan_at = item
+            if pan is None:
+                log.row_done(tilt)
+                continue
+            x, y, z = scanner.project(pan_at, tilt_at, dist)
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+            log.append(tilt, pan, dist, x, y, z)
+            self.live_map.add(x, y, z)
+            if self.shared is not None:
+                self.shared.append(x, y, z)
+            self._publish(samples=len(xs), progress=int(len(xs) / total * 100))
+            for q in self.subscribers:
+                try:
+                    q.put_nowait((job_id, x, y, z))
+                except queue.Full:
+                    pass
@@ -0,0 +1,219 @@
+import math, threading
+import numpy as np
+from . import scanner
+from . import metrics
+from . import planner
+from . import accumulator
+from . import livebuffer
+
+try:
+    import serial, pigpio
+except ImportError:     # workstation: simulator only
+    serial = pigpio = None
+
+# ---------------------------------------------------------
+# HEAD CONFIG
+# ---------------------------------------------------------
+# One entry per sensor head. "mount" is the head's pose in the shared
+# world frame: (x cm, y cm, yaw deg, height cm above the table). Yaw turns
+# the head's own pan axis (its local +x) counter-clockwise about z.
+HEADS = [
+    {"name": "a", "port": "/dev/ttyS0", "baud": 115200,
+     "pan_pin": 13, "tilt_pin": 18, "mount": (-25.0, 0.0, 0.0, 70.0),
+     "pan": (-35, 10, 1), "tilt": (-15, 15, 1)},
+    {"name": "b", "port": "/dev/ttyAMA1", "baud": 115200,
+     "pan_pin": 12, "tilt_pin": 19, "mount": (25.0, 0.0, 180.0, 70.0),
+     "pan": (-35, 10, 1), "tilt": (-15, 15, 1)},
+]
+
+
+# ---------------------------------------------------------
+# ONE SENSOR HEAD
+# ---------------------------------------------------------
+class Head:
+    """A pan/tilt servo pair plus its LiDAR, placed at `mount`."""
+
+    def __init__(self, name, gpio, port, pan_pin, tilt_pin, mount, poses, owns_port=False):
+        self.name = name
+        self.gpio = gpio
+        self.port = port
+        self.owns_port = owns_port      # close the port after the scan
+        self.pan_pin = pan_pin
+        self.tilt_pin = tilt_pin
+        self.mount = mount
+        self.poses = poses
+        self.done = 0
+        self.error = None
+
+    def to_world(self, pan, tilt, dist):
+        """Same projection as run_scan, then rotated/shifted by the mount."""
+        mx, my, yaw, height = self.mount
+        lx, ly, z = scanner.project(pan, tilt, dist, height)
+        c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+        return mx + c * lx - s * ly, my + s * lx + c * ly, z
+
+    def footprint(self):
+        """World-frame (xmin, ymin, xmax, ymax) of the route on the table."""
+        pans, tilts = np.asarray(self.poses, float).T
+        gx, gy = planner.ground_point(pans, tilts, self.mount[3])
+        mx, my, yaw, _ = self.mount
+        c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+        wx, wy = mx + c * gx - s * gy, my + s * gx + c * gy
+        return wx.min(), wy.min(), wx.max(), wy.max()
+
+    def scan(self, sink, stop=None):
+        """Walk the route, handing each world point to sink(x, y, z).
+        Returns early once the `stop` event is set."""
+        self.gpio.set_servo_pulsewidth(self.pan_pin, 1500)
+        self.gpio.set_servo_pulsewidth(self.tilt_pin, 1500)
+        scanner.sleep(0.3)
+        try:
+            for tilt, sweep in planner.split_rows(self.poses):
+                tilt_at = scanner.move(self.tilt_pin, tilt, gpio=self.gpio, axis="tilt")
+                for pan in sweep:
+                    if stop is not None and stop.is_set():
+                        return
+                    t0 = metrics.now()
+                    pan_at = scanner.move(self.pan_pin, pan, gpio=self.gpio, axis="pan")
+                    t1 = metrics.now()
+                    dist = scanner.read_lidar(self.port)
+                    metrics.observe("scanner_sensor_wait_seconds", metrics.now() - t1)
+                    metrics.observe("scanner_pose_move_seconds", t1 - t0, axis="pan")
+                    metrics.count_pose()
+                    sink(*self.to_world(pan_at, tilt_at, dist))
+                    self.done += 1
+        finally:
+            self.gpio.set_servo_pulsewidth(self.pan_pin, 0)
+            self.gpio.set_servo_pulsewidth(self.tilt_pin, 0)
+
+
+def open_heads(configs=None, simulate=False, scene=None, realtime=True):
+    """Build Head objects from HEADS-style configs.
+
+    All heads share one pigpio connection (its commands are serialised
+    by pigpio itself); each gets its own UART, which run_multi_scan
+    closes again unless it is scanner's own. simulate=True uses
+    simulator.py instead of hardware.
+    """
+    configs = HEADS if configs is None else configs
+    if simulate:
+        from . import simulator
+        gpio = simulator.SimPi()
+    else:
+        scanner.open_hardware()
+        gpio = scanner.pi
+
+    heads = []
+    for c in configs:
+        poses = c.get("poses") or planner.serpentine(*c["pan"], *c["tilt"])
+        if simulate:
+            port = simulator.SimSerial(gpio, c["pan_pin"], c["tilt_pin"], c["mount"],
+                                       scene, realtime)
+        else:
+            gpio.set_mode(c["pan_pin"], pigpio.OUTPUT)
+            gpio.set_mode(c["tilt_pin"], pigpio.OUTPUT)
+            if scanner.ser is not None and c["port"] == scanner.UART_PORT:
+                port = scanner.ser      # already open for single-head scans
+            else:
+                port = serial.Serial(c["port"], c.get("baud", scanner.UART_BAUD), timeout=0.2)
+        heads.append(Head(c["name"], gpio, port, c["pan_pin"], c["tilt_pin"],
+                          tuple(c["mount"]), poses, owns_port=port is not scanner.ser))
+    return heads
+
+
+# ---------------------------------------------------------
+# CONCURRENT SCAN
+# ---------------------------------------------------------
+def failed_heads(heads):
+    return [h for h in heads if h.error is not None]
+
+
+def run_multi_scan(heads=None, process=True):
+    """Scan with every head at once and merge the clouds in the world frame.
+
+    Each head runs its route on its own thread. Servo settling (sleep)
+    and UART reads release the GIL, so while one head waits on motion
+    the others move or read: wall time is roughly that of the slowest
+    head instead of the sum. Progress and the live heightmap are
+    published through scanner's globals like a single-head scan. If one
+    head fails, the others stop at their next pose.
+    """
+    if heads is None:
+        heads = open_heads()
+    try:
+        return _run_heads(heads, process)
+    finally:
+        for h in heads:
+            if h.owns_port:
+                h.port.close()
+
+
+def _run_heads(heads, process):
+    """run_multi_scan on opened heads."""
+    scanner.is_scanning = True
+    scanner.scan_progress = 0
+    scanner.job_id = scanner.claim_job()
+    metrics.begin_job(scanner.job_id)
+
+    total = sum(len(h.poses) for h in heads)
+    boxes = np.array([h.footprint() for h in heads])
+    live = accumulator.HeightAccumulator(
+        scanner.GRID_SIZE, (boxes[:, 0].min(), boxes[:, 1].min(),
+                            boxes[:, 2].max(), boxes[:, 3].max()))
+    scanner.live_map = live
+    shared = livebuffer.publish(scanner.job_id, total) if scanner.SHARED_LIVE else None
+    clouds = {h.name: ([], [], []) for h in heads}
+    stop = threading.Event()
+    lock = threading.Lock()     # live map and shared buffer see whole samples
+
+    def worker(head):
+        xs, ys, zs = clouds[head.name]
+
+        def sink(x, y, z):
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+            with lock:
+                live.add(x, y, z)
+                if shared is not None:
+                    shared.append(x, y, z)
+            scanner.scan_progress = int(sum(h.done for h in heads) / total * 100)
+
+        try:
+            head.scan(sink, stop)
+        except BaseException as e:
+            head.error = e
+            stop.set()
+
+    t0 = metrics.now()
+    threads = [threading.Thread(target=worker, args=(h,), name="head-" + h.name)
+               for h in heads]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    metrics.record_stage("acquire", metrics.now() - t0)
+    failed = failed_heads(heads)
+    if failed:
+        scanner.is_scanning = False
+        if shared is not None:
+            shared.finish(failed=True)
+        metrics.end_job()
+        raise RuntimeError("head %s failed: %r" % (failed[0].name, failed[0].error))
+    scanner.calibrate(heads[0].gpio)
+
+    xs, ys, zs = [], [], []
+    for h in heads:
+        hx, hy, hz = clouds[h.name]
+        xs += hx
+        ys += hy
+        zs += hz
+    if process:
+        scanner.process_scan(xs, ys, zs, live)
+
+    metrics.end_job()
+    scanner.is_scanning = False
+    scanner.scan_progress = 100
+    if shared is not None:
+        shared.finish()
+    return xs, ys, zs
@@ -0,0 +1,118 @@
+import math
+import numpy as np
+
+# ---------------------------------------------------------
+# GROUND PLANE
+# ---------------------------------------------------------
+def fit_ground(xs, ys, zs):
+    """Least-squares plane z = a*x + b*y + c, returns (a, b, c)."""
+    A = np.c_[xs, ys, np.ones_like(xs)]
+    coeffs, _, _, _ = np.linalg.lstsq(A, zs, rcond=None)
+    return coeffs
+
+
+def flatten(xs, ys, zs, coeffs):
+    a, b, c = coeffs
+    return zs - (a * xs + b * ys + c)
+
+
+# ---------------------------------------------------------
+# GRIDDING
+# ---------------------------------------------------------
+def grid_shape(xs, ys, cell):
+    """Origin and size of a grid covering the points (same rule as scanner)."""
+    return shape_from_bounds(xs.min(), ys.min(), xs.max(), ys.max(), cell)
+
+
+def shape_from_bounds(x_min, y_min, x_max, y_max, cell):
+    """The origin is on a multiple of `cell`, so grids of different clouds
+    (or of one cloud as it grows, see accumulator.py) share cell edges."""
+    x0 = math.floor(x_min / cell) * cell
+    y0 = math.floor(y_min / cell) * cell
+    # (x_min / cell can round up to a whole number)
+    x0 -= cell if x0 > x_min else 0
+    y0 -= cell if y0 > y_min else 0
+    nx = int((x_max - x0) / cell) + 1
+    ny = int((y_max - y0) / cell) + 1
+    return x0, y0, nx, ny
+
+
+def cell_index(xs, ys, x0, y0, cell, nx, ny):
+    """Cell indices of each point and a mask of points inside the grid."""
+    ix = np.floor((xs - x0) / cell).astype(int)
+    iy = np.floor((ys - y0) / cell).astype(int)
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+    return ix, iy, inside
+
+
+def max_grid(xs, ys, zf, x0, y0, cell, nx, ny):
+    """Per-cell max height (NaN where empty), points outside are dropped."""
+    grid = np.full(ny * nx, -np.inf)
+    max_into(grid, xs, ys, zf, x0, y0, cell, nx, ny)
+    grid[np.isneginf(grid)] = np.nan
+    return grid.reshape(ny, nx)
+
+
+def max_into(flat, xs, ys, zf, x0, y0, cell, nx, ny):
+    """Fold one batch of points into a running flat (-inf filled) max grid,
+    so a cloud can be gridded chunk by chunk."""
+    ix, iy, inside = cell_index(xs, ys, x0, y0, cell, nx, ny)
+    np.maximum.at(flat, iy[inside] * nx + ix[inside], zf[inside])
+
+
+# ---------------------------------------------------------
+# CONNECTED COMPONENTS
+# ---------------------------------------------------------
+def dilate(mask, r):
+    """Binary dilation: r passes of 4-neighbour growth using shifted ORs."""
+    out = np.asarray(mask, bool).copy()
+    for _ in range(r):
+        g = out.copy()
+        g[1:, :] |= out[:-1, :]
+        g[:-1, :] |= out[1:, :]
+        g[:, 1:] |= out[:, :-1]
+        g[:, :-1] |= out[:, 1:]
+        out = g
+    return out
+
+
+def label(mask):
+    """4-connected component labelling with an array-based union-find.
+
+    Returns (labels, count); labels is 0 outside the mask and 1..count
+    inside. Runs in a handful of vectorised passes (hooking + pointer
+    jumping) instead of a per-cell Python flood fill.
+    """
+    mask = np.asarray(mask, bool)
+    ny, nx = mask.shape
+    idx = np.arange(ny * nx).reshape(ny, nx)
+
+    h = mask[:, :-1] & mask[:, 1:]
+    v = mask[:-1, :] & mask[1:, :]
+    a = np.concatenate([idx[:, :-1][h], idx[:-1, :][v]])
+    b = np.concatenate([idx[:, 1:][h], idx[1:, :][v]])
+
+    parent = np.arange(ny * nx)
+    while True:
+        pa = parent[a]
+        pb = parent[b]
+        diff = pa != pb
+        if not diff.any():
+            break
+        lo = np.minimum(pa[diff], pb[diff])
+        hi = np.maximum(pa[diff], pb[diff])
+        np.minimum.at(parent, hi, lo)
+        # pointer jumping until every node points at its root
+        while True:
+            nxt = parent[parent]
+            if np.array_equal(nxt, parent):
+                break
+            parent = nxt
+
+    roots = parent.reshape(ny, nx)
+    labels = np.zeros((ny, nx), int)
+    if mask.any():
+        _, inv = np.unique(roots[mask], return_inverse=True)
+        labels[mask] = inv + 1
+        return labels, int(inv.max()) + 1
+    return labels, 0
@@ -0,0 +1,321 @@
+import os, sys, time, atexit, threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# ---------------------------------------------------------
+# SHARED-MEMORY LIVE BUFFER
+# ---------------------------------------------------------
+# The running scan publishes its samples in a named shared-memory segment
+# (/dev/shm/lidarscan_live on Linux) that local tools - a QA script, a
+# live viewer - map and read without copies, HTTP or polling the web app.
+#
+# layout (little-endian):
+#   0    b"LIDARLV1"
+#   8    uint64  seq        odd while the writer updates the header
+#   16   uint64  capacity   samples the segment holds
+#   24   uint64  count      samples published
+#   32   uint64  total      samples the scan will take (progress = count / total)
+#   40   uint64  state      IDLE / SCANNING / DONE / FAILED / SUPERSEDED
+#   48   uint64  dropped    samples that did not fit
+#   56   float64 updated    time.time() of the last change
+#   64   16 bytes job id (ASCII, NUL-padded)
+#   128  (capacity, 3) float32 x, y, z
+#
+# Samples are append-only: a slot is written before count covers it and
+# never changes afterwards, so points[:count] is stable without locking.
+# seq is a seqlock over the header words: readers retry until they see
+# the same even value before and after. The writer never waits for a
+# reader; a reader that falls behind just reads more at once.
+#
+# Every scan gets a fresh segment under the same name, sized to its
+# route. The previous one is marked SUPERSEDED and unlinked; readers
+# still mapping it see the flag and reopen.
+NAME = os.environ.get("LIDAR_LIVE_SHM", "lidarscan_live")
+MAGIC = b"LIDARLV1"
+HEADER = 128
+JOB_OFFSET, JOB_BYTES = 64, 16
+SEQ, CAPACITY, COUNT, TOTAL, STATE, DROPPED = 1, 2, 3, 4, 5, 6
+UPDATED = 7
+IDLE, SCANNING, DONE, FAILED, SUPERSEDED = range(5)
+STATES = {IDLE: "idle", SCANNING: "scanning", DONE: "done", FAILED: "failed",
+          SUPERSEDED: "superseded"}
+DTYPE = np.dtype("<f4")
+
+
+def _attach(name):
+    """Map an existing segment without handing it to this process's
+    resource tracker (which would unlink it when a reader exits)."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)    # 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        # the tracker keeps one entry per name: leave it if we are the writer
+        if _current is None or _current.name != name:
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return shm
+
+
+def _views(buf, capacity):
+    # frombuffer holds a buffer export, so the mapping cannot be closed
+    # under a live array (np.ndarray(buffer=...) would let it dangle)
+    words = np.frombuffer(buf, "<u8", 8)
+    updated = np.frombuffer(buf, "<f8", 8)
+    points = np.frombuffer(buf, DTYPE, capacity * 3, HEADER).reshape(capacity, 3)
+    return words, updated, points
+
+
+# ---------------------------------------------------------
+# WRITER (scan side)
+# ---------------------------------------------------------
+class LiveWriter:
+    """Owner of one scan's segment. append() is safe from several
+    threads (multi-head scans); it never blocks on readers."""
+
+    def __init__(self, job, total, name=NAME):
+        capacity = max(int(total), 1)
+        self.name = name
+        self.shm = shared_memory.SharedMemory(name, create=True,
+                                              size=HEADER + capacity * 3 * DTYPE.itemsize)
+        self.words, self._updated, self.points = _views(self.shm.buf, capacity)
+        self.lock = threading.Lock()
+        self.words[:] = 0
+        job = str(job or "").encode()[:JOB_BYTES]
+        self.shm.buf[JOB_OFFSET:JOB_OFFSET + JOB_BYTES] = job.ljust(JOB_BYTES, b"\0")
+        self.words[CAPACITY] = capacity
+        self.words[TOTAL] = int(total)
+        self.words[STATE] = SCANNING
+        self._updated[UPDATED] = time.time()
+        self.shm.buf[:8] = MAGIC         # last: readers ignore a segment without it
+
+    def _bump(self):
+        self.words[SEQ] += 1
+
+    def append(self, x, y, z):
+        with self.lock:
+            n = int(self.words[COUNT])
+            if n >= len(self.points):
+                self.words[DROPPED] += 1
+                return
+            self.points[n] = (x, y, z)
+            self._bump()
+            self.words[COUNT] = n + 1
+            self._updated[UPDATED] = time.time()
+            self._bump()
+
+    def extend(self, xs, ys, zs):
+        """Publish a batch (e.g. the samples a resumed job already has)."""
+        with self.lock:
+            n = int(self.words[COUNT])
+            k = min(len(xs), len(self.points) - n)
+            if k > 0:
+                self.points[n:n + k, 0] = xs[:k]
+                self.points[n:n + k, 1] = ys[:k]
+                self.points[n:n + k, 2] = zs[:k]
+            self._bump()
+            self.words[COUNT] = n + max(k, 0)
+            self.words[DROPPED] += len(xs) - max(k, 0)
+            self._updated[UPDATED] = time.time()
+            self._bump()
+
+    def finish(self, failed=False):
+        self._set_state(FAILED if failed else DONE)
+
+    def _set_state(self, state):
+        with self.lock:
+            self._bump()
+            self.words[STATE] = state
+            self._updated[UPDATED] = time.time()
+            self._bump()
+
+    def close(self):
+        """Mark the segment superseded and remove its name. Mappings that
+        readers still hold stay valid until they close them."""
+        self._set_state(SUPERSEDED)
+        self.words = self._updated = self.points = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def publish(job, total, xs=(), ys=(), zs=(), name=NAME):
+    """Start a segment for a new scan (replacing the previous one) and
+    preload `xs, ys, zs`. Returns the writer, or None if shared memory
+    is unavailable - the scan runs the same without it."""
+    global _current
+    with _current_lock:
+        if _current is not None:
+            _current.close()
+            _current = None
+        try:
+            try:
+                _current = LiveWriter(job, total, name)
+            except FileExistsError:     # left by a crashed scanner, or another one
+                stale = shared_memory.SharedMemory(name)
+                if stale.size >= HEADER and bytes(stale.buf[:8]) == MAGIC:
+                    stale.buf[STATE * 8:STATE * 8 + 8] = SUPERSEDED.to_bytes(8, "little")
+                stale.unlink()
+                stale.close()
+                _current = LiveWriter(job, total, name)
+        except OSError as e:
+            print("live buffer disabled:", e, file=sys.stderr)
+            return None
+        if len(xs):
+            _current.extend(np.asarray(xs, float), np.asarray(ys, float), np.asarray(zs, float))
+        return _current
+
+
+@atexit.register
+def _close_current():
+    global _current
+    with _current_lock:
+        if _current is not None:
+            _current.close()
+            _current = None
+
+
+# ---------------------------------------------------------
+# READER (any local process)
+# ---------------------------------------------------------
+class LiveReader:
+    """Read-only mapping of the live segment.
+
+        r = LiveReader()
+        seen = 0
+        while True:
+            st = r.wait(seen)                  # header snapshot once it changes
+            pts = r.points(seen, st["count"])  # (n, 3) float32 view, no copy
+            seen = st["count"]
+
+    Views returned by points() stay valid until close() or a reopen after
+    the scanner moved to a new segment; copy what must outlive that.
+    """
+
+    def __init__(self, name=NAME):
+        self.name = name
+        self.shm = None
+        self.words = None
+        self.points_all = None
+
+    def open(self):
+        """Map the current segment; False if no scanner has published one."""
+        self.close()
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        if shm.size < HEADER or bytes(shm.buf[:8]) != MAGIC:
+            shm.close()
+            return False
+        capacity = int.from_bytes(shm.buf[CAPACITY * 8:CAPACITY * 8 + 8], "little")
+        self.shm = shm
+        self.words, self._updated, self.points_all = _views(shm.buf, capacity)
+        self.points_all.flags.writeable = False
+        return True
+
+    def close(self):
+        self.words = self._updated = self.points_all = None
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                # the caller still holds a points() view: let that view own
+                # the mapping (it is unmapped when the last one goes)
+                self.shm._buf = self.shm._mmap = None
+            self.shm = None
+
+    def __del__(self):
+        self.close()
+
+    def status(self):
+        """Consistent header snapshot, or None if there is no segment.
+        Reopens when the scanner has started a new one."""
+        if self.shm is None and not self.open():
+            return None
+        while True:
+            s1 = int(self.words[SEQ])
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            count, total, state, dropped = (int(v) for v in
+                                            self.words[[COUNT, TOTAL, STATE, DROPPED]])
+            updated = float(self._updated[UPDATED])
+            job = bytes(self.shm.buf[JOB_OFFSET:JOB_OFFSET + JOB_BYTES]).rstrip(b"\0").decode()
+            if int(self.words[SEQ]) == s1:
+                break
+        if state == SUPERSEDED:
+            return self.status() if self.open() else None
+        return {"job": job or None, "state": STATES.get(state, state), "count": count,
+                "total": total, "progress": int(count / total * 100) if total else 0,
+                "dropped": dropped, "updated": updated, "seq": s1}
+
+    def points(self, start=0, end=None):
+        """Samples [start:end] (default: up to the published count) as a
+        float32 view into the segment."""
+        if self.shm is None and not self.open():
+            return np.empty((0, 3), DTYPE)
+        if end is None:
+            end = int(self.words[COUNT])
+        return self.points_all[start:end]
+
+    def wait(self, seen=0, timeout=None, interval=0.01):
+        """Block until the segment has more than `seen` samples or the
+        scan has ended; returns status() (None on timeout, no segment).
+        Readers poll the mapped header, which costs the scanner nothing."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            st = self.status()
+            if st is not None and (st["count"] > seen or st["state"] in ("done", "failed")):
+                return st
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Follow the live scan buffer.")
+    ap.add_argument("--name", default=NAME)
+    ap.add_argument("--once", action="store_true", help="print the current status and exit")
+    args = ap.parse_args()
+
+    with LiveReader(args.name) as r:
+        st = r.status()
+        if args.once:
+            print(st if st is not None else "no live buffer named " + args.name)
+            sys.exit(0 if st is not None else 1)
+        while st is None:           # no scan since the scanner started
+            time.sleep(0.5)
+            st = r.status()
+        seen, job = 0, st["job"]
+        while True:
+            st = r.wait(seen, timeout=5)
+            if st is None:
+                continue
+            if st["job"] != job:
+                seen, job = 0, st["job"]
+            pts = r.points(seen, st["count"])
+            if len(pts):
+                print(f"{job} {st['progress']:3d}%  {st['count']}/{st['total']}  +{len(pts)}  "
+                      f"z {pts[:, 2].min():.1f}..{pts[:, 2].max():.1f}")
+            del pts
+            seen = st["count"]
+            if st["state"] in ("done", "failed"):
+                print(job, st["state"])
+                while st is None or st["job"] == job:     # until the next scan
+                    time.sleep(0.2)
+                    st = r.status()
@@ -0,0 +1,161 @@
+import struct
+import numpy as np
+from . import delaunay
+
+# ---------------------------------------------------------
+# STREAMING STL WRITER
+# ---------------------------------------------------------
+# Triangles go to disk as they are produced, so memory holds at most one
+# batch, whatever the size of the mesh. Binary STL leaves the triangle
+# count in the header to be patched on close(); ASCII matches the layout
+# scanner.save_stl writes.
+BUFFER = 65536          # single triangles (tri()) buffered before a write
+BAND_ROWS = 256         # grid rows turned into triangles per batch
+MERGE_CM = 0.01         # samples closer than this in XY are one TIN vertex (highest z)
+
+FACET = np.dtype([("normal", "<f4", 3), ("vertex", "<f4", (3, 3)), ("attr", "<u2")])
+ASCII_FACET = (" facet normal %.6g %.6g %.6g\n  outer loop\n"
+               "   vertex %.6g %.6g %.6g\n   vertex %.6g %.6g %.6g\n   vertex %.6g %.6g %.6g\n"
+               "  endloop\n endfacet\n")
+
+
+def normals(tris):
+    n = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    return np.divide(n, length, out=np.zeros_like(n), where=length > 0)
+
+
+class StlWriter:
+    """Write an STL incrementally with write() (arrays of shape (n, 3, 3))
+    or tri(a, b, c), the callback scanner.write_walls expects."""
+
+    def __init__(self, path, binary=True, name="scan"):
+        self.binary = binary
+        self.name = name
+        self.count = 0
+        self.pending = []
+        self.f = open(path, "wb")
+        if binary:
+            self.f.write(f"binary STL {name}".encode().ljust(80, b"\0")[:80])
+            self.f.write(struct.pack("<I", 0))
+        else:
+            self.f.write(f"solid {name}\n".encode())
+
+    def tri(self, a, b, c):
+        self.pending.append((a, b, c))
+        if len(self.pending) >= BUFFER:
+            self._flush()
+
+    def write(self, tris):
+        self._flush()
+        self._write(np.asarray(tris, float).reshape(-1, 3, 3))
+
+    def _flush(self):
+        if self.pending:
+            tris = np.array(self.pending, float)
+            self.pending = []
+            self._write(tris)
+
+    def _write(self, tris):
+        if not len(tris):
+            return
+        n = normals(tris)
+        if self.binary:
+            rec = np.zeros(len(tris), FACET)
+            rec["normal"] = n
+            rec["vertex"] = tris
+            self.f.write(rec.tobytes())
+        else:
+            rows = np.concatenate([n, tris.reshape(-1, 9)], axis=1)
+            self.f.write((ASCII_FACET * len(rows) % tuple(rows.ravel())).encode())
+        self.count += len(tris)
+
+    def close(self):
+        self._flush()
+        if self.binary:
+            self.f.seek(80)
+            self.f.write(struct.pack("<I", self.count))
+        else:
+            self.f.write(f"endsolid {self.name}\n".encode())
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------
+# HEIGHTMAP SURFACE
+# ---------------------------------------------------------
+def grid_triangles(grid, x_min, y_min, cell, j0=0, j1=None):
+    """Top-surface triangles for cell rows j0..j1-1 (two per quad of
+    finite corners, same split and order as scanner.save_stl)."""
+    ny, nx = grid.shape
+    j1 = ny - 1 if j1 is None else min(j1, ny - 1)
+    g = grid[j0:j1 + 1]
+    h00, h10 = g[:-1, :-1], g[:-1, 1:]
+    h01, h11 = g[1:, :-1], g[1:, 1:]
+    ok = np.isfinite(h00) & np.isfinite(h10) & np.isfinite(h01) & np.isfinite(h11)
+    jj, ii = np.nonzero(ok)
+    xa = x_min + ii * cell
+    xb = x_min + (ii + 1) * cell
+    ya = y_min + (jj + j0) * cell
+    yb = y_min + (jj + j0 + 1) * cell
+    v1 = np.stack([xa, ya, h00[ok]], axis=1)
+    v2 = np.stack([xb, ya, h10[ok]], axis=1)
+    v3 = np.stack([xa, yb, h01[ok]], axis=1)
+    v4 = np.stack([xb, yb, h11[ok]], axis=1)
+    tris = np.empty((len(ii), 2, 3, 3))
+    tris[:, 0] = np.stack([v1, v2, v3], axis=1)
+    tris[:, 1] = np.stack([v2, v4, v3], axis=1)
+    return tris.reshape(-1, 3, 3)
+
+
+def write_surface(writer, grid_info, band=BAND_ROWS):
+    """Stream a heightmap's top surface into writer, band rows at a time."""
+    grid = grid_info["grid"]
+    for j0 in range(0, grid.shape[0] - 1, band):
+        writer.write(grid_triangles(grid, grid_info["x0"], grid_info["y0"],
+                                    grid_info["cell"], j0, j0 + band))
+
+
+# ---------------------------------------------------------
+# TRIANGULATED SURFACE (TIN)
+# ---------------------------------------------------------
+# Triangles through the samples themselves instead of a max-per-cell
+# raster: dense areas keep every sample, sparse areas are bridged rather
+# than left as empty cells, and a roof edge lies where the samples put
+# it instead of on a cell boundary. Triangles with an edge longer than
+# max_edge span real gaps (occlusion shadows, outside the footprint)
+# and are dropped.
+def merge_xy(xs, ys, zs, tol=MERGE_CM):
+    """One point per tol x tol XY position, keeping the highest."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    kx = np.floor(xs / tol).astype(np.int64)
+    ky = np.floor(ys / tol).astype(np.int64)
+    order = np.lexsort((-zs, ky, kx))
+    first = np.ones(len(order), bool)
+    first[1:] = (kx[order][1:] != kx[order][:-1]) | (ky[order][1:] != ky[order][:-1])
+    keep = order[first]
+    return xs[keep], ys[keep], zs[keep]
+
+
+def tin_triangles(xs, ys, zs, max_edge=None):
+    """(m, 3, 3) up-facing Delaunay triangles over the points and the
+    edge limit applied (None = delaunay.prune's default)."""
+    xs, ys, zs = merge_xy(xs, ys, zs)
+    tris = delaunay.triangulate(xs, ys)
+    tris, limit = delaunay.prune(tris, xs, ys, max_edge)
+    return np.stack([xs, ys, zs], axis=1)[tris], limit
+
+
+def write_tin(writer, xs, ys, zs, max_edge=None, batch=BUFFER):
+    """Triangulate the points into writer; returns the edge limit used."""
+    tris, limit = tin_triangles(xs, ys, zs, max_edge)
+    for k in range(0, len(tris), batch):
+        writer.write(tris[k:k + batch])
+    return limit
@@ -0,0 +1,196 @@
+import time, bisect, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# ---------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------
+ENABLED = True
+KEEP_JOBS = 20          # how many per-job breakdowns to remember
+
+# Bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HELP = {
+    "scanner_pose_move_seconds": "Time spent commanding and settling the servos per pose",
+    "scanner_sensor_wait_seconds": "Time spent waiting for a LiDAR frame per pose",
+    "scanner_servo_smooth_seconds": "Time spent in the servo smoothing loop per move",
+    "scanner_servo_settle_seconds": "Time spent in the settle sleep per move",
+    "scanner_stage_seconds": "Wall time per scan / post-processing stage",
+}
+
+now = time.perf_counter
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# HISTOGRAMS
+# ---------------------------------------------------------
+class Histogram:
+    """Fixed-bucket histogram, cheap enough to call on every pose."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+# name -> {label tuple -> Histogram}
+_families = {name: {} for name in HELP}
+
+# name -> running total (Prometheus counters)
+counters = {}
+COUNTER_HELP = {
+    "scanner_servo_degrees_total": "Total degrees travelled by the servos",
+}
+
+# job id -> timing breakdown
+jobs = OrderedDict()
+current_job = None
+
+
+def _histogram(name, key):
+    family = _families.setdefault(name, {})
+    hist = family.get(key)
+    if hist is None:
+        hist = family[key] = Histogram()
+    return hist
+
+
+def observe(name, seconds, **labels):
+    """Record one duration into histogram `name` (and the current job)."""
+    if not ENABLED:
+        return
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _histogram(name, key).observe(seconds)
+        if current_job is not None:
+            totals = current_job["totals"]
+            label = name if not labels else name + ":" + ",".join(str(v) for _, v in key)
+            totals[label] = totals.get(label, 0.0) + seconds
+
+
+def count(name, value=1):
+    if not ENABLED:
+        return
+    with _lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+@contextmanager
+def stage(name):
+    """Time a block as a named stage: `with metrics.stage("stl_write"): ...`"""
+    if not ENABLED:
+        yield
+        return
+    t0 = now()
+    try:
+        yield
+    finally:
+        record_stage(name, now() - t0)
+
+
+def record_stage(name, seconds):
+    """Record a stage duration measured by the caller."""
+    if not ENABLED:
+        return
+    with _lock:
+        _histogram("scanner_stage_seconds", (("stage", name),)).observe(seconds)
+        if current_job is not None:
+            stages = current_job["stages"]
+            stages[name] = stages.get(name, 0.0) + seconds
+
+
+# ---------------------------------------------------------
+# PER-JOB BREAKDOWN
+# ---------------------------------------------------------
+def begin_job(job_id):
+    global current_job
+    if not ENABLED:
+        return
+    with _lock:
+        current_job = {
+            "job": job_id,
+            "started": time.time(),
+            "wall_seconds": None,
+            "poses": 0,
+            "stages": {},
+            "totals": {},
+            "_t0": now(),
+        }
+        jobs[job_id] = current_job
+        while len(jobs) > KEEP_JOBS:
+            jobs.popitem(last=False)
+
+
+def count_pose():
+    if current_job is not None:
+        current_job["poses"] += 1
+
+
+def end_job():
+    global current_job
+    if current_job is None:
+        return
+    with _lock:
+        current_job["wall_seconds"] = now() - current_job["_t0"]
+        current_job = None
+
+
+def job_timings(job_id=None):
+    """JSON-friendly breakdown for one job (latest if job_id is None)."""
+    with _lock:
+        if not jobs:
+            return None
+        job = jobs.get(job_id) if job_id is not None else next(reversed(jobs.values()))
+        if job is None:
+            return None
+        out = {k: v for k, v in job.items() if not k.startswith("_")}
+        out["stages"] = dict(job["stages"])
+        out["totals"] = dict(job["totals"])
+        if out["wall_seconds"] is None:
+            out["wall_seconds"] = now() - job["_t0"]
+            out["running"] = True
+        return out
+
+
+# ---------------------------------------------------------
+# PROMETHEUS TEXT FORMAT
+# ---------------------------------------------------------
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus(prefix=""):
+    """Text exposition of every family (or those named `prefix`...)."""
+    lines = []
+    with _lock:
+        for name, family in _families.items():
+            if not name.startswith(prefix):
+                continue
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(family.items()):
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(key + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {hist.count}")
+                lines.append(f"{name}_sum{_labels(key)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(key)} {hist.count}")
+        for name, value in counters.items():
+            if not name.startswith(prefix):
+                continue
+            lines.append(f"# HELP {name} {COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
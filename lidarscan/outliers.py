@@ -0,0 +1,281 @@
+import numpy as np
+
+# ---------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------
+CELL_CM = 3.0          # height-test column size (wider where the scan is sparse)
+K_NEIGHBOURS = 6       # k for the mean k-NN distance
+STD_RATIO = 2.0        # reject if knn distance > mean + STD_RATIO * std ...
+LOCAL_RATIO = 3.0      # ... and > LOCAL_RATIO x the mean knn distance of its neighbours
+MAX_WIDEN = 4          # search radius doublings for sparse points before "isolated"
+CELLS = 20_000         # query cells per k-NN batch
+PAIRS = 2_000_000      # (point, candidate) distances computed at once
+SAMPLE = 2_000         # points whose k-NN sets the first search radius ...
+SAMPLE_QUANTILE = 0.75 # ... so that this share of them is found in one pass
+HEIGHT_SIGMA = 3.0     # reject if |z - local mean| > HEIGHT_SIGMA * local std + HEIGHT_TOL
+HEIGHT_TOL = 3.0       # cm, so flat patches (std ~ 0) do not reject everything
+
+
+# ---------------------------------------------------------
+# HASH GRID
+# ---------------------------------------------------------
+def _cells(coords, cell):
+    """Integer cell coordinates shifted so that every -1/+1 neighbour is >= 0."""
+    c = np.floor(coords / cell).astype(np.int64)
+    c -= c.min(axis=0) - 1
+    dims = c.max(axis=0) + 2
+    return c, dims
+
+
+def _pack(c, dims):
+    key = c[:, 0]
+    for d in range(1, c.shape[1]):
+        key = key * dims[d] + c[:, d]
+    return key
+
+
+def _neighbour_sums(keys, dims, values):
+    """Sum `values` (per unique cell) over each cell's 3^d neighbourhood.
+
+    `keys` must be the sorted unique cell keys. Neighbour cells are found
+    with searchsorted, so cost is O(cells * 3^d log cells), never O(n^2).
+    """
+    ndim = len(dims)
+    total = np.zeros_like(values)
+    for offset in np.ndindex(*(3,) * ndim):
+        shift = 0
+        for d in range(ndim):
+            shift = shift * dims[d] + (offset[d] - 1)
+        target = keys + shift
+        pos = np.searchsorted(keys, target)
+        pos[pos == len(keys)] = 0
+        hit = keys[pos] == target
+        total[hit] += values[pos[hit]]
+    return total
+
+
+# ---------------------------------------------------------
+# FILTERS
+# ---------------------------------------------------------
+def _spacing(xs, ys):
+    """Mean XY distance between samples if they covered their bounding box."""
+    return float(np.sqrt(np.ptp(xs) * np.ptp(ys) / len(xs)))
+
+
+def _knn(pts, query, cell, k):
+    """k-NN of the points pts[query]: returns (mean distance to their k
+    nearest others, the neighbours' indices, whether the result is exact).
+
+    Candidates come from the 3x3x3 cells around each query point's cell,
+    which hold every point closer than `cell` plus the point's margin to
+    its own cell's walls; the answer is exact when the k-th nearest is
+    within that. Points are sorted by cell first so that a cell's
+    candidates are a few contiguous runs. Each cell's candidate list is
+    built once; its points then get one row of a (points, candidates)
+    distance matrix, and rows with similar widths are partitioned
+    together.
+    """
+    c = np.floor(pts / cell).astype(np.int64)
+    c -= c.min(axis=0) - 1
+    dims = c.max(axis=0) + 2
+    keys = _pack(c, dims)
+    shifts = [((i - 1) * dims[1] + (j - 1)) * dims[2] - 1 for i, j in np.ndindex(3, 3)]
+    if len(query) < len(pts) // 4:
+        # a few queries left (sparse points, wider cells): only the
+        # points in the cells around theirs are worth sorting
+        around = np.unique(np.add.outer(np.unique(keys[query]),
+                                        np.add.outer(shifts, np.arange(3))).ravel())
+        pos = np.minimum(np.searchsorted(around, keys), len(around) - 1)
+        order = np.nonzero(around[pos] == keys)[0]
+        order = order[np.argsort(keys[order], kind="stable")]
+    else:
+        order = np.argsort(keys, kind="stable")
+    ukeys, start, count = np.unique(keys[order], return_index=True, return_counts=True)
+    rank = np.zeros(len(pts), np.int64)
+    rank[order] = np.arange(len(order))
+    x, y, z = (np.ascontiguousarray(a) for a in pts[order].T)
+
+    # queries by cell too, as positions in that order
+    by_cell = np.argsort(rank[query], kind="stable")
+    q = rank[query][by_cell]
+    qkeys, qstart, qcount = np.unique(keys[order[q]], return_index=True, return_counts=True)
+
+    m = len(q)
+    dist = np.full(m, np.inf)
+    nbrs = np.zeros((m, k), np.int64)
+    kth = np.full(m, np.inf)
+    for c0 in range(0, len(qkeys), CELLS):
+        c1 = min(c0 + CELLS, len(qkeys))
+        # neighbouring cells of each query cell, then its candidate list
+        # (z is the last packed axis, so a column's three cells are
+        # consecutive keys: one search per column, then step along it;
+        # the targets are sorted, so the search only needs the slice of
+        # keys between the first and the last, which stays in cache)
+        ga, gb = [], []
+        for shift in shifts:
+            target = qkeys[c0:c1] + shift
+            k0, k1 = np.searchsorted(ukeys, [target[0], target[-1] + 3])
+            pos = k0 + np.searchsorted(ukeys[k0:k1], target)
+            for _ in range(3):
+                at = np.minimum(pos, len(ukeys) - 1)
+                found = ukeys[at] == target
+                hit = np.nonzero(found)[0]
+                ga.append(hit)
+                gb.append(at[hit])
+                pos = pos + found
+                target = target + 1
+        own = len(ga) // 2                  # the cell itself: offset (0, 0, 0)
+        group = np.repeat(np.arange(len(ga)), [len(h) for h in ga])
+        ga = np.concatenate(ga)
+        s = np.argsort(ga, kind="stable")
+        ga, gb, group = ga[s], np.concatenate(gb)[s], group[s]
+        nb = count[gb]
+        width = np.bincount(ga, weights=nb, minlength=c1 - c0).astype(np.int64)
+        first = np.cumsum(width) - width
+        into = np.cumsum(nb) - nb
+        cands = np.repeat(start[gb] - into, nb) + np.arange(nb.sum())
+        # where each cell's own points sit in its list, to skip the point itself
+        mine = np.nonzero(group == own)[0]
+        self_at = np.zeros(c1 - c0, np.int64)
+        self_at[ga[mine]] = into[mine] - first[ga[mine]] - start[gb[mine]]
+        # candidate coordinates once per cell, plus a far-away pad
+        cands = np.append(cands, 0)
+        cx, cy, cz = (np.append(a[cands[:-1]], np.inf) for a in (x, y, z))
+
+        # one row per query point; batches of rows sorted by width
+        lo = qstart[c0]
+        rowcell = np.repeat(np.arange(c1 - c0), qcount[c0:c1])
+        rowwidth = width[rowcell]
+        rows = np.argsort(rowwidth, kind="stable")
+        total = np.cumsum(rowwidth[rows])
+        cuts = np.searchsorted(total, np.arange(PAIRS, total[-1], PAIRS))
+        for rr in np.split(rows, np.unique(cuts)):
+            if not len(rr):
+                continue
+            w = max(int(rowwidth[rr].max()), k)
+            col = np.arange(w)
+            cell_rr = rowcell[rr]
+            idx = np.where(col < rowwidth[rr][:, None], first[cell_rr][:, None] + col, len(cands) - 1)
+            me = q[lo + rr]
+            d = (cx[idx] - x[me][:, None]) ** 2
+            d += (cy[idx] - y[me][:, None]) ** 2
+            d += (cz[idx] - z[me][:, None]) ** 2
+            d[np.arange(len(rr)), self_at[cell_rr] + me] = np.inf
+            part = np.argpartition(d, k - 1, axis=1)[:, :k]
+            dk = np.sqrt(np.take_along_axis(d, part, axis=1))
+            dist[lo + rr] = dk.mean(axis=1)
+            nbrs[lo + rr] = cands[np.take_along_axis(idx, part, axis=1)]
+            kth[lo + rr] = dk.max(axis=1)
+
+    back = np.empty(m, np.int64)            # our rows, in the caller's order
+    back[by_cell] = np.arange(m)
+    scaled = pts[query] / cell
+    margin = np.minimum(scaled % 1, 1 - scaled % 1).min(axis=1)
+    exact = kth[back] <= cell * (1 + margin)
+    return dist[back], order[nbrs[back]], exact
+
+
+def _search(pts, query, cell, k):
+    """k-NN of pts[query], searching again with `cell` doubled for the
+    points whose k nearest are not all within reach, up to MAX_WIDEN
+    times. Points still short of k neighbours get inf."""
+    dist = np.full(len(query), np.inf)
+    nbrs = np.zeros((len(query), k), np.int64)
+    todo = np.arange(len(query))
+    for widen in range(MAX_WIDEN + 1):
+        d, nb, exact = _knn(pts, query[todo], cell * 2 ** widen, k)
+        done = exact if widen < MAX_WIDEN else np.isfinite(d)
+        dist[todo[done]] = d[done]
+        nbrs[todo[done]] = nb[done]
+        todo = todo[~done]
+        if not len(todo):
+            break
+    return dist, nbrs
+
+
+def _search_cell(pts, k):
+    """First search radius: the k-th neighbour distance most points are
+    within, measured on a sample of them. Twice the XY sample spacing is
+    only a lower bound: noise in z spreads the points out in 3D."""
+    cell = max(2 * _spacing(pts[:, 0], pts[:, 1]), 1e-3)
+    if len(pts) <= SAMPLE:
+        return cell
+    # one generous pass: a few thousand queries are cheap however wide
+    query = np.random.default_rng(0).choice(len(pts), SAMPLE, replace=False)
+    _, nbrs, exact = _knn(pts, query, cell * 2 ** (MAX_WIDEN // 2), k)
+    kth = np.sqrt(((pts[nbrs] - pts[query][:, None]) ** 2).sum(axis=2)).max(axis=1)
+    if exact.mean() < SAMPLE_QUANTILE:
+        return cell
+    return max(cell, float(np.quantile(np.where(exact, kth, np.inf), SAMPLE_QUANTILE)))
+
+
+def knn_distances(xs, ys, zs, k=K_NEIGHBOURS, cell=None):
+    """(mean distance to the k nearest neighbours, (n, k) their indices).
+
+    Exact k-NN through a hash grid, O(n) cells searched instead of O(n^2)
+    pairs. The first search radius (`cell`) defaults to the k-th
+    neighbour distance of most of a sample of the points; points without
+    k neighbours that close are searched again with it doubled (sparse
+    regions far from the sensor), up to MAX_WIDEN times. Points still
+    short of k neighbours get inf.
+    """
+    pts = np.c_[xs, ys, zs]
+    if cell is None:
+        cell = _search_cell(pts, k)
+    return _search(pts, np.arange(len(pts)), cell, k)
+
+
+def height_deviation(xs, ys, zs, cell=CELL_CM):
+    """|z - mean| / std of the other points in the 3x3 surrounding columns."""
+    c, dims = _cells(np.c_[xs, ys], cell)
+    keys, inv = np.unique(_pack(c, dims), return_inverse=True)
+    n = np.bincount(inv).astype(float)
+    s1 = np.bincount(inv, weights=zs)
+    s2 = np.bincount(inv, weights=zs * zs)
+
+    n = _neighbour_sums(keys, dims, n)[inv] - 1
+    s1 = _neighbour_sums(keys, dims, s1)[inv] - zs
+    s2 = _neighbour_sums(keys, dims, s2)[inv] - zs * zs
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s1 / n
+        std = np.sqrt(np.maximum(s2 / n - mean * mean, 0))
+    dev = np.abs(zs - mean)
+    dev[n < 1] = 0          # nothing to compare against
+    return dev, std
+
+
+def outlier_mask(xs, ys, zs, cell=CELL_CM, k=K_NEIGHBOURS, std_ratio=STD_RATIO,
+                 local_ratio=LOCAL_RATIO, height_sigma=HEIGHT_SIGMA, height_tol=HEIGHT_TOL):
+    """True for points that should be kept."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    if len(xs) <= k:
+        return np.ones(len(xs), bool)
+
+    # a return far from the surface is far from its own neighbours in
+    # absolute terms and relative to them: edge and sparse (far-range)
+    # samples have larger k-NN distances too, but so do their neighbours
+    d, nbrs = knn_distances(xs, ys, zs, k)
+    finite = np.isfinite(d)
+    keep = finite.copy()
+    if finite.any():
+        mean, std = d[finite].mean(), d[finite].std()
+        near = finite[nbrs]
+        local = np.where(near, d[nbrs], 0).sum(axis=1) / np.maximum(near.sum(axis=1), 1)
+        keep &= ~((d > mean + std_ratio * std) & (d > local_ratio * local))
+
+    # columns wide enough to hold a few samples even where the scan is sparse
+    dev, std = height_deviation(xs, ys, zs, max(cell, 2 * _spacing(xs, ys)))
+    keep &= ~(dev > height_sigma * np.nan_to_num(std) + height_tol)
+    return keep
+
+
+def filter_points(xs, ys, zs, **kwargs):
+    """Return (xs, ys, zs) arrays with statistical outliers removed."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    keep = outlier_mask(xs, ys, zs, **kwargs)
+    return xs[keep], ys[keep], zs[keep]
@@ -0,0 +1,385 @@
+import os, json, math
+import numpy as np
+from . import metrics
+from . import heightmap
+
+# ---------------------------------------------------------
+# DEFAULT MOVE COST MODEL (from the constants in scanner.move)
+# ---------------------------------------------------------
+# smoothing: 8 us every 3 ms, 2000 us per 180 deg
+DEFAULT_PER_DEG_S = 0.003 * (2000 / 180) / 8
+DEFAULT_SETTLE_S = 0.04
+DEFAULT_SENSOR_S = 0.01     # TFmini-S at 100 Hz, after a buffer flush
+HOME_S = 0.3
+
+# Timings measured on this rig, summed over past scans (see save_calibration)
+CALIBRATION_FILE = os.path.join("scans", "calibration.json")
+
+# Scan modes: frames captured per pose and the sensor frame rate they run at.
+# Frames after the first cost one frame period each.
+SCAN_MODES = {
+    "step": {"frames": 1, "frame_rate": 250},       # one frame per pose, short wait
+    "average": {"frames": 8, "frame_rate": 1000},   # full sensor rate, averaged
+}
+
+
+class MoveModel:
+    """Per-axis servo move cost: settle + degrees * per_deg.
+
+    The pan servo is commanded (and settles) on every pose, the tilt
+    servo only when the row changes - the same as run_scan.
+    """
+
+    def __init__(self, per_deg_s=DEFAULT_PER_DEG_S, settle_s=DEFAULT_SETTLE_S,
+                 sensor_s=DEFAULT_SENSOR_S):
+        self.per_deg_s = per_deg_s
+        self.settle_s = settle_s
+        self.sensor_s = sensor_s
+
+    def axis_cost(self, delta_deg):
+        delta_deg = np.abs(delta_deg)
+        return np.where(delta_deg > 0, self.settle_s + delta_deg * self.per_deg_s, 0.0)
+
+    def step_cost(self, d_pan, d_tilt):
+        return self.settle_s + np.abs(d_pan) * self.per_deg_s + self.axis_cost(d_tilt)
+
+    def as_dict(self):
+        return {"per_deg_s": self.per_deg_s, "settle_s": self.settle_s,
+                "sensor_s": self.sensor_s}
+
+
+# ---------------------------------------------------------
+# CALIBRATION
+# ---------------------------------------------------------
+_saved = None       # process totals already added to the calibration file
+
+def _totals():
+    """[sum, count] of the timings that drive MoveModel, for this process."""
+    def hist(name):
+        hists = metrics._families.get(name, {}).values()
+        return [sum(h.sum for h in hists), sum(h.count for h in hists)]
+    return {
+        "settle": hist("scanner_servo_settle_seconds"),
+        "sensor": hist("scanner_sensor_wait_seconds"),
+        "smooth": hist("scanner_servo_smooth_seconds"),
+        "degrees": [metrics.counters.get("scanner_servo_degrees_total", 0.0), 0],
+    }
+
+
+def _unsaved():
+    cur = _totals()
+    if _saved is None:
+        return cur
+    return {k: [cur[k][i] - _saved[k][i] for i in (0, 1)] for k in cur}
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_calibration(path=CALIBRATION_FILE):
+    """Add this process's timings since the last save to the rig's file.
+
+    Called after every scan on real hardware (scanner.calibrate), so
+    estimates keep using past scans after a restart.
+    """
+    global _saved
+    delta = _unsaved()
+    stored = load_calibration(path)
+    for k, (total, n) in delta.items():
+        old = stored.get(k, [0.0, 0])
+        stored[k] = [old[0] + total, old[1] + n]
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(stored, f)
+    _saved = _totals()
+
+
+def discard_calibration():
+    """Forget the timings since the last save (simulated or replayed
+    scans), so the next save_calibration doesn't add them."""
+    global _saved
+    _saved = _totals()
+
+
+def calibrated_model(path=CALIBRATION_FILE):
+    """Build a MoveModel from timings measured on this rig: past scans
+    (calibration file) plus anything measured since the last save."""
+    model = MoveModel()
+    stored = load_calibration(path)
+    t = {k: [stored.get(k, [0.0, 0])[i] + v[i] for i in (0, 1)]
+         for k, v in _unsaved().items()}
+    if t["settle"][1]:
+        model.settle_s = t["settle"][0] / t["settle"][1]
+    if t["sensor"][1]:
+        model.sensor_s = t["sensor"][0] / t["sensor"][1]
+    if t["degrees"][0] > 0:
+        model.per_deg_s = t["smooth"][0] / t["degrees"][0]
+    return model
+
+
+# ---------------------------------------------------------
+# POSE SETS
+# ---------------------------------------------------------
+def serpentine(pan_min, pan_max, pan_step, tilt_min, tilt_max, tilt_step):
+    """The classic full sweep, in exactly the order run_scan always used."""
+    poses = []
+    for tilt in range(tilt_min, tilt_max + 1, tilt_step):
+        sweep = range(pan_min, pan_max + 1, pan_step)
+        if tilt % 2 == 0:
+            sweep = reversed(list(sweep))
+        poses.extend((pan, tilt) for pan in sweep)
+    return poses
+
+
+def ground_angles(x, y, height_cm):
+    """Inverse of the scanner projection for a point on the table (z=0)."""
+    pan = np.degrees(np.arctan2(x, height_cm))
+    tilt = np.degrees(np.arctan(np.asarray(y) * np.cos(np.radians(pan)) / height_cm))
+    return pan, tilt
+
+
+def ground_point(pan, tilt, height_cm):
+    a = np.radians(pan)
+    b = np.radians(tilt)
+    dist = height_cm / (np.cos(a) * np.cos(b))
+    return dist * np.cos(b) * np.sin(a), dist * np.sin(b)
+
+
+def route_bounds(poses, height_cm):
+    """(xmin, ymin, xmax, ymax) of where a route's beams hit the table."""
+    if not len(poses):
+        return 0.0, 0.0, 0.0, 0.0
+    pans, tilts = np.asarray(poses, float).T
+    gx, gy = ground_point(pans, tilts, height_cm)
+    return gx.min(), gy.min(), gx.max(), gy.max()
+
+
+def inside_polygon(x, y, polygon):
+    """Vectorised even-odd ray casting test."""
+    x = np.asarray(x, float)
+    y = np.asarray(y, float)
+    inside = np.zeros(x.shape, bool)
+    px, py = np.asarray(polygon, float).T
+    for k in range(len(px)):
+        x1, y1 = px[k - 1], py[k - 1]
+        x2, y2 = px[k], py[k]
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xc = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < xc)
+    return inside
+
+
+def polygon_poses(polygon, height_cm, step=1, margin=1):
+    """Integer pan/tilt poses whose table hit point falls inside `polygon`.
+
+    `polygon` is a list of (x, y) in scan coordinates (cm); `margin` pads
+    the pose set by that many steps so edges are not clipped.
+    """
+    xs, ys = np.asarray(polygon, float).T
+    pans, tilts = ground_angles(xs, ys, height_cm)
+    pan_lo = int(math.floor(pans.min())) - margin * step
+    pan_hi = int(math.ceil(pans.max())) + margin * step
+    tilt_lo = int(math.floor(tilts.min())) - margin * step
+    tilt_hi = int(math.ceil(tilts.max())) + margin * step
+
+    P, T = np.meshgrid(np.arange(pan_lo, pan_hi + 1, step),
+                       np.arange(tilt_lo, tilt_hi + 1, step))
+    gx, gy = ground_point(P, T, height_cm)
+    keep = inside_polygon(gx, gy, polygon)
+    # pad the selection by `margin` steps in pose space
+    keep = heightmap.dilate(keep, margin)
+    return [(int(p), int(t)) for p, t in zip(P[keep], T[keep])]
+
+
+def cell_poses(cells, x0, y0, cell_size, height_cm, step=1, margin=1):
+    """Poses covering a list of (i, j) heightmap cells (refinement cells)."""
+    poses = set()
+    for i, j in cells:
+        xa = x0 + i * cell_size
+        ya = y0 + j * cell_size
+        square = [(xa, ya), (xa + cell_size, ya),
+                  (xa + cell_size, ya + cell_size), (xa, ya + cell_size)]
+        poses.update(polygon_poses(square, height_cm, step, margin))
+    return sorted(poses)
+
+
+def rectangle_poses(pan_min, pan_max, tilt_min, tilt_max, step=1):
+    return [(p, t) for t in range(tilt_min, tilt_max + 1, step)
+            for p in range(pan_min, pan_max + 1, step)]
+
+
+# ---------------------------------------------------------
+# ORDERING
+# ---------------------------------------------------------
+def route_cost(route, model):
+    """Estimated move time of a route (tilt then pan, like run_scan)."""
+    if not route:
+        return 0.0
+    r = np.asarray(route, float)
+    start = np.zeros((1, 2))        # homed at (0, 0)
+    d = np.diff(np.vstack([start, r]), axis=0)
+    return float(model.step_cost(d[:, 0], d[:, 1]).sum())
+
+
+def _boustrophedon(poses, major):
+    """Serpentine along rows of the `major` axis (0 = pan, 1 = tilt)."""
+    rows = {}
+    for p in poses:
+        rows.setdefault(p[major], []).append(p)
+    route = []
+    for n, key in enumerate(sorted(rows)):
+        row = sorted(rows[key], key=lambda p: p[1 - major], reverse=bool(n % 2))
+        route.extend(row)
+    return route
+
+
+def _nearest_neighbour(poses, model):
+    pts = np.asarray(poses, float)
+    left = np.ones(len(pts), bool)
+    cur = np.zeros(2)
+    route = []
+    for _ in range(len(pts)):
+        d = pts - cur
+        cost = model.step_cost(d[:, 0], d[:, 1])
+        cost[~left] = np.inf
+        k = int(np.argmin(cost))
+        left[k] = False
+        cur = pts[k]
+        route.append(poses[k])
+    return route
+
+
+def order(poses, model=None):
+    """Order poses to minimise servo travel + settle time.
+
+    Tries row- and column-major serpentines and a greedy nearest-neighbour
+    tour and keeps the cheapest; serpentines win on rectangles, the greedy
+    tour on scattered refinement cells.
+    """
+    model = model or calibrated_model()
+    poses = list(dict.fromkeys((int(p), int(t)) for p, t in poses))
+    if not poses:
+        return []
+    candidates = [_boustrophedon(poses, 1), _boustrophedon(poses, 0)]
+    if len(poses) <= 5000:
+        candidates.append(_nearest_neighbour(poses, model))
+    return min(candidates, key=lambda r: route_cost(r, model))
+
+
+def pose_sensor_s(model, mode="step"):
+    """Sensor time per pose: first frame as measured, extra frames by rate."""
+    m = SCAN_MODES[mode]
+    return model.sensor_s + (m["frames"] - 1) / m["frame_rate"]
+
+
+def estimate(route, model=None, mode="step"):
+    """Predicted wall time (s) for acquiring `route`, post-processing excluded."""
+    model = model or calibrated_model()
+    return HOME_S + route_cost(route, model) + len(route) * pose_sensor_s(model, mode)
+
+
+def split_rows(route):
+    """Group a route into contiguous runs of equal tilt: [(tilt, [pan, ...])]."""
+    rows = []
+    for pan, tilt in route:
+        if not rows or rows[-1][0] != tilt:
+            rows.append((tilt, []))
+        rows[-1][1].append(pan)
+    return rows
+
+
+def plan(poses, model=None, mode="step"):
+    model = model or calibrated_model()
+    route = order(poses, model)
+    return {
+        "poses": route,
+        "count": len(route),
+        "estimated_seconds": estimate(route, model, mode),
+        "model": model.as_dict(),
+    }
+
+
+# ---------------------------------------------------------
+# RESOLUTION / TIME TRADE-OFF
+# ---------------------------------------------------------
+def footprint(pan, tilt, height_cm):
+    """Table-plane outline of a pan/tilt rectangle, as a polygon."""
+    p0, p1 = pan[0], pan[1]
+    t0, t1 = tilt[0], tilt[1]
+    ps = np.linspace(p0, p1, 2 * (p1 - p0) + 2)
+    ts = np.linspace(t0, t1, 2 * (t1 - t0) + 2)
+    ring = np.r_[np.c_[ps, np.full_like(ps, t0)], np.c_[np.full_like(ts, p1), ts],
+                 np.c_[ps[::-1], np.full_like(ps, t1)], np.c_[np.full_like(ts, p0), ts[::-1]]]
+    gx, gy = ground_point(ring[:, 0], ring[:, 1], height_cm)
+    return np.c_[gx, gy]
+
+
+def _footprint_cells(pan, tilt, height_cm, cell):
+    poly = footprint(pan, tilt, height_cm)
+    x0, y0 = poly.min(axis=0)
+    nx, ny = (np.floor((poly.max(axis=0) - (x0, y0)) / cell) + 1).astype(int)
+    cx, cy = np.meshgrid(x0 + (np.arange(nx) + 0.5) * cell, y0 + (np.arange(ny) + 0.5) * cell)
+    inside = inside_polygon(cx.ravel(), cy.ravel(), poly).reshape(ny, nx)
+    return x0, y0, inside
+
+
+def predict(pan, tilt, height_cm, cell, mode="step", model=None, _cells=None):
+    """Duration, point count and expected grid coverage of a serpentine scan.
+
+    pan / tilt are (min, max, step). Coverage is the share of grid cells
+    inside the scan footprint that would get at least one sample if the
+    table were flat; max_spacing_cm is the widest gap between
+    neighbouring samples on the table.
+    """
+    model = model or calibrated_model()
+    route = serpentine(*pan, *tilt)
+    x0, y0, inside = _cells or _footprint_cells(pan[:2], tilt[:2], height_cm, cell)
+    ny, nx = inside.shape
+
+    pans = np.arange(pan[0], pan[1] + 1, pan[2], dtype=float)
+    tilts = np.arange(tilt[0], tilt[1] + 1, tilt[2], dtype=float)
+    P, T = np.meshgrid(pans, tilts)
+    gx, gy = ground_point(P, T, height_cm)
+    ix, iy, ok = heightmap.cell_index(gx.ravel(), gy.ravel(), x0, y0, cell, nx, ny)
+    hit = np.zeros_like(inside)
+    hit[iy[ok], ix[ok]] = True
+    total = int(inside.sum())
+    covered = int((hit & inside).sum())
+
+    gaps = [np.hypot(np.diff(gx, axis=a), np.diff(gy, axis=a)) for a in (0, 1)]
+    spacing = max((g.max() for g in gaps if g.size), default=0.0)
+
+    return {
+        "pan": list(pan), "tilt": list(tilt), "mode": mode,
+        "points": len(route),
+        "estimated_seconds": round(estimate(route, model, mode), 2),
+        "coverage": round(covered / total, 4) if total else 0.0,
+        "cells_covered": covered, "cells_total": total,
+        "max_spacing_cm": round(float(spacing), 2),
+    }
+
+
+def suggest(pan, tilt, budget_s, height_cm, cell, mode="step",
+            steps=(1, 2, 3, 4, 5, 6, 8, 10), model=None):
+    """Finest pan/tilt steps over pan=(min, max), tilt=(min, max) that fit
+    in budget_s: smallest sample spacing on the table, then most points."""
+    model = model or calibrated_model()
+    cells = _footprint_cells(pan, tilt, height_cm, cell)
+    options = [predict((pan[0], pan[1], ps), (tilt[0], tilt[1], ts), height_cm, cell,
+                       mode, model, cells)
+               for ps in steps for ts in steps]
+    fit = [o for o in options if o["estimated_seconds"] <= budget_s]
+    if not fit:
+        fastest = min(options, key=lambda o: o["estimated_seconds"])
+        return {"fits": False, "budget_s": budget_s, "best": fastest, "alternatives": []}
+    fit.sort(key=lambda o: (o["max_spacing_cm"], -o["points"]))
+    return {"fits": True, "budget_s": budget_s, "best": fit[0], "alternatives": fit[1:5],
+            "model": model.as_dict()}
@@ -0,0 +1,82 @@
+import gzip, struct
+import numpy as np
+from . import tiles
+
+try:
+    import zstandard
+except ImportError:     # optional, gzip is always available
+    zstandard = None
+
+# ---------------------------------------------------------
+# PAYLOAD FORMAT (little endian)
+# ---------------------------------------------------------
+# header (64 bytes):
+#   b"LPTS" | uint8 version | uint8 flags | uint16 reserved | uint32 count
+#   float32 min[3] | float32 step[3] | 28 bytes reserved
+# body:
+#   uint16 qx[count] | uint16 qy[count] | uint16 qz[count]   (planar)
+#   uint8 colour[count]                  (index into the LUT below)
+#   uint8 lut[256][3]                    (RGB)
+# position = min + q * step. With FLAG_DELTA each plane stores wrapping
+# uint16 differences from the previous point (points are sorted first).
+MAGIC = b"LPTS"
+VERSION = 1
+FLAG_DELTA = 1
+HEADER = struct.Struct("<4sBBHI3f3f28x")
+QMAX = 65535
+
+
+def quantize(xs, ys, zs):
+    pts = np.c_[xs, ys, zs].astype(float)
+    lo = pts.min(axis=0)
+    span = pts.max(axis=0) - lo
+    step = np.where(span > 0, span / QMAX, 1.0)
+    q = np.round((pts - lo) / step).astype(np.uint16)
+    return q, lo, step
+
+
+def encode(xs, ys, zs, delta=True, colour_by=None, lut=None):
+    """Pack a cloud into the binary payload described above (uncompressed).
+    `lut` is a tiles LUT (default Viridis)."""
+    q, lo, step = quantize(xs, ys, zs)
+    colour_by = np.asarray(zs if colour_by is None else colour_by, float)
+    vmin, vmax = colour_by.min(), colour_by.max()
+    colour = np.round((colour_by - vmin) / ((vmax - vmin) or 1.0) * 255).astype(np.uint8)
+
+    flags = 0
+    if delta:
+        # sort so neighbouring points are close and differences stay small
+        order = np.lexsort((q[:, 2], q[:, 0], q[:, 1]))
+        q = q[order]
+        colour = colour[order]
+        q = np.diff(q, axis=0, prepend=np.zeros((1, 3), np.uint16))
+        flags |= FLAG_DELTA
+
+    header = HEADER.pack(MAGIC, VERSION, flags, 0, len(q), *lo, *step)
+    planes = np.ascontiguousarray(q.T).astype("<u2").tobytes()
+    lut = tiles.LUT if lut is None else lut
+    return header + planes + colour.tobytes() + lut[:256, :3].tobytes()
+
+
+def decode(data):
+    """Inverse of encode(); returns (xs, ys, zs, colour index)."""
+    magic, version, flags, _, n, *rest = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a point payload")
+    lo = np.array(rest[:3])
+    step = np.array(rest[3:])
+    pos = HEADER.size
+    q = np.frombuffer(data, "<u2", 3 * n, pos).reshape(3, n).T
+    pos += 6 * n
+    colour = np.frombuffer(data, np.uint8, n, pos)
+    if flags & FLAG_DELTA:
+        q = np.cumsum(q, axis=0, dtype=np.uint16)
+    pts = lo + q * step
+    return pts[:, 0], pts[:, 1], pts[:, 2], colour
+
+
+def compress(payload, accept_encoding=""):
+    """Return (body, content-encoding) using zstd when the client takes it."""
+    if zstandard is not None and "zstd" in accept_encoding:
+        return zstandard.ZstdCompressor(level=9).compress(payload), "zstd"
+    return gzip.compress(payload, 6), "gzip"
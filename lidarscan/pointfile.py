@@ -0,0 +1,112 @@
+import os, json, struct
+import numpy as np
+
+# ---------------------------------------------------------
+# POINT FILE FORMAT
+# ---------------------------------------------------------
+# header : b"LPTF" + version byte + uint32 length + JSON metadata,
+#          zero-padded to a multiple of 16 bytes
+# body   : x y z (little-endian float32) per point, nothing else
+#
+# The body is a plain (n, 3) array, so a file of any size opens as a
+# read-only np.memmap and is processed chunk by chunk (streaming.py)
+# without ever being loaded. The point count follows from the file size;
+# a writer that died mid-record leaves a file that still opens. (b"LPTS"
+# is pointcodec's web payload; the two must never be mistaken for each other.)
+MAGIC = b"LPTF\x01"
+LEN32 = struct.Struct("<I")
+DTYPE = np.dtype("<f4")
+RECORD = 3 * DTYPE.itemsize
+ALIGN = 16
+
+CHUNK_POINTS = 1_000_000    # points per chunk: 12 MB on disk, ~24 MB as float64
+EXTENSION = ".pts"
+
+
+# ---------------------------------------------------------
+# WRITER
+# ---------------------------------------------------------
+class PointWriter:
+    """Append-only point file; feed it arrays of any length."""
+
+    def __init__(self, path, meta=None):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.count = 0
+        self.f = open(path, "wb", buffering=1 << 20)
+        body = json.dumps(meta or {}).encode()
+        head = MAGIC + LEN32.pack(len(body)) + body
+        self.f.write(head + b"\0" * (-len(head) % ALIGN))
+
+    def append(self, xs, ys, zs):
+        block = np.empty((len(xs), 3), DTYPE)
+        block[:, 0] = xs
+        block[:, 1] = ys
+        block[:, 2] = zs
+        self.f.write(block.tobytes())
+        self.count += len(block)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------
+# READER
+# ---------------------------------------------------------
+def read_header(path):
+    """(meta, byte offset of the first point)."""
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC) + LEN32.size)
+        if not head.startswith(MAGIC):
+            raise ValueError(f"{path}: not a point file")
+        n, = LEN32.unpack_from(head, len(MAGIC))
+        meta = json.loads(f.read(n))
+    size = len(MAGIC) + LEN32.size + n
+    return meta, size + (-size % ALIGN)
+
+
+def open_points(path):
+    """(meta, points) with points a read-only (n, 3) float32 memmap."""
+    meta, offset = read_header(path)
+    n = (os.path.getsize(path) - offset) // RECORD
+    if n == 0:
+        return meta, np.empty((0, 3), DTYPE)
+    return meta, np.memmap(path, DTYPE, "r", offset, (n, 3))
+
+
+def chunks(points, size=CHUNK_POINTS):
+    """(xs, ys, zs) float64 copies of successive slices of points; only
+    one slice is resident at a time."""
+    for start in range(0, len(points), size):
+        block = np.asarray(points[start:start + size], float)
+        yield block[:, 0], block[:, 1], block[:, 2]
+
+
+# ---------------------------------------------------------
+# CONVERSION
+# ---------------------------------------------------------
+def from_csv(csv_path, path, chunk=CHUNK_POINTS):
+    """Stream an x,y,z CSV (scan_points.csv, batch points.csv) into a
+    point file; returns the point count."""
+    import pandas as pd
+    with PointWriter(path, {"source": os.path.basename(csv_path)}) as w:
+        for df in pd.read_csv(csv_path, usecols=["x", "y", "z"], chunksize=chunk):
+            w.append(df["x"].to_numpy(float), df["y"].to_numpy(float), df["z"].to_numpy(float))
+    return w.count
+
+
+def save(path, xs, ys, zs, meta=None, chunk=CHUNK_POINTS):
+    """Write in-memory arrays (e.g. a merged multi-head cloud) to a point file."""
+    with PointWriter(path, meta) as w:
+        for start in range(0, len(xs), chunk):
+            end = start + chunk
+            w.append(xs[start:end], ys[start:end], zs[start:end])
+    return w.count
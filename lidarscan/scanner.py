@@ -0,0 +1,589 @@
+import os, time, math, numpy as np, pandas as pd
+import plotly.graph_objects as go
+import plotly.express as px
+from . import metrics
+from . import session
+from . import checkpoint
+from . import planner
+from . import outliers
+from . import accumulator
+from . import backlash
+from . import spatial
+from . import livebuffer
+from . import heightmap
+from . import mesh
+from . import tfmini
+
+try:
+    import serial, pigpio
+except ImportError:     # workstation: replay / offline processing only
+    serial = pigpio = None
+
+# ---------------------------------------------------------
+# HARDWARE SETTINGS
+# ---------------------------------------------------------
+UART_PORT = "/dev/ttyS0"
+UART_BAUD = 115200
+
+PAN_PIN = 13     # <-- Pan servo here
+TILT_PIN = 18    # <-- Tilt servo here
+
+HEIGHT_CM = 70   # Height of LiDAR from table
+
+SMOOTH = True           # ramp servos in small increments
+SERVO_STEP_US = 8       # smooth-move increment (pulse width)
+SERVO_STEP_S = 0.003    # delay between increments
+SETTLE_S = 0.04         # wait after the final pulse before reading
+BACKLASH_MOTION = True    # pre-compensate direction-dependent servo error (backlash.py)
+BACKLASH_PROJECT = True   # project with the modelled shaft angle
+BACKLASH_TABLE = None     # corrections in use; None = the rig's backlash.FILE, {} = none
+
+PAN_MIN, PAN_MAX, PAN_STEP = -35, 35, 1
+TILT_MIN, TILT_MAX, TILT_STEP = -15, 15, 1
+
+GRID_SIZE = 2.0         # Size of grid cells in cm
+BUILDING_THRESHOLD = 5  # cm above ground to consider “walls”
+FILTER_OUTLIERS = True  # drop spurious returns before gridding (outliers.py)
+CALIBRATE = True        # feed this rig's timings to planner's calibration file
+STL_NAME = "scan_mesh.stl"
+STL_WALLS = False         # close building cells with vertical walls in the STL
+STL_MESH = "grid"         # "grid": heightmap cells, "delaunay": triangles through the samples
+TIN_MAX_EDGE = None       # cm, longest edge a delaunay triangle keeps; None = 4 x median edge
+SHARED_LIVE = True        # publish samples to shared memory for local readers (livebuffer.py)
+SESSION_DIR = "sessions"  # raw recordings for replay (session.py)
+SCAN_DIR = "scans"        # per-job checkpoints (checkpoint.py)
+
+# ---------------------------------------------------------
+# STATUS FLAGS FOR WEB APP
+# ---------------------------------------------------------
+is_scanning = False
+scan_progress = 0
+job_id = None
+live_map = None     # accumulator.HeightAccumulator fed during the scan
+
+# ---------------------------------------------------------
+# START pigpio + UART
+# ---------------------------------------------------------
+# pi / ser / sleep are module globals so a replay backend can swap them
+pi = None
+ser = None
+sleep = time.sleep
+sensor = None       # tfmini.configure report from open_hardware()
+
+def open_hardware():
+    """Connect pigpio and the UART on first use, so importing this module
+    (offline processing, batch.py) never touches the hardware."""
+    global pi, ser, sensor
+    if pigpio is None or pi is not None:
+        return
+    pi = pigpio.pi()
+    pi.set_mode(PAN_PIN, pigpio.OUTPUT)
+    pi.set_mode(TILT_PIN, pigpio.OUTPUT)
+
+    ser = serial.Serial(UART_PORT, UART_BAUD, timeout=0.2)
+    # run_scan reads one frame per pose, like the engine's "step" mode
+    sensor = configure_sensor(ser, planner.SCAN_MODES["step"]["frame_rate"])
+
+
+def configure_sensor(port, hz):
+    """Ask the sensor on `port` for `hz` frames/s, first raising the UART
+    baud if the current one can't carry them. Returns tfmini.configure's
+    report; a refused step leaves the sensor as it was."""
+    need = next((b for b in tfmini.BAUD_RATES if tfmini.max_frame_rate(b) >= hz),
+                tfmini.BAUD_RATES[-1])
+    return tfmini.configure(port, frame_rate=hz, baud=max(need, port.baudrate))
+
+# ---------------------------------------------------------
+# SERVO HELPERS
+# ---------------------------------------------------------
+def pulse(angle):
+    """Convert angle (-90..90) to pulse width."""
+    return int(500 + (angle + 90) * 2000 / 180)
+
+def pulse_to_angle(width):
+    return (width - 500) * 180 / 2000 - 90
+
+def ramp(current, target, step=None):
+    """Intermediate pulse widths of a smooth move (target excluded)."""
+    step = SERVO_STEP_US if step is None else step
+    while abs(current - target) > step:
+        current += step if target > current else -step
+        yield current
+
+_backlash_file = None
+_servo_state = {}   # (id(gpio), pin) -> (last requested angle, direction, width sent)
+
+def backlash_table():
+    """The correction table in effect: BACKLASH_TABLE, else the rig's file."""
+    global _backlash_file
+    if BACKLASH_TABLE is not None:
+        return BACKLASH_TABLE
+    if _backlash_file is None:
+        _backlash_file = backlash.load()
+    return _backlash_file
+
+def servo_target(gpio, pin, angle, axis=None):
+    """(pulse width, settle seconds, modelled shaft angle) for a move to `angle`.
+
+    The direction of approach selects the correction: BACKLASH_MOTION
+    shifts the command so the shaft stops at `angle` and uses the
+    calibrated settle time, BACKLASH_PROJECT reports where the model
+    says the shaft ends up, which is the angle to project with.
+    """
+    axis = axis or ("tilt" if pin == TILT_PIN else "pan")
+    current = gpio.get_servo_pulsewidth(pin)
+    key = (id(gpio), pin)
+    last, direction, sent = _servo_state.get(key, (None, 1, None))
+    if sent != current:     # homed or moved elsewhere: start afresh
+        last = pulse_to_angle(current) if 500 <= current <= 2500 else None
+        direction = 1
+    if last is not None and angle != last:
+        direction = 1 if angle > last else -1
+
+    table = backlash_table()
+    cmd, settle = angle, SETTLE_S
+    if BACKLASH_MOTION and table:
+        cmd = float(backlash.command(table, axis, angle, direction))
+        settle = backlash.settle(table, axis, direction, SETTLE_S)
+    width = pulse(cmd)
+    _servo_state[key] = (angle, direction, width)
+    at = angle
+    if BACKLASH_PROJECT and table:
+        at = float(backlash.actual(table, axis, cmd, direction))
+    return width, settle, at
+
+def move(pin, angle, smooth=None, gpio=None, axis=None):
+    """Drive a servo to `angle` and return the angle to project with;
+    `gpio` defaults to the module's pigpio handle."""
+    gpio = pi if gpio is None else gpio
+    smooth = SMOOTH if smooth is None else smooth
+    target, settle, at = servo_target(gpio, pin, angle, axis)
+    current = gpio.get_servo_pulsewidth(pin)
+
+    # If servo is uninitialized
+    if current < 500 or current > 2500:
+        current = target
+
+    metrics.count("scanner_servo_degrees_total", abs(target - current) * 180 / 2000)
+    t0 = metrics.now()
+    if smooth:
+        for width in ramp(current, target):
+            gpio.set_servo_pulsewidth(pin, width)
+            sleep(SERVO_STEP_S)
+    t1 = metrics.now()
+    gpio.set_servo_pulsewidth(pin, target)
+    sleep(settle)
+    metrics.observe("scanner_servo_smooth_seconds", t1 - t0)
+    metrics.observe("scanner_servo_settle_seconds", metrics.now() - t1)
+    return at
+
+def project(pan, tilt, dist, height=None):
+    """One LiDAR sample -> (x, y, z) in the scan frame (z up from the table)."""
+    height = HEIGHT_CM if height is None else height
+    a = math.radians(pan)
+    b = math.radians(tilt)
+    return (dist * math.cos(b) * math.sin(a),
+            dist * math.sin(b),
+            height - dist * math.cos(a) * math.cos(b))
+
+# ---------------------------------------------------------
+# LIDAR READER (with buffer flush)
+# ---------------------------------------------------------
+def read_lidar(port=None):
+    port = ser if port is None else port
+    port.reset_input_buffer()
+    while True:
+        if port.read() == b'Y' and port.read() == b'Y':
+            data = port.read(7)
+            if len(data) == 7:
+                dist = data[0] + data[1]*256
+                return dist
+
+# ---------------------------------------------------------
+# MAIN SCAN ROUTINE
+# ---------------------------------------------------------
+def claim_job(base=None, numbered=False):
+    """A job id whose SCAN_DIR folder this call created: `base` (default:
+    the time to the second), else base-2, base-3, ... (base-1, base-2, ...
+    if `numbered`). Scans starting within the same second - a replay,
+    the engine, a multi-head run - never share and truncate one job."""
+    base = base or time.strftime("%Y%m%d-%H%M%S")
+    os.makedirs(SCAN_DIR, exist_ok=True)
+    n = 1
+    while True:
+        job = "%s-%d" % (base, n) if numbered or n > 1 else base
+        try:
+            os.mkdir(os.path.join(SCAN_DIR, job))
+            return job
+        except FileExistsError:
+            n += 1
+
+
+def calibrate(gpio=None):
+    """After a scan: add its timings to the rig's calibration file - unless
+    CALIBRATE is off or they came from a simulated or replayed rig, whose
+    servos and sensor say nothing about this one."""
+    if CALIBRATE and not getattr(gpio or pi, "simulated", False):
+        planner.save_calibration()
+    else:
+        planner.discard_calibration()
+
+
+def run_scan(record=False, resume=None, poses=None, process=True, job=None, out_dir=None):
+    """Full serpentine scan, or the (pan, tilt) route in `poses`.
+
+    record=True also writes a raw session file; resume=<job id> continues
+    an interrupted job from its last completed tilt row. process=False
+    skips CSV/plot/STL output. `job` is an id from claim_job() (default:
+    a new one); `out_dir` takes the CSV and STL instead of the working
+    directory. Returns the (xs, ys, zs) point lists.
+
+    A resumed job runs with the settings in its checkpoint (pins, ranges,
+    grid, ...); scanner's own are back in place when it returns.
+    """
+    if resume is None:
+        return _scan(record, poses, process, job, out_dir)
+    resumed = checkpoint.load(checkpoint.path_for(SCAN_DIR, resume))
+    meta = resumed[0]
+    saved = {k: globals()[k] for k in session.META_KEYS}
+    globals().update({k: meta[k] for k in session.META_KEYS if k in meta})
+    try:
+        return _scan(record, meta.get("poses"), process, resume, out_dir, resumed)
+    finally:
+        globals().update(saved)
+
+
+def _scan(record, poses, process, job, out_dir, resumed=None):
+    """run_scan with the settings in place; `resumed` is the loaded
+    checkpoint of job when continuing one."""
+    global is_scanning, scan_progress, job_id, pi, ser, live_map
+    open_hardware()
+    is_scanning = True
+    scan_progress = 0
+
+    xs, ys, zs = [], [], []
+    done_rows = 0
+    if resumed is not None:
+        job_id = job
+        ckpt_path = checkpoint.path_for(SCAN_DIR, job_id)
+        meta, samples, finished, end = resumed
+        for _, _, _, x, y, z in samples:
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+        done_rows = len(finished)
+        log = checkpoint.CheckpointLog(ckpt_path, append_at=end)
+    else:
+        job_id = job or claim_job()
+        meta = {k: globals()[k] for k in session.META_KEYS}
+        meta["BACKLASH_TABLE"] = backlash_table()
+        meta["poses"] = poses
+        log = checkpoint.CheckpointLog(checkpoint.path_for(SCAN_DIR, job_id), meta)
+    metrics.begin_job(job_id)
+
+    if poses is None:
+        poses = planner.serpentine(PAN_MIN, PAN_MAX, PAN_STEP, TILT_MIN, TILT_MAX, TILT_STEP)
+    rows = planner.split_rows(poses)
+
+    # pre-size the live heightmap to where the route will hit the table
+    live_map = accumulator.HeightAccumulator(GRID_SIZE, planner.route_bounds(poses, HEIGHT_CM))
+    live_map.add_many(xs, ys, zs)
+    shared = livebuffer.publish(job_id, len(poses), xs, ys, zs) if SHARED_LIVE else None
+
+    recorder = None
+    if record:
+        recorder = session.Recorder(os.path.join(SESSION_DIR, job_id + ".lses"), meta)
+        pi = session.RecordingPi(pi, recorder)
+        ser = session.RecordingSerial(ser, recorder)
+
+    with metrics.stage("home"):
+        pi.set_servo_pulsewidth(PAN_PIN, 1500)
+        pi.set_servo_pulsewidth(TILT_PIN, 1500)
+        sleep(0.3)
+
+    total_moves = len(poses)
+    done = len(xs)
+
+    t_scan = metrics.now()
+    try:
+        for tilt, sweep in rows[done_rows:]:
+            t0 = metrics.now()
+            tilt_at = move(TILT_PIN, tilt)
+            metrics.observe("scanner_pose_move_seconds", metrics.now() - t0, axis="tilt")
+
+            for pan in sweep:
+                t0 = metrics.now()
+                pan_at = move(PAN_PIN, pan)
+                t1 = metrics.now()
+                dist = read_lidar()
+                t2 = metrics.now()
+                metrics.observe("scanner_pose_move_seconds", t1 - t0, axis="pan")
+                metrics.observe("scanner_sensor_wait_seconds", t2 - t1)
+                metrics.count_pose()
+
+                x, y, z = project(pan_at, tilt_at, dist)
+                xs.append(x)
+                ys.append(y)
+                zs.append(z)
+                log.append(tilt, pan, dist, x, y, z)
+                live_map.add(x, y, z)
+                if shared is not None:
+                    shared.append(x, y, z)
+
+                done += 1
+                scan_progress = int((done / total_moves) * 100)
+
+            log.row_done(tilt)
+    except BaseException:
+        is_scanning = False
+        if shared is not None:
+            shared.finish(failed=True)
+        metrics.end_job()
+        raise
+    finally:
+        log.close()
+        # Stop servos
+        pi.set_servo_pulsewidth(PAN_PIN, 0)
+        pi.set_servo_pulsewidth(TILT_PIN, 0)
+        if recorder is not None:
+            recorder.close()
+            pi, ser = pi._pi, ser._ser
+    metrics.record_stage("acquire", metrics.now() - t_scan)
+    calibrate()
+
+    if process:
+        process_scan(xs, ys, zs, live_map, out_dir=out_dir)
+
+    metrics.end_job()
+    is_scanning = False
+    scan_progress = 100
+    if shared is not None:
+        shared.finish()
+    return xs, ys, zs
+
+
+def process_scan(xs, ys, zs, acc=None, job=None, out_dir=None):
+    """CSV, plots, STL and spatial index for a finished point cloud.
+
+    `acc` is the HeightAccumulator filled during acquisition with these
+    same points; the samples outlier filtering rejects are taken back out
+    of it and its grid is used, so the cloud is not gridded again. The
+    index goes to SCAN_DIR/<job>/index
+    (job defaults to job_id), the CSV and STL to `out_dir` (default: the
+    working directory).
+    """
+    out_dir = out_dir or ""
+    # Save CSV
+    with metrics.stage("csv"):
+        df = pd.DataFrame({"x": xs, "y": ys, "z": zs})
+        df.to_csv(os.path.join(out_dir, "scan_points.csv"), index=False)
+
+    # Raw points stay in the CSV, everything gridded uses the filtered cloud
+    xs, ys, zs = (np.asarray(a, float) for a in (xs, ys, zs))
+    keep = np.ones(len(xs), bool)
+    if FILTER_OUTLIERS:
+        with metrics.stage("outliers"):
+            keep = outliers.outlier_mask(xs, ys, zs)
+    raw = xs, ys, zs
+    xs, ys, zs = xs[keep], ys[keep], zs[keep]
+
+    if acc is not None:
+        with metrics.stage("grid_online"):
+            acc.drop(*raw, keep)
+            grid_info = acc.grid()
+    else:
+        grid_info = build_grid(xs, ys, zs)
+
+    # Make visualization helpers
+    prepare_3d_plot(xs, ys, zs)
+    prepare_2d_map(xs, ys, zs, grid_info)
+    save_stl(xs, ys, zs, grid_info, os.path.join(out_dir, STL_NAME))
+
+    job = job or job_id
+    if job is not None:
+        with metrics.stage("index"):
+            spatial.build(spatial.index_dir(SCAN_DIR, job), xs, ys, zs, grid_info, job)
+
+
+# ---------------------------------------------------------
+# 3D PLOT GENERATOR
+# ---------------------------------------------------------
+last_3d_html = "<h2>No scan yet</h2>"
+last_points = None  # (xs, ys, zs) arrays of the last processed cloud
+
+def prepare_3d_plot(xs, ys, zs):
+    global last_3d_html, last_points
+    last_points = (np.asarray(xs, float), np.asarray(ys, float), np.asarray(zs, float))
+    # the plotly page is only built if someone asks for it (pointcodec.py
+    # feeds the normal 3D view)
+    last_3d_html = None
+
+def figure_3d(xs, ys, zs):
+    fig = go.Figure(data=[go.Scatter3d(
+        x=xs, y=ys, z=zs,
+        mode='markers',
+        marker=dict(size=3, color=zs, colorscale="Viridis")
+    )])
+    fig.update_layout(width=900, height=700, title="3D LiDAR Scan")
+    return fig
+
+def get_3d_html():
+    global last_3d_html
+    if last_3d_html is None:
+        with metrics.stage("plot3d_build"):
+            fig = figure_3d(*last_points)
+        with metrics.stage("plot3d_serialize"):
+            last_3d_html = fig.to_html(full_html=False)
+    return last_3d_html
+
+
+# ---------------------------------------------------------
+# 2D HEATMAP
+# ---------------------------------------------------------
+last_2d_html = "<h2>No scan yet</h2>"
+last_grid = None    # {"grid", "x0", "y0", "cell"} of the last heightmap
+
+def build_grid(xs, ys, zs, stage="grid"):
+    """Ground-flattened max-height grid: {"grid", "x0", "y0", "cell"}."""
+    xs_arr = np.asarray(xs, float)
+    ys_arr = np.asarray(ys, float)
+    zs_arr = np.asarray(zs, float)
+
+    # Remove ground
+    t0 = metrics.now()
+    zf = heightmap.flatten(xs_arr, ys_arr, zs_arr, heightmap.fit_ground(xs_arr, ys_arr, zs_arr))
+    metrics.record_stage(stage + "_fit", metrics.now() - t0)
+
+    # Grid
+    t0 = metrics.now()
+    x_min, y_min, nx, ny = heightmap.grid_shape(xs_arr, ys_arr, GRID_SIZE)
+    grid = heightmap.max_grid(xs_arr, ys_arr, zf, x_min, y_min, GRID_SIZE, nx, ny)
+    metrics.record_stage(stage + "_grid", metrics.now() - t0)
+    return {"grid": grid, "x0": x_min, "y0": y_min, "cell": GRID_SIZE}
+
+def prepare_2d_map(xs, ys, zs, grid_info=None):
+    global last_2d_html, last_grid
+
+    if grid_info is None:
+        grid_info = build_grid(xs, ys, zs, "map2d")
+    last_grid = grid_info
+    # the plotly page is only built if someone asks for it (tiles.py
+    # serves the normal 2D view)
+    last_2d_html = None
+
+def figure_2d(grid_info):
+    return px.imshow(
+        grid_info["grid"],
+        origin="lower",
+        color_continuous_scale="Viridis",
+        title="Top-Down Heightmap"
+    )
+
+def get_2d_html():
+    global last_2d_html
+    if last_2d_html is None:
+        with metrics.stage("map2d_serialize"):
+            last_2d_html = figure_2d(last_grid).to_html(full_html=False)
+    return last_2d_html
+
+
+# ---------------------------------------------------------
+# STL EXPORT
+# ---------------------------------------------------------
+def save_stl(xs, ys, zs, grid_info=None, path=None, mode=None):
+    if (mode or STL_MESH) == "delaunay":
+        return save_tin(xs, ys, zs, path)
+    if grid_info is None:
+        grid_info = build_grid(xs, ys, zs, "stl")
+    grid = grid_info["grid"]
+    x_min, y_min, cell = grid_info["x0"], grid_info["y0"], grid_info["cell"]
+    ny, nx = grid.shape
+
+    # Save STL
+    t0 = metrics.now()
+    with open(path or STL_NAME, "w") as f:
+        f.write("solid scan\n")
+
+        def tri(a, b, c):
+            f.write(" facet normal 0 0 1\n")
+            f.write("  outer loop\n")
+            f.write(f"   vertex {a[0]} {a[1]} {a[2]}\n")
+            f.write(f"   vertex {b[0]} {b[1]} {b[2]}\n")
+            f.write(f"   vertex {c[0]} {c[1]} {c[2]}\n")
+            f.write("  endloop\n")
+            f.write(" endfacet\n")
+
+        # Top surface
+        for j in range(ny - 1):
+            for i in range(nx - 1):
+                h00 = grid[j, i]
+                h10 = grid[j, i+1]
+                h01 = grid[j+1, i]
+                h11 = grid[j+1, i+1]
+                if np.isnan(h00) or np.isnan(h10) or np.isnan(h01) or np.isnan(h11):
+                    continue
+
+                x0 = x_min + i * cell
+                x1 = x_min + (i+1) * cell
+                y0 = y_min + j * cell
+                y1 = y_min + (j+1) * cell
+
+                v1 = (x0, y0, h00)
+                v2 = (x1, y0, h10)
+                v3 = (x0, y1, h01)
+                v4 = (x1, y1, h11)
+
+                tri(v1, v2, v3)
+                tri(v2, v4, v3)
+
+        if STL_WALLS:
+            write_walls(tri, grid, x_min, y_min, cell, BUILDING_THRESHOLD)
+
+        f.write("endsolid scan\n")
+    metrics.record_stage("stl_write", metrics.now() - t0)
+
+
+def save_tin(xs, ys, zs, path=None, max_edge=None):
+    """Binary STL of the Delaunay surface through the ground-flattened
+    samples (STL_MESH = "delaunay"). No walls: triangles between roof and
+    ground samples already close the sides."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    t0 = metrics.now()
+    zf = heightmap.flatten(xs, ys, zs, heightmap.fit_ground(xs, ys, zs))
+    with mesh.StlWriter(path or STL_NAME) as w:
+        mesh.write_tin(w, xs, ys, zf, TIN_MAX_EDGE if max_edge is None else max_edge)
+    metrics.record_stage("stl_write", metrics.now() - t0)
+
+
+def write_walls(tri, grid, x_min, y_min, cell, thresh, z0=0.0):
+    """Vertical walls (down to z0) on every side of a building cell
+    whose neighbour is not a building (from utlimate_v2.py)."""
+    ny, nx = grid.shape
+    with np.errstate(invalid="ignore"):
+        mask = grid > thresh
+
+    def empty(j, i):
+        return j < 0 or j >= ny or i < 0 or i >= nx or not mask[j, i]
+
+    for j in range(ny):
+        for i in range(nx):
+            if not mask[j, i]:
+                continue
+            h = grid[j, i]
+            xl, xr = x_min + i * cell, x_min + (i+1) * cell
+            yb, yt = y_min + j * cell, y_min + (j+1) * cell
+
+            if empty(j, i-1):
+                tri((xl, yb, z0), (xl, yb, h), (xl, yt, z0))
+                tri((xl, yb, h), (xl, yt, h), (xl, yt, z0))
+            if empty(j, i+1):
+                tri((xr, yt, z0), (xr, yb, h), (xr, yb, z0))
+                tri((xr, yt, z0), (xr, yt, h), (xr, yb, h))
+            if empty(j-1, i):
+                tri((xl, yb, z0), (xl, yb, h), (xr, yb, z0))
+                tri((xl, yb, h), (xr, yb, h), (xr, yb, z0))
+            if empty(j+1, i):
+                tri((xr, yt, z0), (xl, yt, h), (xl, yt, z0))
+                tri((xr, yt, z0), (xr, yt, h), (xl, yt, h))
@@ -0,0 +1,333 @@
+import os, sys, json, time, struct
+
+# ---------------------------------------------------------
+# SESSION FILE FORMAT
+# ---------------------------------------------------------
+# header : b"LSES" + version byte
+# record : kind (1 byte) + t_ns (uint64, monotonic since start) + payload
+#   b"M"  meta     uint32 length + JSON scan settings
+#   b"R"  read     uint16 length + raw serial bytes handed to the parser
+#   b"F"  flush    (reset_input_buffer)
+#   b"W"  write    uint16 length + raw bytes sent to the sensor
+#   b"S"  servo    uint8 pin + uint16 pulse width
+MAGIC = b"LSES\x01"
+REC = struct.Struct("<cQ")
+LEN16 = struct.Struct("<H")
+LEN32 = struct.Struct("<I")
+SERVO = struct.Struct("<BH")
+
+# Settings captured in the meta record and restored on replay
+META_KEYS = ("HEIGHT_CM", "PAN_PIN", "TILT_PIN",
+             "PAN_MIN", "PAN_MAX", "PAN_STEP",
+             "TILT_MIN", "TILT_MAX", "TILT_STEP", "GRID_SIZE",
+             "SMOOTH", "SERVO_STEP_US", "SERVO_STEP_S", "SETTLE_S",
+             "BACKLASH_MOTION", "BACKLASH_PROJECT", "BACKLASH_TABLE")
+
+
+# ---------------------------------------------------------
+# RECORDING
+# ---------------------------------------------------------
+class Recorder:
+    """Append-only binary session writer.
+
+    Consecutive serial reads are coalesced into one record so the
+    byte-at-a-time header hunt does not bloat the file.
+    """
+
+    def __init__(self, path, meta=None):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.f = open(path, "wb", buffering=64 * 1024)
+        self.f.write(MAGIC)
+        self.t0 = time.monotonic_ns()
+        self._pending = bytearray()
+        self._pending_t = 0
+        if meta is not None:
+            body = json.dumps(meta).encode()
+            self._write(b"M", LEN32.pack(len(body)) + body)
+
+    def _write(self, kind, payload=b""):
+        self._flush_reads()
+        self.f.write(REC.pack(kind, time.monotonic_ns() - self.t0))
+        self.f.write(payload)
+
+    def _flush_reads(self):
+        if not self._pending:
+            return
+        data = bytes(self._pending)
+        self._pending.clear()
+        self.f.write(REC.pack(b"R", self._pending_t))
+        self.f.write(LEN16.pack(len(data)) + data)
+
+    def read(self, data):
+        if not self._pending:           # stamped when the first bytes arrived
+            self._pending_t = time.monotonic_ns() - self.t0
+        self._pending += data
+        if len(self._pending) >= 4096:
+            self._flush_reads()
+
+    def flush(self):
+        self._write(b"F")
+
+    def write(self, data):
+        self._write(b"W", LEN16.pack(len(data)) + bytes(data))
+
+    def servo(self, pin, width):
+        self._write(b"S", SERVO.pack(pin, int(width)))
+
+    def close(self):
+        self._flush_reads()
+        self.f.close()
+
+
+class RecordingSerial:
+    """Wraps a serial.Serial and logs everything the parser sees."""
+
+    def __init__(self, ser, recorder):
+        self._ser = ser
+        self._rec = recorder
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        self._rec.read(data)
+        return data
+
+    def reset_input_buffer(self):
+        self._ser.reset_input_buffer()
+        self._rec.flush()
+
+    def write(self, data):
+        self._rec.write(data)
+        return self._ser.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+
+class RecordingPi:
+    """Wraps a pigpio.pi and logs every servo command."""
+
+    def __init__(self, pi, recorder):
+        self._pi = pi
+        self._rec = recorder
+
+    def set_servo_pulsewidth(self, pin, width):
+        self._rec.servo(pin, width)
+        return self._pi.set_servo_pulsewidth(pin, width)
+
+    def __getattr__(self, name):
+        return getattr(self._pi, name)
+
+
+# ---------------------------------------------------------
+# READING
+# ---------------------------------------------------------
+def read_records(path):
+    """Yield (kind, t_ns, payload) tuples from a session file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: not a session file")
+
+    pos = len(MAGIC)
+    end = len(data)
+    while pos < end:
+        kind, t = REC.unpack_from(data, pos)
+        pos += REC.size
+        if kind in (b"R", b"W"):
+            n, = LEN16.unpack_from(data, pos)
+            pos += LEN16.size
+            payload = data[pos:pos + n]
+            pos += n
+        elif kind == b"M":
+            n, = LEN32.unpack_from(data, pos)
+            pos += LEN32.size
+            payload = json.loads(data[pos:pos + n])
+            pos += n
+        elif kind == b"S":
+            payload = SERVO.unpack_from(data, pos)
+            pos += SERVO.size
+        else:
+            payload = None
+        yield kind, t, payload
+
+
+# ---------------------------------------------------------
+# REPLAY BACKEND
+# ---------------------------------------------------------
+class ReplayClock:
+    """Replaces time.sleep: real sleeps at recorded speed, none when fast."""
+
+    def __init__(self, realtime):
+        self.realtime = realtime
+        self.t0 = time.monotonic_ns()
+
+    def sleep(self, seconds):
+        if self.realtime:
+            time.sleep(seconds)
+
+    def wait_until(self, t_ns):
+        if not self.realtime:
+            return
+        ahead = t_ns - (time.monotonic_ns() - self.t0)
+        if ahead > 0:
+            time.sleep(ahead / 1e9)
+
+
+class ReplayExhausted(EOFError):
+    """The parser asked for more sensor data than the session recorded."""
+
+
+class ReplaySerial:
+    """Serves recorded bytes back to the parser.
+
+    The stream is split into segments at every recorded flush. Reads
+    consume bytes from the current segment (a short read acts like a
+    timeout), and reset_input_buffer() jumps to the next segment, so a
+    modified parser still sees the same sensor data per pose. A read
+    from a used-up segment raises ReplayExhausted: the real sensor never
+    stops talking, so a parser looping on reads would spin forever.
+    """
+
+    def __init__(self, segments, clock):
+        self.segments = segments      # list of [(t_ns, bytes), ...]
+        self.clock = clock
+        self.index = -1
+        self.written = []
+        self.exhausted = 0            # reads past the end of a segment
+        self.reset_input_buffer()
+
+    def reset_input_buffer(self):
+        self.index += 1
+        self.buf = b""
+        self.chunks = list(self.segments[self.index]) if self.index < len(self.segments) else []
+        self.chunks.reverse()
+
+    def read(self, size=1):
+        while len(self.buf) < size and self.chunks:
+            t, data = self.chunks.pop()
+            self.clock.wait_until(t)
+            self.buf += data
+        if size and not self.buf:
+            self.exhausted += 1
+            raise ReplayExhausted(f"segment {self.index}: no recorded data left")
+        out, self.buf = self.buf[:size], self.buf[size:]
+        return out
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class ReplayPi:
+    """Stand-in for pigpio.pi that logs commands for comparison."""
+
+    connected = True
+    simulated = True        # replayed timings say nothing about the rig
+
+    def __init__(self):
+        self.widths = {}
+        self.commands = []
+
+    def set_mode(self, pin, mode):
+        pass
+
+    def set_servo_pulsewidth(self, pin, width):
+        self.widths[pin] = width
+        self.commands.append((pin, int(width)))
+
+    def get_servo_pulsewidth(self, pin):
+        return self.widths.get(pin, 0)
+
+    def stop(self):
+        pass
+
+
+def load(path):
+    """Split a session file into (meta, serial segments, servo commands)."""
+    meta = {}
+    segments = [[]]       # bytes read before the first flush go to segment 0
+    servo = []
+    t = 0
+    for kind, t, payload in read_records(path):
+        if kind == b"M":
+            meta = payload
+        elif kind == b"R":
+            segments[-1].append((t, payload))
+        elif kind == b"F":
+            segments.append([])
+        elif kind == b"S":
+            servo.append(payload)
+    meta["duration_s"] = t / 1e9
+    return meta, segments, servo
+
+
+def replay(path, realtime=False):
+    """Run scanner.run_scan() against a recorded session.
+
+    The replay is its own job, <recorded job>-replay-<n>, and writes its
+    checkpoint, index, CSV and STL under SCAN_DIR/<that job>: the
+    recorded scan's results are never touched.
+
+    Returns a small report; servo_mismatches counts commands that differ
+    from the recording (non-zero means the scan loop changed behaviour),
+    and exhausted_reads the reads that ran out of recorded data - the
+    replay stops at the first, with its message in "error".
+    """
+    from . import scanner
+
+    meta, segments, servo = load(path)
+    clock = ReplayClock(realtime)
+    fake_pi = ReplayPi()
+
+    saved = {k: getattr(scanner, k) for k in META_KEYS}
+    saved_hw = scanner.pi, scanner.ser, scanner.sleep
+    for k in META_KEYS:
+        if k in meta:
+            setattr(scanner, k, meta[k])
+    if "BACKLASH_TABLE" not in meta:
+        scanner.BACKLASH_TABLE = {}     # recorded before corrections existed
+    scanner.pi = fake_pi
+    scanner.ser = port = ReplaySerial(segments, clock)
+    scanner.sleep = clock.sleep
+
+    recorded = os.path.splitext(os.path.basename(path))[0]
+    job = scanner.claim_job(recorded + "-replay", numbered=True)
+    t0 = time.perf_counter()
+    error = None
+    try:
+        scanner.run_scan(poses=meta.get("poses"), job=job,
+                         out_dir=os.path.join(scanner.SCAN_DIR, job))
+    except ReplayExhausted as e:
+        error = str(e)
+    finally:
+        for k, v in saved.items():
+            setattr(scanner, k, v)
+        scanner.pi, scanner.ser, scanner.sleep = saved_hw
+
+    replayed = fake_pi.commands
+    mismatches = sum(1 for a, b in zip(servo, replayed) if tuple(a) != b)
+    mismatches += abs(len(servo) - len(replayed))
+    return {
+        "session": path,
+        "job": job,
+        "seconds": time.perf_counter() - t0,
+        "recorded_seconds": meta.get("duration_s"),
+        "servo_commands": len(replayed),
+        "servo_mismatches": mismatches,
+        "exhausted_reads": port.exhausted,
+        "error": error,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m lidarscan.session SESSION.lses [--realtime]")
+        sys.exit(1)
+    report = replay(sys.argv[1], realtime="--realtime" in sys.argv[2:])
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,212 @@
+import math, time, random
+
+# ---------------------------------------------------------
+# SIMULATED RIG
+# ---------------------------------------------------------
+# Stand-ins for pigpio.pi and serial.Serial so the scan code can run on
+# any Linux machine. The "world" is a table (z = 0) with box buildings;
+# SimSerial emits TFmini-S frames for whatever the servos point at.
+
+FRAME_RATE = 100        # Hz, TFmini-S default
+NOISE_CM = 0.5
+
+# x0, y0, x1, y1, height (cm, world frame)
+DEFAULT_SCENE = [
+    (-12, -6, 2, 6, 9),
+    (8, -10, 16, -2, 6),
+    (10, 4, 18, 12, 12),
+]
+
+
+class SimPi:
+    """Minimal pigpio.pi: remembers servo pulse widths.
+
+    backlash (degrees) is a dead band: the shaft stops half of it short
+    of the commanded angle, on the side it came from. lag_s is the time
+    constant it approaches that rest angle with (needs realtime reads).
+    """
+
+    connected = True
+    simulated = True        # scanner.calibrate ignores its timings
+
+    def __init__(self, backlash=0.0, lag_s=0.0):
+        self.widths = {}
+        self.backlash = backlash
+        self.lag_s = lag_s
+        self.shaft = {}     # pin -> (angle when commanded, rest angle, time)
+
+    def set_mode(self, pin, mode):
+        pass
+
+    def set_servo_pulsewidth(self, pin, width):
+        self.widths[pin] = width
+        if not 500 <= width <= 2500:
+            return
+        cmd = pulse_to_angle(width)
+        now = self.angle(pin)
+        _, rest, _ = self.shaft.get(pin, (cmd, cmd, 0.0))
+        half = self.backlash / 2
+        if cmd > rest + half:
+            rest = cmd - half
+        elif cmd < rest - half:
+            rest = cmd + half
+        self.shaft[pin] = (now if now is not None else rest, rest, time.monotonic())
+
+    def get_servo_pulsewidth(self, pin):
+        return self.widths.get(pin, 0)
+
+    def angle(self, pin):
+        """Where the shaft points now (None before the first command)."""
+        if pin not in self.shaft:
+            return None
+        start, rest, t0 = self.shaft[pin]
+        if self.lag_s <= 0:
+            return rest
+        return rest + (start - rest) * math.exp(-(time.monotonic() - t0) / self.lag_s)
+
+    def stop(self):
+        pass
+
+
+def pulse_to_angle(width):
+    return (width - 500) * 180 / 2000 - 90
+
+
+def beam(pan, tilt, mount):
+    """World-frame origin and unit direction of the beam of a head."""
+    mx, my, yaw, height = mount
+    a = math.radians(pan)
+    b = math.radians(tilt)
+    lx = math.cos(b) * math.sin(a)
+    ly = math.sin(b)
+    lz = -math.cos(a) * math.cos(b)
+    c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+    return (mx, my, height), (c * lx - s * ly, s * lx + c * ly, lz)
+
+
+def cast(origin, d, scene):
+    """Distance to the first hit: table plane or an axis-aligned box."""
+    ox, oy, oz = origin
+    dx, dy, dz = d
+    best = -oz / dz if dz < 0 else math.inf
+    for x0, y0, x1, y1, h in scene:
+        tmin, tmax = 0.0, math.inf
+        for o, v, lo, hi in ((ox, dx, x0, x1), (oy, dy, y0, y1), (oz, dz, 0.0, h)):
+            if abs(v) < 1e-12:
+                if o < lo or o > hi:
+                    tmin = math.inf
+                    break
+                continue
+            t1, t2 = (lo - o) / v, (hi - o) / v
+            tmin = max(tmin, min(t1, t2))
+            tmax = min(tmax, max(t1, t2))
+        if tmin <= tmax and tmin < best:
+            best = tmin
+    return best
+
+
+def frame(dist, strength=1000, temp=0):
+    f = bytes([0x59, 0x59, dist & 0xff, dist >> 8,
+               strength & 0xff, strength >> 8, temp & 0xff, temp >> 8])
+    return f + bytes([sum(f) & 0xff])
+
+
+class SimSerial:
+    """Minimal serial.Serial producing TFmini-S frames for one head."""
+
+    def __init__(self, pi, pan_pin, tilt_pin, mount=(0.0, 0.0, 0.0, 70.0),
+                 scene=None, realtime=False, noise=NOISE_CM):
+        self.pi = pi
+        self.pan_pin = pan_pin
+        self.tilt_pin = tilt_pin
+        self.mount = mount
+        self.scene = DEFAULT_SCENE if scene is None else scene
+        self.realtime = realtime
+        self.noise = noise
+        self.frame_rate = FRAME_RATE
+        self.baudrate = 115200          # host side
+        self.sensor_baud = 115200       # what the sensor transmits at
+        self.pending_baud = None        # set, takes effect on save
+        self.buf = b""
+        self.next_frame = time.monotonic()
+        self.written = []
+        self.is_open = True
+
+    def measure(self):
+        pan = self.pi.angle(self.pan_pin)
+        tilt = self.pi.angle(self.tilt_pin)
+        if pan is None or tilt is None:
+            pan = pulse_to_angle(self.pi.get_servo_pulsewidth(self.pan_pin))
+            tilt = pulse_to_angle(self.pi.get_servo_pulsewidth(self.tilt_pin))
+        origin, d = beam(pan, tilt, self.mount)
+        t = cast(origin, d, self.scene)
+        if t == math.inf:
+            return 0
+        return max(0, int(round(t + random.gauss(0, self.noise))))
+
+    def _new_frame(self):
+        if self.realtime:
+            # the sensor free-runs: frames complete on a fixed clock
+            period = 1.0 / self.frame_rate
+            now = time.monotonic()
+            if now > self.next_frame:
+                self.next_frame += math.ceil((now - self.next_frame) / period) * period
+            time.sleep(self.next_frame - now)
+            self.next_frame += period
+        if self.baudrate != self.sensor_baud:
+            self.buf += bytes(random.randrange(256) for _ in range(9))  # line noise
+        else:
+            self.buf += frame(self.measure())
+
+    def read(self, size=1):
+        while len(self.buf) < size:
+            self._new_frame()
+        out, self.buf = self.buf[:size], self.buf[size:]
+        return out
+
+    def reset_input_buffer(self):
+        self.buf = b""
+
+    @property
+    def in_waiting(self):
+        return len(self.buf)
+
+    def write(self, data):
+        """Answer TFmini-S configuration commands like the real sensor."""
+        data = bytes(data)
+        self.written.append(data)
+        if len(data) < 4 or data[0] != 0x5A or sum(data[:-1]) & 0xff != data[-1]:
+            return len(data)
+        cmd, payload = data[2], data[3:-1]
+        if cmd == 0x01:                         # firmware version
+            reply = bytes([1, 7, 2])
+        elif cmd == 0x03:                       # frame rate
+            self.frame_rate = int.from_bytes(payload, "little")
+            reply = payload
+        elif cmd == 0x05:                       # output format
+            reply = payload
+        elif cmd == 0x06:                       # baud, effective after save
+            self.pending_baud = int.from_bytes(payload, "little")
+            reply = payload
+        elif cmd == 0x11:                       # save settings
+            if self.pending_baud:
+                self.sensor_baud, self.pending_baud = self.pending_baud, None
+            reply = b"\x00"
+        else:
+            return len(data)
+        body = bytes([0x5A, len(reply) + 4, cmd]) + reply
+        if self.baudrate == self.sensor_baud or cmd == 0x11:
+            self.buf += body + bytes([sum(body) & 0xff])
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+def install(scene=None, realtime=False, backlash=0.0, lag_s=0.0):
+    """Point scanner.py at a simulated single-head rig."""
+    from . import scanner
+    scanner.pi = SimPi(backlash, lag_s if realtime else 0.0)
+    scanner.ser = SimSerial(scanner.pi, scanner.PAN_PIN, scanner.TILT_PIN,
+                            (0.0, 0.0, 0.0, scanner.HEIGHT_CM), scene, realtime)
+    return scanner.pi, scanner.ser
@@ -0,0 +1,279 @@
+import os, json, time, shutil, tempfile, threading
+import numpy as np
+from . import heightmap
+
+# ---------------------------------------------------------
+# PERSISTENT SPATIAL INDEX
+# ---------------------------------------------------------
+# scans/<job>/index/
+#   index.json    grid geometry (x0, y0, cell, nx, ny), point count, job
+#   heights.npy   (ny, nx) float32 ground-flattened max height, NaN = empty
+#   offsets.npy   (ny*nx + 1) int64: points of cell k are points[offsets[k]:offsets[k+1]]
+#   points.npy    (n, 3) float32 x, y, z sorted by cell (row-major)
+#
+# Built once when a scan is processed (or on the first query of an older
+# job that only has its checkpoint). index/ is a symlink to the newest
+# complete build (index.<random>/), switched with one atomic os.replace,
+# so several workers can build and read one job at the same time. The
+# arrays are opened with mmap_mode="r", so a query touches only the cells
+# it covers: a box is one contiguous slice of points per grid row, a
+# height or profile is a few reads of the heights grid.
+INDEX_DIR = "index"
+MAX_POINTS = 10000      # points returned by one query unless asked for more
+MAX_PROFILE = 10000     # samples along one profile at most (a tiny step is widened)
+KEEP_OLD_S = 60         # replaced builds stay this long for readers still opening them
+
+
+def index_dir(scan_dir, job):
+    return os.path.join(scan_dir, job, INDEX_DIR)
+
+
+def build(path, xs, ys, zs, grid_info, job=None):
+    """Write the index for a cloud and its heightmap (scanner.last_grid)."""
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    x0, y0, cell = grid_info["x0"], grid_info["y0"], grid_info["cell"]
+    ny, nx = grid_info["grid"].shape
+
+    cells = _cells_of(xs, ys, x0, y0, cell, nx, ny)
+    order = np.argsort(cells, kind="stable")
+    offsets = np.zeros(ny * nx + 1, np.int64)
+    np.cumsum(np.bincount(cells, minlength=ny * nx), out=offsets[1:])
+    return _write(path, grid_info, offsets, np.c_[xs, ys, zs][order].astype(np.float32), job)
+
+
+def update(path, xs, ys, zs, grid_info, touched, job=None, base=None):
+    """Index a cloud that differs from an indexed one only in the cells
+    where `touched` (ny, nx) is True.
+
+    The points of every other cell are copied from the build at `base`
+    (default: `path`) as they are; only the touched cells' points are
+    taken from xs, ys, zs and sorted. Falls back to build() if there is
+    no such build or its grid has another geometry.
+    """
+    xs = np.asarray(xs, float)
+    ys = np.asarray(ys, float)
+    zs = np.asarray(zs, float)
+    x0, y0, cell = grid_info["x0"], grid_info["y0"], grid_info["cell"]
+    ny, nx = grid_info["grid"].shape
+    try:
+        old = SpatialIndex(base or path)
+    except (OSError, ValueError):
+        old = None
+    if old is None or (old.x0, old.y0, old.cell, old.nx, old.ny) != (x0, y0, cell, nx, ny):
+        return build(path, xs, ys, zs, grid_info, job)
+
+    touched = np.asarray(touched, bool).ravel()
+    cells = _cells_of(xs, ys, x0, y0, cell, nx, ny)
+    fresh = np.nonzero(touched[cells])[0]
+    fresh = fresh[np.argsort(cells[fresh], kind="stable")]
+    counts = np.diff(old.offsets)
+    counts[touched] = 0
+    counts += np.bincount(cells[fresh], minlength=ny * nx)
+    offsets = np.zeros(ny * nx + 1, np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # each cell keeps its place in row-major order: untouched cells move
+    # as whole runs, touched ones are filled from the new points
+    points = np.empty((offsets[-1], 3), np.float32)
+    old_cell = np.repeat(np.arange(ny * nx), np.diff(old.offsets))
+    kept = np.nonzero(~touched[old_cell])[0]
+    points[offsets[old_cell[kept]] + kept - old.offsets[old_cell[kept]]] = old.points[kept]
+    fc = cells[fresh]
+    first = np.searchsorted(fc, fc)            # rank of each point within its cell
+    points[offsets[fc] + np.arange(len(fc)) - first] = np.c_[xs, ys, zs][fresh]
+    return _write(path, grid_info, offsets, points, job)
+
+
+def _cells_of(xs, ys, x0, y0, cell, nx, ny):
+    ix = np.clip(np.floor((xs - x0) / cell).astype(int), 0, nx - 1)
+    iy = np.clip(np.floor((ys - y0) / cell).astype(int), 0, ny - 1)
+    return iy * nx + ix
+
+
+def _write(path, grid_info, offsets, points, job):
+    """Write one build and switch `path` to it."""
+    grid = grid_info["grid"]
+    x0, y0, cell = grid_info["x0"], grid_info["y0"], grid_info["cell"]
+    ny, nx = grid.shape
+    parent = os.path.dirname(path) or "."
+    name = os.path.basename(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix="." + name + ".tmp-", dir=parent)
+    try:
+        os.chmod(tmp, 0o755)
+        np.save(os.path.join(tmp, "heights.npy"), grid.astype(np.float32))
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp, "points.npy"), points)
+        with open(os.path.join(tmp, "index.json"), "w") as f:
+            json.dump({"x0": float(x0), "y0": float(y0), "cell": float(cell), "nx": nx, "ny": ny,
+                       "points": int(len(points)), "job": job,
+                       "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+        done = os.path.join(parent, name + "." + os.path.basename(tmp).rsplit("-", 1)[1])
+        os.rename(tmp, done)
+        tmp = done
+        link = os.path.join(parent, "." + os.path.basename(done) + ".link")
+        os.symlink(os.path.basename(done), link)
+        if os.path.isdir(path) and not os.path.islink(path):
+            # a plain directory from before versioned builds: move it aside once
+            os.rename(path, os.path.join(parent, name + ".old-" + os.path.basename(tmp).split(".")[-1]))
+        os.replace(link, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _prune(path)
+    return path
+
+
+def _prune(path):
+    """Delete builds of `path` other than the current one once they are
+    KEEP_OLD_S old, and build directories left by a crashed writer."""
+    parent = os.path.dirname(path) or "."
+    name = os.path.basename(path)
+    current = os.path.realpath(path)
+    cutoff = time.time() - KEEP_OLD_S
+    for entry in os.listdir(parent):
+        full = os.path.join(parent, entry)
+        if entry.startswith(name + "."):
+            stale = os.path.realpath(full) != current
+        elif entry.startswith("." + name + ".tmp-"):
+            stale = True
+        else:
+            continue
+        try:
+            if stale and os.path.isdir(full) and os.path.getmtime(full) < cutoff:
+                shutil.rmtree(full, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class SpatialIndex:
+    """Read-only, memory-mapped view of one scan's index."""
+
+    def __init__(self, path):
+        path = os.path.realpath(path)       # one build, even if index/ is switched meanwhile
+        with open(os.path.join(path, "index.json")) as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.x0, self.y0, self.cell = self.meta["x0"], self.meta["y0"], self.meta["cell"]
+        self.nx, self.ny = self.meta["nx"], self.meta["ny"]
+        self.heights = np.load(os.path.join(path, "heights.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.points = np.load(os.path.join(path, "points.npy"), mmap_mode="r")
+        self.stamp = os.path.getmtime(os.path.join(path, "index.json"))
+
+    def _cell(self, x, y):
+        return (int(np.floor((x - self.x0) / self.cell)),
+                int(np.floor((y - self.y0) / self.cell)))
+
+    def height(self, x, y):
+        """Height above ground of the cell under (x, y) and its point count."""
+        i, j = self._cell(x, y)
+        if not (0 <= i < self.nx and 0 <= j < self.ny):
+            return {"x": x, "y": y, "height_cm": None, "points": 0}
+        h = float(self.heights[j, i])
+        k = j * self.nx + i
+        return {"x": x, "y": y, "cell": [i, j],
+                "height_cm": None if np.isnan(h) else round(h, 2),
+                "points": int(self.offsets[k + 1] - self.offsets[k])}
+
+    def _candidates(self, x0, y0, x1, y1):
+        """Points of every cell overlapping the box (one slice per row)."""
+        i0, j0 = self._cell(min(x0, x1), min(y0, y1))
+        i1, j1 = self._cell(max(x0, x1), max(y0, y1))
+        i0, i1 = max(i0, 0), min(i1, self.nx - 1)
+        j0, j1 = max(j0, 0), min(j1, self.ny - 1)
+        if i0 > i1 or j0 > j1:
+            return np.empty((0, 3), np.float32)
+        rows = [self.points[self.offsets[j * self.nx + i0]:self.offsets[j * self.nx + i1 + 1]]
+                for j in range(j0, j1 + 1)]
+        return np.concatenate(rows)
+
+    def bbox(self, x0, y0, x1, y1):
+        """(n, 3) points with x0 <= x <= x1 and y0 <= y <= y1."""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        p = self._candidates(x0, y0, x1, y1)
+        keep = (p[:, 0] >= x0) & (p[:, 0] <= x1) & (p[:, 1] >= y0) & (p[:, 1] <= y1)
+        return p[keep]
+
+    def polygon(self, vertices):
+        """(n, 3) points inside a polygon [(x, y), ...] (even-odd rule)."""
+        v = np.asarray(vertices, float)
+        p = self._candidates(v[:, 0].min(), v[:, 1].min(), v[:, 0].max(), v[:, 1].max())
+        x, y = p[:, 0].astype(float), p[:, 1].astype(float)
+        inside = np.zeros(len(p), bool)
+        for (ax, ay), (bx, by) in zip(v, np.roll(v, -1, axis=0)):
+            crosses = (ay > y) != (by > y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                xc = ax + (y - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (x < xc)
+        return p[inside]
+
+    def profile(self, x0, y0, x1, y1, step=None):
+        """Heights sampled every `step` cm (default: one cell, at most
+        MAX_PROFILE samples) from (x0, y0) to (x1, y1): [(distance, x, y,
+        height or None)]."""
+        length = float(np.hypot(x1 - x0, y1 - y0))
+        step = max(step or self.cell, length / MAX_PROFILE)
+        t = np.linspace(0.0, 1.0, max(int(length / step), 1) + 1)
+        xs = x0 + t * (x1 - x0)
+        ys = y0 + t * (y1 - y0)
+        ix = np.floor((xs - self.x0) / self.cell).astype(int)
+        iy = np.floor((ys - self.y0) / self.cell).astype(int)
+        inside = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        h = np.full(len(t), np.nan)
+        h[inside] = self.heights[iy[inside], ix[inside]]
+        return [(round(d, 2), round(x, 2), round(y, 2), None if np.isnan(v) else round(float(v), 2))
+                for d, x, y, v in zip(t * length, xs, ys, h)]
+
+
+# ---------------------------------------------------------
+# OPEN BY JOB
+# ---------------------------------------------------------
+_open = {}
+_jobs = {}                  # index path -> lock held while opening or building it
+_lock = threading.Lock()    # guards _jobs only: other jobs open while one builds
+
+
+def _build_from_checkpoint(path, scan_dir, job):
+    from . import checkpoint, outliers, scanner
+    _, samples, _, _ = checkpoint.load(checkpoint.path_for(scan_dir, job))
+    if not samples:
+        raise FileNotFoundError(f"job {job} has no samples")
+    xs, ys, zs = np.asarray(samples, float)[:, 3:].T
+    if scanner.FILTER_OUTLIERS:
+        xs, ys, zs = outliers.filter_points(xs, ys, zs)
+    zf = heightmap.flatten(xs, ys, zs, heightmap.fit_ground(xs, ys, zs))
+    x0, y0, nx, ny = heightmap.grid_shape(xs, ys, scanner.GRID_SIZE)
+    grid = heightmap.max_grid(xs, ys, zf, x0, y0, scanner.GRID_SIZE, nx, ny)
+    build(path, xs, ys, zs, {"grid": grid, "x0": x0, "y0": y0, "cell": scanner.GRID_SIZE}, job)
+
+
+def valid_job(job):
+    """True if `job` names a folder directly inside the scan directory."""
+    return isinstance(job, str) and job not in ("", ".", "..") and os.path.basename(job) == job
+
+
+def open_job(scan_dir, job):
+    """SpatialIndex of a job, building it from the checkpoint if needed."""
+    if not valid_job(job):
+        raise ValueError(f"bad job id {job!r}")
+    path = index_dir(scan_dir, job)
+    with _lock:
+        lock = _jobs.setdefault(path, threading.Lock())
+    with lock:
+        idx = _open.get(path)
+        stamp = os.path.getmtime(os.path.join(path, "index.json")) \
+            if os.path.exists(os.path.join(path, "index.json")) else None
+        if idx is not None and idx.stamp == stamp:
+            return idx
+        if stamp is None:
+            _build_from_checkpoint(path, scan_dir, job)
+        try:
+            idx = SpatialIndex(path)
+        except FileNotFoundError:       # switched and pruned while opening
+            idx = SpatialIndex(path)
+        _open[path] = idx
+        return idx
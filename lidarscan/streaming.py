@@ -0,0 +1,123 @@
+import os, sys, json, time, argparse
+import numpy as np
+from . import scanner
+from . import heightmap
+from . import accumulator
+from . import buildings
+from . import tiles
+from . import mesh
+from . import pointfile
+
+# ---------------------------------------------------------
+# OUT-OF-CORE PROCESSING
+# ---------------------------------------------------------
+# python -m lidarscan.streaming merged.pts -o big_out --grid 2 --chunk 500000
+# python -m lidarscan.streaming scan_points.csv -o big_out    (converted to .pts first)
+#
+# For clouds too large to load (merged multi-head scans, long sweeps).
+# The point file is memory-mapped and read in fixed-size chunks:
+#   pass 1  ground plane normal equations (accumulator.PlaneFit) + bounds
+#   pass 2  flatten each chunk and fold it into the per-cell max grid
+# then the mesh is streamed to disk a band of grid rows at a time. Peak
+# memory is one chunk plus the grid, which depends on the covered area
+# and cell size, not on the number of points.
+#
+# Outlier removal needs each point's neighbours, which may sit in another
+# chunk, so it is not applied here (batch.py does it for in-memory clouds).
+
+
+def ground_and_bounds(points, chunk=pointfile.CHUNK_POINTS):
+    """Ground plane (a, b, c) and (x_min, y_min, x_max, y_max) in one pass."""
+    fit = accumulator.PlaneFit()
+    lo = np.full(2, np.inf)
+    hi = np.full(2, -np.inf)
+    for xs, ys, zs in pointfile.chunks(points, chunk):
+        fit.add_many(xs, ys, zs)
+        lo = np.minimum(lo, (xs.min(), ys.min()))
+        hi = np.maximum(hi, (xs.max(), ys.max()))
+    return fit.coeffs(), (lo[0], lo[1], hi[0], hi[1])
+
+
+def grid_points(points, cell, coeffs, bounds, chunk=pointfile.CHUNK_POINTS):
+    """Max heightmap of the flattened cloud as {"grid", "x0", "y0", "cell"}."""
+    x0, y0, nx, ny = heightmap.shape_from_bounds(*bounds, cell)
+    flat = np.full(ny * nx, -np.inf)
+    for xs, ys, zs in pointfile.chunks(points, chunk):
+        zf = heightmap.flatten(xs, ys, zs, coeffs)
+        heightmap.max_into(flat, xs, ys, zf, x0, y0, cell, nx, ny)
+    flat[np.isneginf(flat)] = np.nan
+    return {"grid": flat.reshape(ny, nx), "x0": x0, "y0": y0, "cell": cell}
+
+
+def write_stl(path, grid_info, walls=False, threshold=None, binary=True):
+    with mesh.StlWriter(path, binary) as w:
+        mesh.write_surface(w, grid_info)
+        if walls:
+            scanner.write_walls(w.tri, grid_info["grid"], grid_info["x0"], grid_info["y0"],
+                                grid_info["cell"], threshold)
+    return w.count
+
+
+def process_file(path, out, cell=None, threshold=None, walls=None,
+                 chunk=pointfile.CHUNK_POINTS, binary=True):
+    """Heightmap, PNG, STL and buildings for one point file; returns the
+    manifest (also written to out/manifest.json)."""
+    cell = cell or scanner.GRID_SIZE
+    threshold = scanner.BUILDING_THRESHOLD if threshold is None else threshold
+    walls = scanner.STL_WALLS if walls is None else walls
+    t0 = time.perf_counter()
+    meta, points = pointfile.open_points(path)
+    if not len(points):
+        raise ValueError(f"{path}: no points")
+    os.makedirs(out, exist_ok=True)
+
+    coeffs, bounds = ground_and_bounds(points, chunk)
+    grid_info = grid_points(points, cell, coeffs, bounds, chunk)
+    grid = grid_info["grid"]
+    np.savez_compressed(os.path.join(out, "heightmap.npz"), **grid_info)
+
+    finite = grid[np.isfinite(grid)]
+    vmin, vmax = (finite.min(), finite.max()) if finite.size else (0.0, 1.0)
+    with open(os.path.join(out, "heightmap.png"), "wb") as f:
+        f.write(tiles.encode_png(tiles.colorize(grid[::-1], vmin, vmax)))
+
+    triangles = write_stl(os.path.join(out, scanner.STL_NAME), grid_info, walls, threshold, binary)
+
+    _, found = buildings.segment(grid, grid_info["x0"], grid_info["y0"], cell, threshold)
+    with open(os.path.join(out, "buildings.json"), "w") as f:
+        json.dump({"threshold_cm": threshold, "cell_cm": cell, "buildings": found}, f)
+
+    manifest = {"input": path, "meta": meta, "points": int(len(points)), "chunk": chunk,
+                "ground": [float(c) for c in coeffs], "grid_shape": list(grid.shape),
+                "triangles": triangles, "buildings": len(found),
+                "seconds": round(time.perf_counter() - t0, 3)}
+    with open(os.path.join(out, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Process a point cloud larger than memory.")
+    ap.add_argument("input", help=f"point file ({pointfile.EXTENSION}) or x,y,z CSV")
+    ap.add_argument("-o", "--out", default="stream_out")
+    ap.add_argument("--grid", type=float, default=scanner.GRID_SIZE, help="cell size in cm")
+    ap.add_argument("--threshold", type=float, default=scanner.BUILDING_THRESHOLD,
+                    help="building height threshold in cm")
+    ap.add_argument("--walls", action="store_true", help="close buildings with walls in the STL")
+    ap.add_argument("--ascii", action="store_true", help="ASCII instead of binary STL")
+    ap.add_argument("--chunk", type=int, default=pointfile.CHUNK_POINTS, help="points per chunk")
+    args = ap.parse_args(argv)
+
+    path = args.input
+    if path.endswith(".csv"):
+        path = os.path.join(args.out, "points" + pointfile.EXTENSION)
+        n = pointfile.from_csv(args.input, path, args.chunk)
+        print(f"converted {n:,d} points to {path}")
+    manifest = process_file(path, args.out, args.grid, args.threshold, args.walls,
+                            args.chunk, not args.ascii)
+    print(f"{manifest['points']:,d} points -> {args.out} in {manifest['seconds']} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
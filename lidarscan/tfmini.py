@@ -0,0 +1,195 @@
+import sys, time
+
+# ---------------------------------------------------------
+# TFmini-S COMMAND PROTOCOL
+# ---------------------------------------------------------
+# host -> sensor : 0x5A | len | id | payload | checksum
+# sensor -> host : same layout, interleaved with the 0x59 0x59 data frames
+# len counts the whole frame; checksum = low byte of the sum of the others.
+HEAD = 0x5A
+
+ID_VERSION = 0x01
+ID_RESET = 0x02
+ID_FRAME_RATE = 0x03
+ID_FORMAT = 0x05
+ID_BAUD = 0x06
+ID_SAVE = 0x11
+
+FORMAT_CM = 0x01        # 9-byte frames, distance in cm (what read_lidar expects)
+FORMAT_PIX = 0x02       # Pixhawk text
+FORMAT_MM = 0x06        # 9-byte frames, distance in mm
+
+BAUD_RATES = (9600, 14400, 19200, 56000, 115200, 460800, 921600)
+MAX_FRAME_RATE = 1000
+ACK_TIMEOUT = 0.5       # s to wait for an acknowledgement frame
+
+
+class TFminiError(Exception):
+    pass
+
+
+def command(cmd_id, payload=b""):
+    body = bytes([HEAD, len(payload) + 4, cmd_id]) + bytes(payload)
+    return body + bytes([sum(body) & 0xff])
+
+
+def find_response(buf, cmd_id):
+    """Payload of the first valid response to cmd_id in buf, else None."""
+    i = buf.find(bytes([HEAD]))
+    while i >= 0:
+        if i + 3 <= len(buf):
+            n = buf[i + 1]
+            if 4 <= n <= 16 and buf[i + 2] == cmd_id and i + n <= len(buf):
+                frame = buf[i:i + n]
+                if sum(frame[:-1]) & 0xff == frame[-1]:
+                    return bytes(frame[3:-1])
+        i = buf.find(bytes([HEAD]), i + 1)
+    return None
+
+
+def send(port, cmd_id, payload=b"", timeout=ACK_TIMEOUT):
+    """Send one command and return the payload of its acknowledgement."""
+    port.reset_input_buffer()
+    port.write(command(cmd_id, payload))
+    buf = bytearray()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        buf += port.read(getattr(port, "in_waiting", 0) or 1)
+        reply = find_response(buf, cmd_id)
+        if reply is not None:
+            return reply
+    raise TFminiError(f"no acknowledgement for command 0x{cmd_id:02x}")
+
+
+# ---------------------------------------------------------
+# COMMANDS
+# ---------------------------------------------------------
+def version(port):
+    v = send(port, ID_VERSION)
+    if len(v) != 3:
+        raise TFminiError("bad version reply")
+    return f"{v[2]}.{v[1]}.{v[0]}"
+
+
+def max_frame_rate(baud):
+    """Fastest rate a baud rate carries: 9-byte frames, 10 bits per byte,
+    20 % headroom."""
+    return min(MAX_FRAME_RATE, int(baud / 90 * 0.8))
+
+
+def set_frame_rate(port, hz):
+    hz = int(hz)
+    if not 1 <= hz <= MAX_FRAME_RATE:
+        raise TFminiError(f"frame rate {hz} Hz out of range")
+    payload = hz.to_bytes(2, "little")
+    if send(port, ID_FRAME_RATE, payload) != payload:
+        raise TFminiError("frame rate not acknowledged")
+    return hz
+
+
+def set_output_format(port, fmt):
+    if send(port, ID_FORMAT, bytes([fmt])) != bytes([fmt]):
+        raise TFminiError("output format not acknowledged")
+    return fmt
+
+
+def save(port):
+    status = send(port, ID_SAVE)
+    if status != b"\x00":
+        raise TFminiError("sensor refused to save settings")
+
+
+def _frames_arrive(port, timeout=ACK_TIMEOUT):
+    port.reset_input_buffer()
+    buf = bytearray()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        buf += port.read(getattr(port, "in_waiting", 0) or 1)
+        i = buf.find(b"YY")
+        if 0 <= i and i + 9 <= len(buf) and sum(buf[i:i + 8]) & 0xff == buf[i + 8]:
+            return True
+    return False
+
+
+def set_baud(port, baud):
+    """Move sensor and host to a new baud rate (persisted in the sensor).
+
+    The sensor acknowledges at the old rate and only switches once
+    settings are saved, so frames can only be checked after the save. If
+    none arrive at the new rate, the old rate is sent and saved at the
+    new one and the host goes back; the error says whether the sensor
+    answered at the old rate again.
+    """
+    if baud not in BAUD_RATES:
+        raise TFminiError(f"unsupported baud rate {baud}")
+    old = port.baudrate
+    payload = baud.to_bytes(4, "little")
+    if send(port, ID_BAUD, payload) != payload:
+        raise TFminiError("baud rate not acknowledged")
+    save(port)
+    port.baudrate = baud
+    if _frames_arrive(port):
+        return baud
+    try:
+        send(port, ID_BAUD, old.to_bytes(4, "little"))
+        save(port)
+    except TFminiError:
+        pass                    # commands may not get through either
+    port.baudrate = old
+    if _frames_arrive(port):
+        raise TFminiError(f"no frames at {baud} baud, sensor restored to {old}")
+    raise TFminiError(f"no frames at {baud} baud and none at {old} after restoring: "
+                      f"the sensor may be saved at {baud}")
+
+
+def configure(port, frame_rate=None, output_format=None, baud=None, persist=False):
+    """Apply what is asked, step by step; a failed step is reported and
+    the sensor keeps its previous setting for it.
+
+    Returns {"applied": {...}, "failed": {...}}.
+    """
+    applied, failed = {}, {}
+    if baud is not None and baud != port.baudrate:
+        try:
+            applied["baud"] = set_baud(port, baud)
+        except TFminiError as e:
+            failed["baud"] = str(e)
+    if output_format is not None:
+        try:
+            applied["format"] = set_output_format(port, output_format)
+        except TFminiError as e:
+            failed["format"] = str(e)
+    if frame_rate is not None:
+        hz = min(frame_rate, max_frame_rate(port.baudrate))
+        try:
+            applied["frame_rate"] = set_frame_rate(port, hz)
+            if hz != frame_rate:
+                failed["frame_rate"] = f"capped to {hz} Hz at {port.baudrate} baud"
+        except TFminiError as e:
+            failed["frame_rate"] = str(e)
+    if persist and applied:
+        try:
+            save(port)
+            applied["saved"] = True
+        except TFminiError as e:
+            failed["save"] = str(e)
+    return {"applied": applied, "failed": failed}
+
+
+if __name__ == "__main__":
+    import argparse, json, serial
+    ap = argparse.ArgumentParser(description="Configure a TFmini-S over its UART.")
+    ap.add_argument("--port", default="/dev/ttyS0")
+    ap.add_argument("--baud", type=int, default=115200, help="current baud rate")
+    ap.add_argument("--rate", type=int, help="frame rate in Hz")
+    ap.add_argument("--new-baud", type=int, choices=BAUD_RATES)
+    ap.add_argument("--format", choices=("cm", "mm", "pix"))
+    ap.add_argument("--save", action="store_true", help="persist in the sensor")
+    args = ap.parse_args()
+
+    fmt = {"cm": FORMAT_CM, "mm": FORMAT_MM, "pix": FORMAT_PIX}.get(args.format)
+    with serial.Serial(args.port, args.baud, timeout=0.05) as port:
+        print("firmware", version(port))
+        report = configure(port, args.rate, fmt, args.new_baud, args.save)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,144 @@
+import gzip, zlib, struct, threading
+import numpy as np
+from plotly.colors import sequential, convert_colors_to_same_type
+
+# ---------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------
+TILE = 256              # tile edge in grid cells
+PNG_LEVEL = 6           # zlib level for PNG tiles
+SCALES = ("viridis", "cividis", "plasma", "inferno", "magma", "turbo", "greys", "blues")
+
+
+# ---------------------------------------------------------
+# COLOUR MAP
+# ---------------------------------------------------------
+def make_lut(name="viridis"):
+    """256 RGBA entries from a plotly sequential scale, plus a transparent
+    one at index 256 for NaN."""
+    # a copy: convert_colors_to_same_type rewrites the list it is given,
+    # and plotly's own figures would then see tuples instead of colours
+    colours, _ = convert_colors_to_same_type(list(getattr(sequential, name.capitalize())), "tuple")
+    stops = np.array(colours, float) * 255
+    pos = np.linspace(0, 1, len(stops))
+    t = np.linspace(0, 1, 256)
+    lut = np.zeros((257, 4), np.uint8)      # last entry = transparent (NaN)
+    for ch in range(3):
+        lut[:256, ch] = np.round(np.interp(t, pos, stops[:, ch]))
+    lut[:256, 3] = 255
+    return lut
+
+LUT = make_lut()
+_luts = {"viridis": LUT}
+
+
+def lut(name):
+    """Cached LUT of one of SCALES."""
+    if name not in SCALES:
+        raise ValueError(f"unknown colour scale {name!r}")
+    if name not in _luts:
+        _luts[name] = make_lut(name)
+    return _luts[name]
+
+
+def colorize(grid, vmin, vmax, lut=None):
+    """Map heights to RGBA through a LUT (default Viridis); NaN cells are transparent."""
+    span = (vmax - vmin) or 1.0
+    with np.errstate(invalid="ignore"):
+        idx = np.clip((grid - vmin) / span * 255, 0, 255)
+    idx = np.where(np.isnan(grid), 256, idx).astype(np.intp)
+    return (LUT if lut is None else lut)[idx]
+
+
+# ---------------------------------------------------------
+# PNG (stdlib only)
+# ---------------------------------------------------------
+def _chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xffffffff)
+
+
+def encode_png(rgba):
+    """Encode an (h, w, 4) uint8 array as a PNG."""
+    h, w, _ = rgba.shape
+    raw = np.zeros((h, w * 4 + 1), np.uint8)   # filter byte 0 on every row
+    raw[:, 1:] = rgba.reshape(h, w * 4)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+            + _chunk(b"IDAT", zlib.compress(raw.tobytes(), PNG_LEVEL))
+            + _chunk(b"IEND", b""))
+
+
+# ---------------------------------------------------------
+# PYRAMID
+# ---------------------------------------------------------
+def downsample(grid):
+    """2x2 max pooling (NaN-aware), like the max-height gridding itself."""
+    ny, nx = grid.shape
+    g = np.full((ny + ny % 2, nx + nx % 2), np.nan)
+    g[:ny, :nx] = grid
+    blocks = g.reshape(g.shape[0] // 2, 2, g.shape[1] // 2, 2)
+    with np.errstate(invalid="ignore"):
+        out = np.fmax(np.fmax(blocks[:, 0, :, 0], blocks[:, 0, :, 1]),
+                      np.fmax(blocks[:, 1, :, 0], blocks[:, 1, :, 1]))
+    return out
+
+
+class Pyramid:
+    """Multi-resolution heightmap; level 0 is full resolution.
+
+    Tiles are rendered on first request and cached, so panning and
+    zooming only costs the tiles that are actually shown.
+    """
+
+    def __init__(self, grid_info, lut=None):
+        self.info = grid_info
+        self.lut = lut
+        grid = np.asarray(grid_info["grid"], float)
+        finite = grid[np.isfinite(grid)]
+        self.vmin = float(finite.min()) if finite.size else 0.0
+        self.vmax = float(finite.max()) if finite.size else 1.0
+
+        self.levels = [grid]
+        while max(self.levels[-1].shape) > TILE:
+            self.levels.append(downsample(self.levels[-1]))
+        self._tiles = {}
+        self._f16 = {}
+        self._lock = threading.Lock()
+
+    def meta(self):
+        ny, nx = self.levels[0].shape
+        return {
+            "nx": nx, "ny": ny,
+            "x0": float(self.info["x0"]), "y0": float(self.info["y0"]),
+            "cell": float(self.info["cell"]),
+            "vmin": self.vmin, "vmax": self.vmax,
+            "tile": TILE,
+            "levels": [{"nx": g.shape[1], "ny": g.shape[0],
+                        "tiles_x": -(-g.shape[1] // TILE), "tiles_y": -(-g.shape[0] // TILE)}
+                       for g in self.levels],
+        }
+
+    def tile(self, level, tx, ty):
+        """PNG bytes for one tile (row 0 = lowest y, like origin="lower")."""
+        key = (level, tx, ty)
+        with self._lock:
+            png = self._tiles.get(key)
+        if png is not None:
+            return png
+        g = self.levels[level]
+        block = g[ty * TILE:(ty + 1) * TILE, tx * TILE:(tx + 1) * TILE]
+        if block.size == 0:
+            return None
+        png = encode_png(colorize(block[::-1], self.vmin, self.vmax, self.lut))
+        with self._lock:
+            self._tiles[key] = png
+        return png
+
+    def float16(self, level=0, gzipped=True):
+        """Little-endian float16 grid (NaN = empty cell), gzip-compressed
+        unless `gzipped` is false."""
+        if (level, gzipped) not in self._f16:
+            data = self.levels[level].astype("<f2").tobytes()
+            self._f16[level, gzipped] = gzip.compress(data, 6) if gzipped else data
+        return self._f16[level, gzipped]
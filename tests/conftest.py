@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from lidarscan import scanner, simulator
+
+
+@pytest.fixture
+def sim(tmp_path, monkeypatch):
+    """scanner pointed at the simulated rig, writing into a temp directory,
+    with no real-time waits."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("pi", "ser", "sleep", "SHARED_LIVE", "CALIBRATE", "job_id", "live_map",
+                 "last_points", "last_grid", "is_scanning", "scan_progress"):
+        monkeypatch.setattr(scanner, name, getattr(scanner, name))
+    simulator.install()
+    scanner.sleep = lambda s: None
+    scanner.SHARED_LIVE = False
+    return scanner
+
+
+@pytest.fixture
+def route():
+    """A short serpentine over the middle of the simulated table."""
+    rows = []
+    for i, tilt in enumerate(range(-12, 13, 3)):
+        pans = range(-30, 31, 3)
+        rows += [(pan, tilt) for pan in (pans if i % 2 == 0 else reversed(pans))]
+    return rows
+
+
+@pytest.fixture
+def table():
+    """Factory for clean samples of a tilted table with boxes on it:
+    table(n, seed, boxes=[(x0, y0, x1, y1, height), ...]) samples it at
+    random, table(step=...) on a regular grid, like a scan."""
+    def make(n=3000, seed=0, boxes=(), extent=(-40, -20, 40, 20), tilt=(0.02, 0.0, 1.0),
+             noise=0.1, step=None):
+        rng = np.random.default_rng(seed)
+        x0, y0, x1, y1 = extent
+        if step is None:
+            xs, ys = rng.uniform(x0, x1, n), rng.uniform(y0, y1, n)
+        else:
+            xs, ys = [a.ravel() for a in np.meshgrid(np.arange(x0, x1, step),
+                                                     np.arange(y0, y1, step))]
+        a, b, c = tilt
+        zs = a * xs + b * ys + c + rng.normal(0, noise, len(xs))
+        for bx0, by0, bx1, by1, h in boxes:
+            zs[(xs >= bx0) & (xs < bx1) & (ys >= by0) & (ys < by1)] += h
+        return xs, ys, zs
+    return make
@@ -0,0 +1,66 @@
+import numpy as np
+from lidarscan import accumulator, scanner
+
+
+CLOUD = dict(extent=(-37.3, -18.6, 41.9, 22.1), tilt=(0.04, -0.03, 2.0), noise=0.2,
+             boxes=[(0, -5, 12, 6, 9.0)])
+
+
+def _fed(xs, ys, zs, bounds=(-10.0, -10.0, 10.0, 10.0)):
+    acc = accumulator.HeightAccumulator(scanner.GRID_SIZE, bounds)
+    for k in range(100):
+        acc.add(xs[k], ys[k], zs[k])
+    acc.add_many(xs[100:], ys[100:], zs[100:])
+    return acc
+
+
+def test_grid_lines_up_with_build_grid(table):
+    xs, ys, zs = table(**CLOUD)
+    got, want = _fed(xs, ys, zs).grid(), scanner.build_grid(xs, ys, zs)
+    assert (got["x0"], got["y0"], got["cell"]) == (want["x0"], want["y0"], want["cell"])
+    assert got["grid"].shape == want["grid"].shape
+    # flattened at each cell's highest sample rather than per sample: off
+    # by at most the ground tilt across one cell
+    tilt = (0.04 + 0.03) * scanner.GRID_SIZE
+    np.testing.assert_allclose(got["grid"], want["grid"], atol=tilt)
+
+
+def test_growing_bounds_give_the_same_grid(table):
+    xs, ys, zs = table(**CLOUD)
+    small = _fed(xs, ys, zs).grid()
+    big = _fed(xs, ys, zs, bounds=(-60.0, -30.0, 60.0, 30.0)).grid()
+    assert (small["x0"], small["y0"]) == (big["x0"], big["y0"])
+    np.testing.assert_array_equal(small["grid"], big["grid"])
+
+
+def test_dropped_samples_leave_no_trace(table):
+    xs, ys, zs = table(**CLOUD)
+    zs[::50] += 30.0                    # spikes, later rejected
+    keep = np.ones(len(xs), bool)
+    keep[::50] = False
+    acc = _fed(xs, ys, zs)
+    acc.drop(xs, ys, zs, keep)
+    want = _fed(xs[keep], ys[keep], zs[keep])
+    assert acc.samples == want.samples
+    np.testing.assert_allclose(acc.plane.coeffs(), want.plane.coeffs())
+    got, want = acc.grid(), want.grid()
+    assert (got["x0"], got["y0"]) == (want["x0"], want["y0"])
+    np.testing.assert_allclose(got["grid"], want["grid"])
+
+
+def test_processing_grids_the_filtered_scan_online(sim, route, monkeypatch):
+    xs, ys, zs = sim.run_scan(poses=route, process=False)
+    acc = sim.live_map
+    stray = (5.0, 3.0, 60.0)            # a spurious return far above the table
+    acc.add(*stray)
+
+    def regrid(*args, **kwargs):
+        raise AssertionError("gridded the cloud again")
+    monkeypatch.setattr(scanner, "build_grid", regrid)
+    sim.process_scan(np.r_[xs, stray[0]], np.r_[ys, stray[1]], np.r_[zs, stray[2]], acc)
+    assert acc.samples == len(xs)
+    assert np.nanmax(sim.last_grid["grid"]) < 30
+
+
+def test_empty_accumulator_has_no_grid():
+    assert accumulator.HeightAccumulator(2.0).grid() is None
@@ -0,0 +1,75 @@
+import os, threading, time
+import pytest
+from lidarscan import artifacts
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return artifacts.ArtifactCache(str(tmp_path), memory_bytes=4000, disk_bytes=250)
+
+
+def _writer(data=b"x" * 100, calls=None, delay=0.0):
+    def compute(tmp):
+        if calls is not None:
+            calls.append(tmp)
+        time.sleep(delay)
+        with open(tmp, "wb") as f:
+            f.write(data)
+    return compute
+
+
+def test_lru_drops_the_least_recently_used():
+    lru = artifacts.LRU(400)
+    for k in "abcd":
+        lru.put(k, k.upper(), 100)
+    lru.get("a")
+    lru.put("e", "E", 100)
+    assert [lru.get(k) for k in "abcde"] == ["A", None, "C", "D", "E"]
+    lru.put("huge", "H", 101)           # over a quarter of the budget
+    assert lru.get("huge") is None and lru.size == 400
+
+
+def test_disk_and_memory_hits_do_not_recompute(cache):
+    calls = []
+    path = cache.file("job", "stl-1.stl", _writer(calls=calls))
+    assert cache.file("job", "stl-1.stl", _writer(calls=calls)) == path
+    assert len(calls) == 1
+
+    assert cache.get("job", "points-1.bin", _writer(b"abc", calls)) == b"abc"
+    os.remove(cache.path("job", "points-1.bin"))
+    assert cache.get("job", "points-1.bin", _writer(b"abc", calls)) == b"abc"
+    assert len(calls) == 2
+
+
+def test_concurrent_requests_compute_once(cache):
+    calls, results = [], []
+
+    def request():
+        results.append(cache.get("job", "heightmap-1.npz", _writer(b"grid", calls, 0.05)))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and results == [b"grid"] * 8
+
+
+def test_eviction_walks_the_disk_only_when_over_budget(cache, monkeypatch):
+    monkeypatch.setattr(artifacts, "EVICT_GRACE_S", 0.0)
+    walks = []
+    evict = cache.evict_disk
+    monkeypatch.setattr(cache, "evict_disk", lambda: walks.append(1) or evict())
+
+    first = cache.file("a", "stl-1.stl", _writer())
+    os.utime(first, (1000, 1000))
+    second = cache.file("b", "stl-2.stl", _writer())
+    os.utime(second, (2000, 2000))
+    assert len(walks) == 1 and cache.disk_used == 200      # the first write walks once
+    cache.file("a", "stl-1.stl", _writer())                 # hits never walk
+    os.utime(first, (1000, 1000))
+    assert len(walks) == 1
+
+    cache.file("b", "stl-3.stl", _writer())                 # 300 > 250
+    assert len(walks) == 2 and cache.disk_used == 200
+    assert not os.path.exists(first) and os.path.exists(second)
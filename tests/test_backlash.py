@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from lidarscan import backlash, batch, checkpoint, simulator
+
+# what a calibration of simulator.SimPi(backlash=2.0) finds: the shaft
+# stops 1 degree short on the side it came from
+TABLE = {axis: {"up": {"angles": [-90, 90], "error": [-1.0, -1.0], "settle_s": 0.01},
+                "down": {"angles": [-90, 90], "error": [1.0, 1.0], "settle_s": 0.02}}
+         for axis in ("pan", "tilt")}
+
+
+@pytest.fixture
+def rig(sim, monkeypatch):
+    simulator.install(backlash=2.0)
+    monkeypatch.setattr(sim, "BACKLASH_TABLE", TABLE)
+    monkeypatch.setattr(sim, "_servo_state", {})
+    return sim
+
+
+def test_directions_hold_through_pauses():
+    d = backlash.directions([0, 2, 2, 1, 1, 3, 3])
+    assert d.tolist() == [1, 1, 1, -1, -1, 1, 1]
+    assert backlash.directions([5, 5, 4], start=5).tolist() == [1, 1, -1]
+
+
+def test_route_angles_undo_the_commands():
+    angles = [-10, -5, 0, 5, 0, -5]
+    d = backlash.directions(angles)
+    cmd = backlash.command(TABLE, "pan", np.asarray(angles, float), d)
+    np.testing.assert_allclose(cmd, [-11, -4, 1, 6, -1, -6])    # -10 is reached going down
+    np.testing.assert_allclose(backlash.route_angles(angles, "pan", TABLE, TABLE), angles)
+    np.testing.assert_allclose(backlash.route_angles(angles, "pan", TABLE, {}), cmd)
+    np.testing.assert_allclose(backlash.route_angles(angles, "pan", {}, TABLE),
+                               np.asarray(angles) - np.where(d > 0, 1.0, -1.0))
+    assert backlash.settle(TABLE, "pan", -1, 0.04) == 0.02
+    assert backlash.settle({}, "pan", -1, 0.04) == 0.04
+
+
+def test_corrected_moves_land_on_the_target(rig, monkeypatch):
+    sweep = [-10, -5, 0, 5, 10, 5, 0, -5, -10]
+    for table, miss in ((TABLE, 0.0), ({}, 1.0)):
+        monkeypatch.setattr(rig, "BACKLASH_TABLE", table)
+        rig.move(rig.PAN_PIN, sweep[0])     # the first command has no direction yet
+        for angle in sweep[1:]:
+            at = rig.move(rig.PAN_PIN, angle)
+            shaft = rig.pi.angle(rig.PAN_PIN)
+            assert abs(abs(shaft - angle) - miss) < 0.1
+            if table:
+                assert abs(at - shaft) < 0.1        # projected where it stopped
+            else:
+                assert at == angle
+
+
+def test_batch_reprojects_the_scan_routing(rig, route):
+    rig.run_scan(poses=route, process=False)
+    path = checkpoint.path_for(rig.SCAN_DIR, rig.job_id)
+    _, samples, _, _ = checkpoint.load(path)
+    params = {"height": None, "pan_offset": 0.0, "tilt_offset": 0.0, "backlash": None}
+    np.testing.assert_allclose(np.c_[batch.load_points(path, params)],
+                               np.asarray(samples, float)[:, 3:], atol=1e-9)
@@ -0,0 +1,53 @@
+import os, json
+import numpy as np
+from lidarscan import batch, checkpoint
+
+PARAMS = {"grid": 2.0, "threshold": 5.0, "height": None, "pan_offset": 0.0,
+          "tilt_offset": 0.0, "backlash": None, "filter": True, "plots": False,
+          "mesh": "grid"}
+
+
+def _scan(sim, route):
+    sim.run_scan(poses=route, process=False)
+    return checkpoint.path_for(sim.SCAN_DIR, sim.job_id)
+
+
+def test_cache_keys_follow_inputs_and_params(tmp_path):
+    path = tmp_path / "cloud.csv"
+    path.write_text("x,y,z\n0,0,1\n")
+    key = batch.cache_key(str(path), PARAMS)
+    assert batch.cache_key(str(path), dict(PARAMS)) == key
+    assert batch.cache_key(str(path), dict(PARAMS, grid=1.0)) != key
+    path.write_text("x,y,z\n0,0,2\n")
+    assert batch.cache_key(str(path), PARAMS) != key
+
+    table = tmp_path / "backlash.json"
+    table.write_text(json.dumps({"pan": []}))
+    with_table = batch.cache_key(str(path), dict(PARAMS, backlash=str(table)))
+    table.write_text(json.dumps({"pan": [1]}))          # recalibrated in place
+    assert batch.cache_key(str(path), dict(PARAMS, backlash=str(table))) != with_table
+
+
+def test_checkpoints_are_projected_like_the_scan(sim, route):
+    path = _scan(sim, route)
+    _, samples, _, _ = checkpoint.load(path)
+    stored = np.asarray(samples, float)[:, 3:]
+    np.testing.assert_allclose(np.c_[batch.load_points(path, PARAMS)], stored, atol=1e-9)
+
+    higher = batch.load_points(path, dict(PARAMS, height=sim.HEIGHT_CM + 10))
+    np.testing.assert_allclose(higher[2], stored[:, 2] + 10)
+    turned = batch.load_points(path, dict(PARAMS, pan_offset=5.0))
+    assert not np.allclose(turned[0], stored[:, 0])
+    np.testing.assert_allclose(turned[1], stored[:, 1])     # pan does not move y
+
+
+def test_outputs_are_reused_until_forced(sim, route, tmp_path):
+    path = _scan(sim, route)
+    out = str(tmp_path / "out")
+    [(_, folder, status)] = batch.run([os.path.dirname(path)], PARAMS, out, jobs=1)
+    assert status == "done"
+    manifest = json.load(open(os.path.join(folder, batch.MANIFEST)))
+    assert manifest["points"] == len(route)
+    assert batch.run([path], PARAMS, out, jobs=1) == [(path, folder, "cached")]
+    assert batch.run([path], PARAMS, out, jobs=1, force=True)[0][2] == "done"
+    assert batch.run([path], dict(PARAMS, grid=1.0), out, jobs=1)[0][2] == "done"
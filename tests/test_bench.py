@@ -0,0 +1,31 @@
+import numpy as np
+import bench
+from lidarscan import scanner
+
+
+def test_build_grid_keeps_the_highest_sample_per_cell():
+    xs, ys, zs = bench.make_cloud(5000)
+    got = scanner.build_grid(xs, ys, zs)
+    zf = zs - np.c_[xs, ys, np.ones_like(xs)] @ np.linalg.lstsq(
+        np.c_[xs, ys, np.ones_like(xs)], zs, rcond=None)[0]
+    want = np.full(got["grid"].shape, np.nan)
+    for x, y, z in zip(xs, ys, zf):     # the per-point loop it replaced
+        i = int((x - got["x0"]) / scanner.GRID_SIZE)
+        j = int((y - got["y0"]) / scanner.GRID_SIZE)
+        if np.isnan(want[j, i]) or z > want[j, i]:
+            want[j, i] = z
+    assert np.allclose(got["grid"], want, equal_nan=True)
+
+
+def test_sizes_a_stage_skipped_count_as_regressions(monkeypatch):
+    def run():
+        return bench.run(sizes=(2000,), stages=["fit_lstsq", "stl_tin"], repeat=1,
+                         memory=False, log=lambda s: None)
+
+    out = run()
+    base = {"results": {name: dict(r, **{"5000": {"seconds": 1.0, "peak_mb": None}})
+                        for name, r in out["results"].items()}}
+    assert bench.compare(out, base) == []
+
+    monkeypatch.setitem(bench.STAGES, "stl_tin", bench.STAGES["stl_tin"][:2] + (1000,))
+    assert [r[:3] for r in bench.compare(run(), base)] == [("stl_tin", "2000", "skipped")]
@@ -0,0 +1,65 @@
+import numpy as np
+from lidarscan import buildings, heightmap
+
+
+def _flood(mask):
+    """Reference 4-connected labelling: a plain flood fill."""
+    labels = np.zeros(mask.shape, int)
+    n = 0
+    for start in zip(*np.nonzero(mask)):
+        if labels[start]:
+            continue
+        n += 1
+        stack = [start]
+        while stack:
+            j, i = stack.pop()
+            if (0 <= j < mask.shape[0] and 0 <= i < mask.shape[1]
+                    and mask[j, i] and not labels[j, i]):
+                labels[j, i] = n
+                stack += [(j + 1, i), (j - 1, i), (j, i + 1), (j, i - 1)]
+    return labels, n
+
+
+def _same_partition(a, b):
+    pairs = set(zip(a.ravel().tolist(), b.ravel().tolist()))
+    return len(pairs) == len({p[0] for p in pairs}) == len({p[1] for p in pairs})
+
+
+def test_label_matches_a_flood_fill():
+    rng = np.random.default_rng(0)
+    for density in (0.3, 0.55, 0.8):
+        mask = rng.random((40, 60)) < density
+        labels, count = heightmap.label(mask)
+        want, n = _flood(mask)
+        assert count == n and _same_partition(labels, want)
+
+
+def test_segment_describes_each_building():
+    grid = np.zeros((12, 16))
+    grid[2:5, 2:6] = 10.0               # 3 x 4 box
+    grid[3, 3] = 14.0
+    grid[7:11, 9:11] = 6.0              # L: 4 x 2 column plus a 2 x 2 foot
+    grid[9:11, 11:13] = 6.0
+    grid[6, 6] = grid[5, 7] = 9.0       # diagonal neighbours: not one building
+    grid[0, 14:16] = 20.0               # 2 cells: noise
+    grid[2, 10] = np.nan
+
+    labels, found = buildings.segment(grid, -8.0, 4.0, 2.0, threshold=5.0)
+    assert len(found) == 2 and labels.max() == 2
+    box, ell = found
+    assert (box["cells"], box["area_cm2"]) == (12, 48.0)
+    assert box["max_height_cm"] == 14.0
+    assert box["mean_height_cm"] == (11 * 10.0 + 14.0) / 12
+    assert box["centroid"] == [-8.0 + 4.0 * 2.0, 4.0 + 3.5 * 2.0]
+    assert box["outline"] == [[-4.0, 8.0], [4.0, 8.0], [4.0, 14.0], [-4.0, 14.0]]
+
+    assert ell["cells"] == 12 and len(ell["outline"]) == 6
+    xs, ys = np.array(ell["outline"]).T
+    area = 0.5 * np.sum(xs * np.roll(ys, -1) - np.roll(xs, -1) * ys)
+    assert area == ell["area_cm2"]      # closed and counter-clockwise
+    assert (labels[grid <= 5.0] == 0).all() and labels[0, 14] == 0
+
+
+def test_flat_ground_has_no_buildings():
+    labels, found = buildings.segment(np.full((5, 5), np.nan), 0.0, 0.0, 1.0, 5.0)
+    assert found == [] and not labels.any()
@@ -0,0 +1,57 @@
+import os, time
+import pytest
+from lidarscan import planner, heads
+
+
+def test_simulated_scans_leave_the_rig_calibration_alone(sim, route):
+    sim.CALIBRATE = True
+    sim.run_scan(poses=route, process=False)
+    assert not os.path.exists(planner.CALIBRATION_FILE)
+
+
+def test_simulated_timings_are_not_saved_later(sim, route):
+    sim.CALIBRATE = True
+    sim.run_scan(poses=route, process=False)
+    planner.save_calibration()      # as after the next real scan
+    stored = planner.load_calibration()
+    assert all(n == 0 for _, n in stored.values())
+
+
+def _rig():
+    configs = [dict(c, poses=[(p, t) for t in (-6, 0, 6) for p in range(-20, 21, 2)])
+               for c in heads.HEADS]
+    return heads.open_heads(configs, simulate=True, realtime=False)
+
+
+def test_simulated_multi_head_scan_leaves_calibration_alone(sim):
+    sim.CALIBRATE = True
+    heads.run_multi_scan(_rig(), process=False)
+    assert not os.path.exists(planner.CALIBRATION_FILE)
+
+
+def test_failed_head_stops_the_others(sim, monkeypatch):
+    a, b = _rig()
+    read = sim.read_lidar
+    calls = []
+
+    def flaky(port=None):
+        if port is a.port:
+            calls.append(port)
+            if len(calls) > 3:
+                raise OSError("sensor unplugged")
+        else:
+            time.sleep(0.002)
+        return read(port)
+
+    monkeypatch.setattr(sim, "read_lidar", flaky)
+    with pytest.raises(RuntimeError, match="head a failed"):
+        heads.run_multi_scan([a, b], process=False)
+    assert b.error is None and b.done < len(b.poses)
+    assert not a.port.is_open and not b.port.is_open
+
+
+def test_multi_head_scan_closes_only_the_ports_it_opened(sim):
+    rig = _rig()
+    rig[0].port, rig[0].owns_port = sim.ser, False     # scanner's own UART
+    heads.run_multi_scan(rig, process=False)
+    assert sim.ser.is_open and not rig[1].port.is_open
@@ -0,0 +1,80 @@
+import os
+import numpy as np
+from lidarscan import app, changes, planner, simulator, spatial
+
+
+def test_patch_regrids_only_the_changed_regions(table):
+    ref = changes.build_reference(*table(20000, 0), cell=2.0)
+    new = table(20000, 1, [(-10, -6, 4, 6, 8.0)])
+    _, regions = changes.detect(ref, *new)
+    assert regions
+
+    out, removed, added = changes.patch(ref, regions, *new)
+    assert removed and added
+
+    touched = np.zeros(ref["grid"].shape, bool)
+    for r in regions:
+        i0, j0, i1, j1 = r["bbox"]
+        m = changes.PATCH_MARGIN
+        touched[max(j0 - m, 0):j1 + m + 1, max(i0 - m, 0):i1 + m + 1] = True
+    full = changes.grid_in_reference(out, out["xs"], out["ys"], out["zs"])
+    np.testing.assert_array_equal(out["grid"][touched], full[touched])
+    np.testing.assert_array_equal(out["grid"][~touched], ref["grid"][~touched])
+    assert np.nanmax(out["grid"]) > 7.0
+
+
+def test_update_reindexes_only_the_touched_cells(tmp_path, table):
+    xs, ys, zs = table(5000, 0)
+    ref = changes.build_reference(xs, ys, zs, cell=2.0)
+    g = {k: ref[k] for k in ("grid", "x0", "y0", "cell")}
+    path = str(tmp_path / "a" / spatial.INDEX_DIR)
+    spatial.build(path, xs, ys, zs, g)
+
+    new = table(5000, 1, [(-10, -6, 4, 6, 8.0)])
+    _, regions = changes.detect(ref, *new)
+    out, _, _ = changes.patch(ref, regions, *new)
+    g["grid"] = out["grid"]
+    moved = str(tmp_path / "b" / spatial.INDEX_DIR)
+    spatial.update(moved, out["xs"], out["ys"], out["zs"], g,
+                   changes.touched_cells(ref, regions), base=path)
+    full = str(tmp_path / "c" / spatial.INDEX_DIR)
+    spatial.build(full, out["xs"], out["ys"], out["zs"], g)
+
+    got, want = spatial.SpatialIndex(moved), spatial.SpatialIndex(full)
+    np.testing.assert_array_equal(got.offsets, want.offsets)
+    np.testing.assert_array_equal(got.points, want.points)
+    np.testing.assert_array_equal(got.heights, want.heights)
+
+
+def test_incremental_rescan_publishes_the_patched_grid(sim, monkeypatch):
+    for name, value in (("PAN_MIN", -30), ("PAN_MAX", 30), ("TILT_MIN", -12), ("TILT_MAX", 12)):
+        monkeypatch.setattr(sim, name, value)
+    monkeypatch.setattr(changes, "last_report", None)
+    simulator.install(scene=[])
+    sim.run_scan(poses=planner.serpentine(-30, 30, 2, -12, 12, 2))
+    changes.reference_from_csv()
+
+    def rerun(*args, **kwargs):
+        raise AssertionError("processed the whole cloud again")
+    monkeypatch.setattr(sim, "process_scan", rerun)
+    builds = []
+    build = spatial.build
+    monkeypatch.setattr(spatial, "build", lambda *a, **k: builds.append(a[0]) or build(*a, **k))
+    for scene in (simulator.DEFAULT_SCENE, simulator.DEFAULT_SCENE[:1]):
+        simulator.install(scene=scene)
+        report = changes.incremental_rescan(coarse_step=3, fine_step=2)
+        assert report["regions"]
+        ref = changes.load_reference()
+        assert ref["job"] == sim.job_id
+        assert sim.last_grid["grid"] is not None
+        np.testing.assert_array_equal(sim.last_grid["grid"], ref["grid"])
+        idx = spatial.open_job(sim.SCAN_DIR, sim.job_id)
+        assert idx.meta["points"] == len(ref["xs"])
+    assert os.path.exists(sim.STL_NAME)
+    assert len(builds) == 1             # the second rescan re-indexed the touched cells only
+
+
+def test_reference_needs_a_full_scan(sim):
+    r = app.app.test_client().post("/reference")
+    assert r.status_code == 404
+    assert "scan_points.csv" in r.get_json()["error"]
@@ -0,0 +1,22 @@
+import pytest
+from lidarscan import config
+
+
+def test_optional_field_parses_as_float():
+    cfg = config.ScanConfig().parse(["tin_max_edge=5"])
+    assert cfg.tin_max_edge == 5.0 and isinstance(cfg.tin_max_edge, float)
+
+
+def test_none_clears_optional_field():
+    cfg = config.ScanConfig(tin_max_edge=5.0).parse(["tin_max_edge=none"])
+    assert cfg.tin_max_edge is None
+
+
+def test_measurements_accept_fractions():
+    cfg = config.ScanConfig().parse(["height_cm=72.5", "building_threshold=2.5", "pan_step=2"])
+    assert (cfg.height_cm, cfg.building_threshold, cfg.pan_step) == (72.5, 2.5, 2)
+
+
+def test_bad_value_names_the_field():
+    with pytest.raises(ValueError, match="pan_step"):
+        config.ScanConfig().parse(["pan_step=wide"])
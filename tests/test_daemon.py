@@ -0,0 +1,45 @@
+import os, stat, threading
+import pytest
+from lidarscan import daemon
+
+
+class Scanner(daemon.LocalScanner):
+    """Answers as a daemon that has finished one scan and one rescan."""
+
+    def metrics(self):
+        return "scanner_stage_seconds_count 3\n"
+
+    def timings(self, job=None):
+        return {"job": job or "20260101-000000", "stages": {"acquire": 1.5}} if job != "nope" else None
+
+    def changes(self):
+        return {"regions": [{"cells": 4}]}
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / "d.sock")
+    server = daemon.make_server(path, Scanner())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path, daemon.DaemonClient(path)
+    server.shutdown()
+    server.server_close()
+
+
+def test_socket_is_never_world_accessible(client):
+    path, _ = client
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o660
+
+
+def test_frontend_routes_read_the_daemon(client, monkeypatch):
+    from lidarscan import app
+    path, proxy = client
+    monkeypatch.setattr(app, "backend", proxy)
+    monkeypatch.setattr(app, "DAEMON", path)
+    c = app.app.test_client()
+    assert "scanner_stage_seconds_count 3" in c.get("/metrics").get_data(as_text=True)
+    assert c.get("/timings").get_json()["stages"] == {"acquire": 1.5}
+    assert c.get("/timings/20260102-000000").get_json()["job"] == "20260102-000000"
+    assert c.get("/timings/nope").status_code == 404
+    assert c.get("/changes").get_json() == {"regions": [{"cells": 4}]}
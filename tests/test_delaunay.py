@@ -0,0 +1,77 @@
+import struct
+import numpy as np
+import pytest
+from lidarscan import delaunay, mesh, scanner
+
+
+def _random(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 50, n), rng.uniform(0, 30, n)
+
+
+def _grid(k=12, step=2.0):
+    xs, ys = np.meshgrid(np.arange(k) * step, np.arange(k) * step)
+    return xs.ravel(), ys.ravel()
+
+
+def _hull_size(xs, ys):
+    """Points on the convex hull, collinear ones included (monotone chain)."""
+    pts = sorted(set(zip(xs.tolist(), ys.tolist())))
+
+    def half(points):
+        out = []
+        for p in points:
+            while len(out) >= 2 and ((out[-1][0] - out[-2][0]) * (p[1] - out[-2][1])
+                                     - (out[-1][1] - out[-2][1]) * (p[0] - out[-2][0])) < 0:
+                out.pop()
+            out.append(p)
+        return out[:-1]
+
+    return len(half(pts) + half(pts[::-1]))
+
+
+def _area2(tris, xs, ys):
+    a, b, c = (np.stack([xs, ys], axis=1)[tris[:, k]] for k in range(3))
+    return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+
+@pytest.mark.parametrize("points", [_random(), _random(40, 1), _grid(), _grid(3)],
+                         ids=["random", "random-small", "grid", "grid-small"])
+def test_triangulation_is_delaunay(points):
+    xs, ys = points
+    tris = delaunay.triangulate(xs, ys)
+    assert len(tris) == 2 * len(xs) - 2 - _hull_size(xs, ys)
+    assert set(tris.ravel()) == set(range(len(xs)))
+    assert (_area2(tris, xs, ys) > 0).all()             # counter-clockwise
+
+    p = np.stack([xs, ys], axis=1)
+    for t in tris:
+        a, b, c = p[t]
+        d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+        centre = np.array([
+            (a @ a * (b[1] - c[1]) + b @ b * (c[1] - a[1]) + c @ c * (a[1] - b[1])) / d,
+            (a @ a * (c[0] - b[0]) + b @ b * (a[0] - c[0]) + c @ c * (b[0] - a[0])) / d])
+        r2 = ((a - centre) ** 2).sum()
+        inside = ((p - centre) ** 2).sum(axis=1) < r2 * (1 - 1e-9)
+        assert not inside.any()                         # empty circumcircle
+
+
+def test_degenerate_input_gives_no_triangles():
+    assert len(delaunay.triangulate([0.0, 1.0], [0.0, 1.0])) == 0
+    assert len(delaunay.triangulate(np.arange(5.0), np.arange(5.0))) == 0
+
+
+def test_save_tin_writes_the_triangulation(tmp_path):
+    xs, ys = _random(200, 2)
+    zs = 0.1 * xs + np.where((xs > 20) & (xs < 30), 8.0, 0.0)
+    path = str(tmp_path / "tin.stl")
+    scanner.save_tin(xs, ys, zs, path, max_edge=np.inf)
+
+    with open(path, "rb") as f:
+        f.seek(80)
+        count, = struct.unpack("<I", f.read(4))
+    facets = np.fromfile(path, mesh.FACET, offset=84)
+    assert count == len(facets) == len(delaunay.triangulate(xs, ys))
+    assert (facets["normal"][:, 2] > 0).all()          # up-facing
+    assert set(map(tuple, facets["vertex"][:, :, :2].reshape(-1, 2).round(3))) == \
+        set(zip(xs.astype("<f4").round(3), ys.astype("<f4").round(3)))
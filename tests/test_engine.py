@@ -0,0 +1,43 @@
+import numpy as np
+from lidarscan import engine, metrics, simulator
+
+
+def _stream():
+    stream = engine.FrameStream(None)
+    got = []
+    stream._deliver = lambda t, dist: got.append(dist)
+    return stream, got
+
+
+def test_frames_resync_after_noise_and_split_reads():
+    stream, got = _stream()
+    data = b"\x00Y\x13" + simulator.frame(120) + b"YY\x01" + simulator.frame(345)
+    for k in range(0, len(data), 4):        # frames cut across reads
+        stream.feed(data[k:k + 4])
+    assert got == [120, 345]
+    assert len(stream.buf) < engine.FRAME_SIZE
+
+
+def test_frames_with_a_bad_checksum_are_skipped():
+    stream, got = _stream()
+    bad = bytearray(simulator.frame(500))
+    bad[-1] ^= 0xff
+    stream.feed(bytes(bad) + simulator.frame(77) + simulator.frame(78))
+    assert got == [77, 78]
+
+
+def test_engine_scans_the_simulated_rig(sim, route, monkeypatch):
+    monkeypatch.setattr(sim, "SERVO_STEP_S", 0.0)
+    monkeypatch.setattr(sim, "SETTLE_S", 0.001)
+    scan = engine.ScanEngine()
+    job = scan.submit(route, process=False)
+    scan.wait(timeout=60)
+    st = scan.status()
+    assert (st["job"], st["scanning"], st["error"]) == (job, False, None)
+    assert st["samples"] == len(route) and st["progress"] == 100
+    assert scan.live_map.samples == len(route)
+    assert np.isfinite(scan.live_map.grid()["grid"]).any()
+
+    totals = metrics.job_timings(job)["totals"]
+    assert totals["scanner_pose_move_seconds:tilt"] > 0
+    assert totals["scanner_pose_move_seconds:pan"] > 0
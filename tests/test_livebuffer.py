@@ -0,0 +1,72 @@
+import os, threading
+from multiprocessing import shared_memory
+import numpy as np
+import pytest
+from lidarscan import livebuffer
+
+
+@pytest.fixture
+def name():
+    """A segment name of its own; the writer is closed afterwards."""
+    yield "lidarscan_test_%d" % os.getpid()
+    livebuffer._close_current()
+
+
+def test_reader_follows_a_scan(name):
+    w = livebuffer.publish("job-1", 5, [1.0, 2.0], [3.0, 4.0], [5.0, 6.0], name=name)
+    r = livebuffer.LiveReader(name)
+    st = r.status()
+    assert (st["job"], st["state"], st["count"], st["total"], st["progress"]) == \
+        ("job-1", "scanning", 2, 5, 40)
+    assert r.wait(2, timeout=0.05) is None
+
+    for k in range(5):
+        w.append(k, k, k)
+    st = r.wait(2, timeout=1)
+    assert (st["count"], st["dropped"]) == (5, 2)           # capacity is the route
+    np.testing.assert_array_equal(r.points(1, 3), [[2, 4, 6], [0, 0, 0]])
+    w.finish()
+    assert r.status()["state"] == "done"
+    r.close()
+
+
+def test_a_new_scan_supersedes_the_old_segment(name):
+    livebuffer.publish("job-1", 3, name=name).append(1, 2, 3)
+    r = livebuffer.LiveReader(name)
+    assert r.status()["job"] == "job-1"
+    old = r.points()                                        # a view into the old mapping
+    livebuffer.publish("job-2", 4, name=name)
+    st = r.status()
+    assert (st["job"], st["count"], st["total"]) == ("job-2", 0, 4)
+    assert old.tolist() == [[1, 2, 3]]                      # still readable
+    r.close()
+
+
+def test_appends_from_several_threads(name):
+    w = livebuffer.publish("multi", 2000, name=name)
+
+    def head(k):
+        for i in range(500):
+            w.append(k, i, 0.0)
+
+    threads = [threading.Thread(target=head, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with livebuffer.LiveReader(name) as r:
+        assert r.status()["count"] == 2000 and r.status()["seq"] % 2 == 0
+        pts = r.points()
+        for k in range(4):
+            assert sorted(pts[pts[:, 0] == k, 1].tolist()) == list(range(500))
+
+
+def test_stale_segment_is_replaced(name):
+    stale = shared_memory.SharedMemory(name, create=True, size=64)
+    try:
+        w = livebuffer.publish("fresh", 10, name=name)
+        assert w is not None
+        with livebuffer.LiveReader(name) as r:
+            assert r.status()["job"] == "fresh"
+    finally:
+        stale.close()
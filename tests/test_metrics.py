@@ -0,0 +1,91 @@
+import pytest
+from lidarscan import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """A fresh registry per test."""
+    monkeypatch.setattr(metrics, "_families", {name: {} for name in metrics.HELP})
+    monkeypatch.setattr(metrics, "counters", {})
+    monkeypatch.setattr(metrics, "jobs", metrics.OrderedDict())
+    monkeypatch.setattr(metrics, "current_job", None)
+
+
+def _samples(text):
+    """{metric{labels}: value} of the sample lines."""
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_histograms_render_cumulative_buckets():
+    for s in (0.001, 0.003, 0.003, 7.0, 500.0):
+        metrics.observe("scanner_pose_move_seconds", s, axis="pan")
+    metrics.observe("scanner_pose_move_seconds", 0.2, axis="tilt")
+    text = metrics.render_prometheus()
+    got = _samples(text)
+
+    pan = 'scanner_pose_move_seconds_bucket{axis="pan",le="%s"}'
+    assert got[pan % "0.001"] == "1"                    # a bound is inclusive
+    assert got[pan % "0.0025"] == "1"
+    assert got[pan % "0.005"] == "3"
+    assert got[pan % "10.0"] == "4"
+    assert got[pan % "300.0"] == "4"
+    assert got[pan % "+Inf"] == "5"
+    assert got['scanner_pose_move_seconds_count{axis="pan"}'] == "5"
+    assert float(got['scanner_pose_move_seconds_sum{axis="pan"}']) == pytest.approx(507.007)
+    assert got['scanner_pose_move_seconds_count{axis="tilt"}'] == "1"
+    assert "# TYPE scanner_pose_move_seconds histogram" in text
+    assert "# HELP scanner_pose_move_seconds " + metrics.HELP["scanner_pose_move_seconds"] in text
+
+
+def test_counters_and_prefix_filter():
+    metrics.count("scanner_servo_degrees_total", 30)
+    metrics.count("scanner_servo_degrees_total", 12.5)
+    metrics.count("app_artifact_misses_total")
+    metrics.record_stage("grid", 0.02)
+    text = metrics.render_prometheus("scanner_servo")
+    assert "# TYPE scanner_servo_degrees_total counter" in text
+    assert _samples(text) == {"scanner_servo_degrees_total": "42.5"}
+
+    full = _samples(metrics.render_prometheus())
+    assert full["app_artifact_misses_total"] == "1"
+    assert full['scanner_stage_seconds_count{stage="grid"}'] == "1"
+
+
+def test_job_breakdown(monkeypatch):
+    assert metrics.job_timings() is None
+    metrics.begin_job("j1")
+    with metrics.stage("stl_write"):
+        pass
+    metrics.record_stage("acquire", 1.5)
+    metrics.record_stage("acquire", 0.5)
+    metrics.observe("scanner_sensor_wait_seconds", 0.25)
+    metrics.observe("scanner_pose_move_seconds", 0.5, axis="tilt")
+    metrics.count_pose()
+    metrics.count_pose()
+    running = metrics.job_timings("j1")
+    assert running["running"] is True
+    metrics.end_job()
+
+    t = metrics.job_timings()
+    assert t["job"] == "j1" and t["poses"] == 2 and "running" not in t
+    assert t["stages"]["acquire"] == 2.0 and "stl_write" in t["stages"]
+    assert t["totals"] == {"scanner_sensor_wait_seconds": 0.25,
+                           "scanner_pose_move_seconds:tilt": 0.5}
+    assert metrics.job_timings("nope") is None
+
+    monkeypatch.setattr(metrics, "KEEP_JOBS", 2)
+    for job in ("j2", "j3"):
+        metrics.begin_job(job)
+        metrics.end_job()
+    assert list(metrics.jobs) == ["j2", "j3"]
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    metrics.begin_job("j1")
+    metrics.observe("scanner_sensor_wait_seconds", 0.1)
+    metrics.count("scanner_servo_degrees_total", 5)
+    with metrics.stage("grid"):
+        pass
+    assert metrics.job_timings() is None
+    assert _samples(metrics.render_prometheus()) == {}
@@ -0,0 +1,48 @@
+import pytest
+from lidarscan import app
+
+
+@pytest.fixture
+def client(sim):
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("body", [
+    {"pan": [20, -20, 1]},
+    {"pan": [-20, 20, 0]},
+    {"pan": [-20, 20]},
+    {"tilt": ["a", 10, 1]},
+    {"tilt": 5},
+])
+def test_estimate_rejects_bad_ranges(client, body):
+    assert client.post("/plan/estimate", json=body).status_code == 400
+
+
+@pytest.mark.parametrize("body", [
+    {"budget_s": 60, "pan": [10]},
+    {"budget_s": 60, "pan": [20, -20]},
+    {"budget_s": 60, "tilt": None},
+    {"budget_s": "soon"},
+    {"budget_s": 0},
+])
+def test_suggest_rejects_bad_input(client, body):
+    assert client.post("/plan/suggest", json=body).status_code == 400
+
+
+@pytest.mark.parametrize("body", [
+    {"rect": {"pan_min": -5, "pan_max": 5, "tilt_min": -5, "tilt_max": 5}, "step": 0},
+    {"rect": {"pan_min": -5, "pan_max": 5, "tilt_min": -5, "tilt_max": 5}, "step": "x"},
+    {"rect": {"pan_min": 5, "pan_max": -5, "tilt_min": -5, "tilt_max": 5}},
+    {"rect": {"pan_min": -5, "pan_max": 5}},
+    {"polygon": [[0, 0], [10, 0]]},
+    {"polygon": "square"},
+])
+def test_plan_rejects_bad_input(client, body):
+    assert client.post("/plan", json=body).status_code == 400
+
+
+def test_valid_requests_still_plan(client):
+    assert client.post("/plan/estimate", json={"pan": [-10, 10, 2], "tilt": [-5, 5, 1]}).status_code == 200
+    assert client.post("/plan/suggest", json={"budget_s": 60, "pan": [-10, 10]}).status_code == 200
+    r = client.post("/plan", json={"rect": {"pan_min": -2, "pan_max": 2, "tilt_min": -1, "tilt_max": 1}})
+    assert r.status_code == 200 and len(r.get_json()["poses"]) == 15
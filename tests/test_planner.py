@@ -0,0 +1,51 @@
+import random
+import pytest
+from lidarscan import planner
+
+MODEL = planner.MoveModel()
+
+
+def _cost(route):
+    return planner.route_cost(route, MODEL)
+
+
+def test_serpentine_keeps_the_legacy_order():
+    poses = planner.serpentine(-2, 2, 1, -1, 1, 1)
+    assert poses[:5] == [(-2, -1), (-1, -1), (0, -1), (1, -1), (2, -1)]     # odd tilt: up
+    assert poses[5:10] == [(2, 0), (1, 0), (0, 0), (-1, 0), (-2, 0)]       # even tilt: down
+    assert planner.split_rows(poses) == [(-1, [-2, -1, 0, 1, 2]), (0, [2, 1, 0, -1, -2]),
+                                         (1, [-2, -1, 0, 1, 2])]
+
+
+def test_rectangles_are_scanned_as_a_serpentine():
+    poses = planner.rectangle_poses(-20, 20, -6, 6, 2)
+    route = planner.order(poses, MODEL)
+    assert sorted(route) == sorted(poses)
+    rows = planner.split_rows(route)
+    assert len(rows) == 7                           # one tilt change per row
+    for tilt, pans in rows:
+        assert sorted(pans) in (pans, pans[::-1]) and len(pans) == 21
+    assert _cost(route) <= _cost(poses)
+
+
+def test_scattered_cells_get_a_shorter_tour():
+    rng = random.Random(0)
+    poses = [(rng.randrange(-40, 41), rng.randrange(-15, 16)) for _ in range(60)]
+    route = planner.order(poses + poses[:10], MODEL)        # duplicates dropped
+    assert sorted(route) == sorted(set(poses))
+    for major in (0, 1):
+        assert _cost(route) <= _cost(planner._boustrophedon(route, major))
+    shuffled = list(route)
+    rng.shuffle(shuffled)
+    assert _cost(route) < _cost(shuffled)
+
+
+def test_estimate_adds_home_moves_and_frames():
+    route = planner.order(planner.rectangle_poses(-4, 4, 0, 2), MODEL)
+    step = planner.estimate(route, MODEL)
+    assert step == pytest.approx(planner.HOME_S + _cost(route)
+                                 + len(route) * MODEL.sensor_s)
+    m = planner.SCAN_MODES["average"]
+    extra = len(route) * (m["frames"] - 1) / m["frame_rate"]
+    assert planner.estimate(route, MODEL, "average") == pytest.approx(step + extra)
+    assert planner.order([], MODEL) == [] and planner.route_cost([], MODEL) == 0.0
@@ -0,0 +1,57 @@
+import gzip
+import numpy as np
+import pytest
+from lidarscan import pointcodec, tiles
+
+
+@pytest.fixture
+def cloud(table):
+    return table(5000, 0, [(-10, -6, 4, 6, 8.0)])
+
+
+def _close(got, want, step):
+    """Within half a step per axis, plus the float32 rounding of the
+    header's min and step."""
+    return (np.abs(got - want) <= step / 2 + 1e-5).all()
+
+
+def test_round_trip_within_half_a_step(cloud):
+    xs, ys, zs = cloud
+    _, lo, step = pointcodec.quantize(xs, ys, zs)
+    gx, gy, gz, colour = pointcodec.decode(pointcodec.encode(xs, ys, zs, delta=False))
+    assert _close(np.c_[gx, gy, gz], np.c_[xs, ys, zs], step)
+    assert colour[np.argmin(zs)] == 0 and colour[np.argmax(zs)] == 255
+
+
+def test_delta_payload_holds_the_same_points(cloud):
+    xs, ys, zs = cloud
+    q, _, step = pointcodec.quantize(xs, ys, zs)
+    order = np.lexsort((q[:, 2], q[:, 0], q[:, 1]))         # the encoder's sort
+    payload = pointcodec.encode(xs, ys, zs, delta=True, colour_by=xs)
+    gx, gy, gz, colour = pointcodec.decode(payload)
+    assert _close(np.c_[gx, gy, gz], np.c_[xs, ys, zs][order], step)
+    assert (np.diff(colour[np.argsort(gx)].astype(int)) >= 0).all()   # coloured by x
+
+    flat = pointcodec.encode(xs, ys, zs, delta=False)
+    assert len(payload) == len(flat)
+    assert len(gzip.compress(payload)) < len(gzip.compress(flat))
+
+
+def test_payload_layout(cloud):
+    xs, ys, zs = cloud
+    lut = tiles.lut("magma")
+    payload = pointcodec.encode(xs, ys, zs, lut=lut)
+    n = len(xs)
+    assert len(payload) == pointcodec.HEADER.size + 7 * n + 256 * 3
+    assert payload[:4] == pointcodec.MAGIC
+    assert payload[-768:] == lut[:256, :3].tobytes()
+    with pytest.raises(ValueError):
+        pointcodec.decode(b"LPTF" + payload[4:])
+
+
+def test_compress_falls_back_to_gzip(cloud, monkeypatch):
+    payload = pointcodec.encode(*cloud)
+    body, encoding = pointcodec.compress(payload, "gzip, deflate")
+    assert encoding == "gzip" and gzip.decompress(body) == payload
+    monkeypatch.setattr(pointcodec, "zstandard", None)
+    assert pointcodec.compress(payload, "zstd, gzip")[1] == "gzip"
@@ -0,0 +1,79 @@
+import threading
+import pytest
+from lidarscan import daemon
+
+
+def _interrupted(sim, monkeypatch, route, after=60):
+    """Start a scan of `route` that dies after `after` samples; its job id."""
+    read = sim.read_lidar
+    calls = []
+
+    def dying(port=None):
+        calls.append(1)
+        if len(calls) > after:
+            raise OSError("sensor unplugged")
+        return read(port)
+
+    monkeypatch.setattr(sim, "read_lidar", dying)
+    with pytest.raises(OSError):
+        sim.run_scan(poses=route, process=False)
+    monkeypatch.setattr(sim, "read_lidar", read)
+    return sim.job_id
+
+
+def test_resume_uses_the_job_settings_only_while_it_runs(sim, monkeypatch, route):
+    monkeypatch.setattr(sim, "GRID_SIZE", 4.0)
+    job = _interrupted(sim, monkeypatch, route)
+    sim.GRID_SIZE = 2.0
+
+    xs, _, _ = sim.run_scan(resume=job)
+    assert len(xs) == len(route)
+    assert sim.last_grid["cell"] == 4.0
+    assert sim.GRID_SIZE == 2.0
+
+
+def test_failed_resume_shows_in_status(sim):
+    local = daemon.LocalScanner()
+    assert local.submit("resume", job="no-such-job")["status"] == "resumed"
+    local.thread.join()
+    st = local.status()
+    assert st["scanning"] is False
+    assert st["job"] == "no-such-job" and "FileNotFoundError" in st["error"]
+    assert not local.busy()
+
+
+def test_bad_job_ids_are_refused_before_a_thread_starts(sim, monkeypatch, tmp_path):
+    from lidarscan import app
+    local = daemon.LocalScanner()
+    with pytest.raises(ValueError):
+        local.submit("resume", job="..")
+    assert local.thread is None
+
+    server = daemon.make_server(str(tmp_path / "d.sock"), local)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with pytest.raises(daemon.DaemonError, match="bad job id"):
+            daemon.DaemonClient(str(tmp_path / "d.sock")).submit("resume", job="..")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert local.thread is None
+
+    monkeypatch.setattr(app, "backend", local)
+    assert app.app.test_client().get("/resume/..").status_code == 400
+    assert local.thread is None
+
+
+def test_status_follows_the_latest_submit_not_job_names(sim, monkeypatch, route):
+    monkeypatch.setattr(sim, "SERVO_STEP_S", 0.0)
+    monkeypatch.setattr(sim, "SETTLE_S", 0.001)
+    old = _interrupted(sim, monkeypatch, route)
+    local = daemon.LocalScanner()
+    newer = local.submit("scan", poses=route[:5], process=False)["job"]
+    local.engine.wait(timeout=30)
+    assert local.status()["job"] == newer
+
+    assert local.submit("resume", job=old)["status"] == "resumed"    # sorts before newer
+    local.thread.join()
+    st = local.status()
+    assert (st["job"], st["scanning"], st["error"]) == (old, False, None)
@@ -0,0 +1,59 @@
+import os
+import pytest
+from lidarscan import session
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_replay_leaves_the_recorded_job_alone(sim, route):
+    sim.run_scan(record=True, poses=route)
+    job = sim.job_id
+    ckpt = os.path.join(sim.SCAN_DIR, job, "samples.ckpt")
+    before = {p: _read(p) for p in (ckpt, "scan_points.csv", sim.STL_NAME)}
+    index = os.path.getmtime(os.path.join(sim.SCAN_DIR, job, "index", "index.json"))
+
+    first = session.replay(os.path.join(sim.SESSION_DIR, job + ".lses"))
+    second = session.replay(os.path.join(sim.SESSION_DIR, job + ".lses"))
+
+    assert first["job"] == job + "-replay-1"
+    assert second["job"] == job + "-replay-2"
+    assert first["servo_mismatches"] == 0
+    assert {p: _read(p) for p in before} == before
+    assert os.path.getmtime(os.path.join(sim.SCAN_DIR, job, "index", "index.json")) == index
+    for name in ("samples.ckpt", "scan_points.csv", sim.STL_NAME, "index"):
+        assert os.path.exists(os.path.join(sim.SCAN_DIR, first["job"], name))
+
+
+def test_jobs_started_in_one_second_get_their_own_ids(sim):
+    assert sim.claim_job("20260101-000000") == "20260101-000000"
+    assert sim.claim_job("20260101-000000") == "20260101-000000-2"
+
+
+def test_replay_stops_when_the_recording_runs_out(sim, route, monkeypatch):
+    sim.run_scan(record=True, poses=route)
+    path = os.path.join(sim.SESSION_DIR, sim.job_id + ".lses")
+    port = session.ReplaySerial(session.load(path)[1], session.ReplayClock(False))
+    assert sim.read_lidar(port) > 0     # the first pose, as recorded
+    with pytest.raises(EOFError):
+        while True:                     # read_lidar's loop, past its frame
+            port.read()
+    assert port.exhausted == 1
+
+    read = sim.read_lidar
+    monkeypatch.setattr(sim, "read_lidar", lambda port=None: read(port) + read(port))
+    report = session.replay(path)       # a parser wanting twice the data
+    assert report["exhausted_reads"] == 1
+    assert "no recorded data left" in report["error"]
+
+
+def test_coalesced_reads_keep_the_first_read_time(tmp_path, monkeypatch):
+    ticks = iter([0, 100, 250, 900])
+    monkeypatch.setattr(session.time, "monotonic_ns", lambda: next(ticks))
+    rec = session.Recorder(str(tmp_path / "s.lses"))
+    rec.read(b"YY")
+    rec.read(b"\x10\x00")
+    rec.close()
+    assert list(session.read_records(str(tmp_path / "s.lses"))) == [(b"R", 100, b"YY\x10\x00")]
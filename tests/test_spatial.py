@@ -0,0 +1,146 @@
+import os, threading
+import numpy as np
+import pytest
+from lidarscan import spatial
+
+
+@pytest.fixture
+def cloud(table):
+    """A flat floor with an 8 cm ridge, and the grid info it is indexed on."""
+    def make(seed=0):
+        xs, ys, zs = table(2000, seed, [(10, 0, 20, 30, 8.0)], extent=(0, 0, 40, 30),
+                           tilt=(0, 0, 0), noise=0.0)
+        return xs, ys, zs, {"grid": np.zeros((16, 21)), "x0": 0.0, "y0": 0.0, "cell": 2.0}
+    return make
+
+
+def test_rebuilds_swap_atomically(tmp_path, cloud):
+    path = str(tmp_path / "job" / spatial.INDEX_DIR)
+    spatial.build(path, *cloud())
+    errors = []
+
+    def build(seed):
+        try:
+            spatial.build(path, *cloud(seed=seed))
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(50):
+                idx = spatial.open_job(str(tmp_path), "job")
+                assert len(idx.points) == idx.meta["points"] == 2000
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build, args=(s,)) for s in range(6)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert not errors
+    assert os.path.islink(path)
+
+
+def test_replaced_builds_are_pruned(tmp_path, monkeypatch, cloud):
+    monkeypatch.setattr(spatial, "KEEP_OLD_S", -1)
+    path = str(tmp_path / "job" / spatial.INDEX_DIR)
+    for seed in range(3):
+        spatial.build(path, *cloud(seed=seed))
+    assert sorted(os.listdir(tmp_path / "job")) == sorted(
+        [spatial.INDEX_DIR, os.path.basename(os.path.realpath(path))])
+
+
+def test_plain_index_directory_is_replaced(tmp_path, cloud):
+    path = tmp_path / "job" / spatial.INDEX_DIR
+    path.mkdir(parents=True)
+    (path / "index.json").write_text("{}")
+    spatial.build(str(path), *cloud())
+    assert spatial.SpatialIndex(str(path)).meta["points"] == 2000
+
+
+@pytest.mark.parametrize("job", ["..", "../..", "../x", "a/b", ".", "", None, ["x"]])
+def test_job_ids_cannot_leave_the_scan_directory(job, tmp_path):
+    with pytest.raises(ValueError):
+        spatial.open_job(str(tmp_path / "scans"), job)
+
+
+def test_query_routes_reject_traversal(monkeypatch, tmp_path):
+    from lidarscan import app
+    monkeypatch.chdir(tmp_path)
+    c = app.app.test_client()
+    assert c.get("/query/height?job=../..&x=0&y=0").status_code == 404
+    assert c.post("/query/polygon", json={"job": "..", "points": [[0, 0], [1, 0], [1, 1]]}).status_code == 404
+    assert not os.path.exists(tmp_path / "index")
+
+
+class _Backend:
+    def __init__(self, scanning, job):
+        self.st = {"scanning": scanning, "job": job}
+
+    def status(self):
+        return dict(self.st)
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch, cloud):
+    """Two indexed jobs, "old" and "new", in a temporary scan directory."""
+    from lidarscan import scanner
+    scan_dir = str(tmp_path / "scans")
+    monkeypatch.setattr(scanner, "SCAN_DIR", scan_dir)
+    for job in ("old", "new"):
+        spatial.build(spatial.index_dir(scan_dir, job), *cloud(), job=job)
+    return scan_dir
+
+
+def test_queries_wait_for_a_running_scan(jobs, monkeypatch):
+    from lidarscan import app
+    c = app.app.test_client()
+    monkeypatch.setattr(app, "backend", _Backend(True, "new"))
+    assert c.get("/query/height?x=5&y=5").status_code == 409
+    assert c.get("/query/height?job=new&x=5&y=5").status_code == 409
+    assert c.get("/query/height?job=old&x=5&y=5").status_code == 200
+    monkeypatch.setattr(app, "backend", _Backend(False, "new"))
+    assert c.get("/query/height?x=5&y=5").status_code == 200
+
+
+@pytest.mark.parametrize("polygon", [[[0, 0], [1]], [[0, 0], [1, 0], [1, "a"]], [0, 1, 2],
+                                     "abc", {"x": 1}, [[0, 0], [1, 0], [None, 1]]])
+def test_malformed_polygons_are_refused(jobs, monkeypatch, polygon):
+    from lidarscan import app
+    monkeypatch.setattr(app, "backend", _Backend(False, "new"))
+    assert app.app.test_client().post("/query/polygon", json={"polygon": polygon}).status_code == 400
+
+
+def test_profiles_are_capped(jobs, monkeypatch):
+    from lidarscan import app
+    monkeypatch.setattr(app, "backend", _Backend(False, "new"))
+    c = app.app.test_client()
+    r = c.get("/query/profile?x0=0&y0=0&x1=40&y1=30&step=0.000001")
+    assert len(r.get_json()["profile"]) == spatial.MAX_PROFILE + 1
+    assert c.get("/query/profile?x0=0&y0=0&x1=40&y1=30&step=-1").status_code == 400
+    assert len(spatial.open_job(jobs, "new").profile(0, 0, 40, 30)) == 26     # one per cell
+
+
+def test_a_build_does_not_hold_up_other_jobs(jobs, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build(path, scan_dir, job):
+        started.set()
+        release.wait(5)
+        raise FileNotFoundError(job)
+
+    monkeypatch.setattr(spatial, "_build_from_checkpoint", slow_build)
+    os.makedirs(os.path.join(jobs, "building"))
+    t = threading.Thread(target=lambda: pytest.raises(FileNotFoundError, spatial.open_job,
+                                                      jobs, "building"))
+    t.start()
+    try:
+        assert started.wait(5)
+        opened = []
+        other = threading.Thread(target=lambda: opened.append(spatial.open_job(jobs, "old")))
+        other.start()
+        other.join(2)
+        assert [idx.meta["job"] for idx in opened] == ["old"]      # while "building" builds
+    finally:
+        release.set()
+        t.join()
@@ -0,0 +1,59 @@
+import re
+import numpy as np
+import pytest
+from lidarscan import heightmap, mesh, pointcodec, pointfile, scanner, streaming
+
+CHUNK = 1000
+
+
+@pytest.fixture
+def cloud(table, tmp_path):
+    """5000 points with two boxes on the table, as a point file read back
+    (float32, like the in-memory reference below) over five chunks."""
+    path = str(tmp_path / "cloud.pts")
+    pointfile.save(path, *table(5000, 0, [(-30, -10, -14, 4, 12.0), (8, -4, 20, 10, 6.0)]))
+    points = pointfile.open_points(path)[1]
+    xs, ys, zs = np.asarray(points, float).T
+    return points, xs, ys, zs
+
+
+def _ascii_tris(path):
+    with open(path) as f:
+        return np.array(re.findall(r"vertex (\S+) (\S+) (\S+)", f.read()), float).reshape(-1, 3, 3)
+
+
+def test_point_files_are_not_codec_payloads(tmp_path):
+    path = tmp_path / "payload.pts"
+    path.write_bytes(pointcodec.encode([0.0, 1.0], [0.0, 1.0], [0.0, 1.0]))
+    with pytest.raises(ValueError):
+        pointfile.open_points(str(path))
+
+
+def test_chunked_plane_fit_matches_the_whole_cloud(cloud):
+    points, xs, ys, zs = cloud
+    coeffs, bounds = streaming.ground_and_bounds(points, CHUNK)
+    np.testing.assert_allclose(coeffs, heightmap.fit_ground(xs, ys, zs), atol=1e-9)
+    assert bounds == (xs.min(), ys.min(), xs.max(), ys.max())
+
+
+def test_chunked_grid_matches_build_grid(cloud):
+    points, xs, ys, zs = cloud
+    coeffs, bounds = streaming.ground_and_bounds(points, CHUNK)
+    got = streaming.grid_points(points, scanner.GRID_SIZE, coeffs, bounds, CHUNK)
+    want = scanner.build_grid(xs, ys, zs)
+    assert (got["x0"], got["y0"], got["cell"]) == (want["x0"], want["y0"], want["cell"])
+    np.testing.assert_allclose(got["grid"], want["grid"], atol=1e-9)
+
+
+def test_streamed_stl_matches_save_stl(cloud, tmp_path, monkeypatch):
+    points, xs, ys, zs = cloud
+    monkeypatch.setattr(scanner, "STL_WALLS", True)
+    grid_info = scanner.build_grid(xs, ys, zs)
+    scanner.save_stl(xs, ys, zs, grid_info, str(tmp_path / "memory.stl"), mode="grid")
+    n = streaming.write_stl(str(tmp_path / "streamed.stl"), grid_info, walls=True,
+                            threshold=scanner.BUILDING_THRESHOLD)
+
+    want = _ascii_tris(tmp_path / "memory.stl")
+    got = np.fromfile(tmp_path / "streamed.stl", mesh.FACET, offset=84)["vertex"]
+    assert n == len(got) == len(want) > 0
+    np.testing.assert_allclose(got, want, rtol=1e-6, atol=1e-4)
@@ -0,0 +1,68 @@
+import random
+from types import SimpleNamespace
+import pytest
+from lidarscan import planner, scanner, simulator, tfmini
+
+
+class FlakyLink(simulator.SimSerial):
+    """Commands get through at every rate, data frames not at `bad` baud."""
+    bad = 921600
+
+    def _new_frame(self):
+        if self.baudrate == self.bad:
+            self.buf += bytes(random.randrange(256) for _ in range(9))
+        else:
+            super()._new_frame()
+
+
+def _port(cls=simulator.SimSerial):
+    pi = simulator.SimPi()
+    pi.set_servo_pulsewidth(13, 1500)
+    pi.set_servo_pulsewidth(18, 1500)
+    return cls(pi, 13, 18)
+
+
+def test_set_baud_switches_both_sides():
+    port = _port()
+    assert tfmini.set_baud(port, 460800) == 460800
+    assert port.baudrate == port.sensor_baud == 460800
+
+
+def test_failed_baud_change_restores_the_sensor():
+    port = _port(FlakyLink)
+    with pytest.raises(tfmini.TFminiError, match="restored to 115200"):
+        tfmini.set_baud(port, 921600)
+    assert port.baudrate == port.sensor_baud == 115200
+    assert tfmini._frames_arrive(port)
+
+
+def test_configure_sensor_raises_the_baud_when_needed():
+    port = _port()
+    port.baudrate = port.sensor_baud = 19200           # carries 170 frames/s
+    report = scanner.configure_sensor(port, 250)
+    assert report["applied"] == {"baud": 56000, "frame_rate": 250}
+    assert port.baudrate == port.sensor_baud == 56000 and port.frame_rate == 250
+    assert scanner.configure_sensor(port, 100)["applied"] == {"frame_rate": 100}
+    assert port.baudrate == 56000                       # never lowered
+
+
+def test_open_hardware_configures_the_sensor_once(monkeypatch):
+    pi = simulator.SimPi()
+    opened = []
+
+    def open_port(path, baud, timeout):
+        opened.append(_port())
+        opened[-1].baudrate = opened[-1].sensor_baud = baud
+        return opened[-1]
+
+    monkeypatch.setattr(scanner, "pigpio", SimpleNamespace(pi=lambda: pi, OUTPUT=1))
+    monkeypatch.setattr(scanner, "serial", SimpleNamespace(Serial=open_port))
+    for name in ("pi", "ser", "sensor"):
+        monkeypatch.setattr(scanner, name, None)
+    monkeypatch.setattr(scanner, "UART_BAUD", 9600)
+    scanner.open_hardware()
+    scanner.open_hardware()
+    [port] = opened
+    hz = planner.SCAN_MODES["step"]["frame_rate"]
+    assert scanner.sensor["applied"] == {"baud": 56000, "frame_rate": hz}
+    assert port.frame_rate == hz and port.baudrate == 56000
@@ -0,0 +1,89 @@
+import gzip, struct, zlib
+import numpy as np
+import plotly.colors
+import pytest
+from lidarscan import scanner, tiles
+
+
+def test_luts_leave_plotly_scales_alone():
+    for name in tiles.SCALES:
+        tiles.make_lut(name)
+    assert all(isinstance(c, str) for c in plotly.colors.sequential.Viridis)
+    grid = {"grid": np.arange(12.0).reshape(3, 4), "x0": 0, "y0": 0, "cell": 1}
+    assert "Heightmap" in scanner.figure_2d(grid).to_html(full_html=False)
+
+
+def test_viridis_lut_endpoints():
+    lut = tiles.lut("viridis")
+    assert lut.shape == (257, 4)
+    assert lut[0].tolist() == [68, 1, 84, 255]
+    assert lut[255].tolist() == [253, 231, 37, 255]
+    assert lut[256, 3] == 0
+
+
+def test_unknown_scale():
+    with pytest.raises(ValueError):
+        tiles.lut("rainbow")
+
+
+def _decode_png(png):
+    """(h, w, 4) pixels of a PNG written by encode_png (no filters)."""
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    pos, chunks = 8, {}
+    while pos < len(png):
+        n, = struct.unpack_from(">I", png, pos)
+        kind, body = png[pos + 4:pos + 8], png[pos + 8:pos + 8 + n]
+        assert struct.unpack_from(">I", png, pos + 8 + n)[0] == zlib.crc32(kind + body)
+        chunks[kind] = chunks.get(kind, b"") + body
+        pos += 12 + n
+    w, h = struct.unpack_from(">II", chunks[b"IHDR"])
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), np.uint8).reshape(h, w * 4 + 1)
+    assert not raw[:, 0].any()
+    return raw[:, 1:].reshape(h, w, 4)
+
+
+def test_downsample_keeps_the_max_and_ignores_gaps():
+    grid = np.array([[1.0, np.nan, 3.0],
+                     [np.nan, np.nan, 2.0],
+                     [5.0, 4.0, np.nan]])
+    out = tiles.downsample(grid)
+    np.testing.assert_array_equal(out, [[1.0, 3.0], [5.0, np.nan]])
+
+
+def test_pyramid_levels_and_tiles(monkeypatch):
+    monkeypatch.setattr(tiles, "TILE", 8)
+    rng = np.random.default_rng(0)
+    grid = rng.uniform(0, 20, (21, 37))
+    grid[rng.random(grid.shape) < 0.2] = np.nan
+    pyr = tiles.Pyramid({"grid": grid, "x0": -3, "y0": 4, "cell": 2.0})
+
+    meta = pyr.meta()
+    assert [(lv["ny"], lv["nx"]) for lv in meta["levels"]] == [(21, 37), (11, 19), (6, 10), (3, 5)]
+    assert [(lv["tiles_y"], lv["tiles_x"]) for lv in meta["levels"]] == [(3, 5), (2, 3), (1, 2), (1, 1)]
+    assert (meta["vmin"], meta["vmax"]) == (np.nanmin(grid), np.nanmax(grid))
+    assert np.nanmax(pyr.levels[-1]) == np.nanmax(grid)
+
+    png = pyr.tile(0, 4, 2)                 # the top-right corner tile: 5 x 5 cells
+    block = grid[16:21, 32:37]
+    np.testing.assert_array_equal(_decode_png(png),
+                                  tiles.colorize(block[::-1], pyr.vmin, pyr.vmax))
+    assert pyr.tile(0, 4, 2) is png         # rendered once
+    assert pyr.tile(0, 5, 0) is None
+
+    f16 = np.frombuffer(gzip.decompress(pyr.float16(1)), "<f2").reshape(11, 19)
+    np.testing.assert_array_equal(np.isnan(f16), np.isnan(pyr.levels[1]))
+    np.testing.assert_allclose(f16, pyr.levels[1], rtol=1e-3)
+
+
+def test_float16_route_follows_accept_encoding(monkeypatch):
+    from lidarscan import app
+    grid = np.arange(12.0).reshape(3, 4)
+    grid[1, 2] = np.nan
+    monkeypatch.setattr(scanner, "last_grid", {"grid": grid, "x0": 0, "y0": 0, "cell": 1})
+    c = app.app.test_client()
+    raw = c.get("/heightmap.f16", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in raw.headers and raw.headers["Vary"] == "Accept-Encoding"
+    np.testing.assert_array_equal(np.frombuffer(raw.data, "<f2").reshape(3, 4), grid)
+    packed = c.get("/heightmap.f16", headers={"Accept-Encoding": "gzip, deflate"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed.data) == raw.data